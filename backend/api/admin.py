@@ -1,6 +1,8 @@
 from django.contrib.admin import ModelAdmin, TabularInline, register, site
 from django.utils.safestring import mark_safe
 
+from . import search
+from .renditions import rendition_urls
 from .models import (Favorite, Ingredient, RecipeIngredient, Recipe,
                      ShoppingCart, Tag)
 
@@ -24,7 +26,7 @@ class IngredientAdmin(ModelAdmin):
 @register(Recipe)
 class RecipeAdmin(ModelAdmin):
     list_display = ('id', 'name', 'author',
-                    '_get_thumbnail', '_favorite_count')
+                    '_get_thumbnail', 'favorites_count', 'cart_count')
     search_fields = ('name', 'author')
     list_filter = ('name', 'author__username')
     inlines = (RecipeIngredientInLine,)
@@ -32,12 +34,15 @@ class RecipeAdmin(ModelAdmin):
     empty_value_display = '-пусто-'
 
     def _get_thumbnail(self, obj):
-        return mark_safe(f'<img src={obj.image.url} width="80" hieght="30" />')
+        if not obj.image:
+            return None
+        return mark_safe(
+            f'<img src="{rendition_urls(obj)["thumbnail"]}" width="80" />')
     _get_thumbnail.short_description = 'Изображение'
 
-    def _favorite_count(self, obj):
-        return Favorite.objects.filter(recipe=obj).count()
-    _favorite_count.short_description = 'В Избранном'
+    def save_related(self, request, form, formsets, change):
+        super().save_related(request, form, formsets, change)
+        search.update_recipes((form.instance.pk,))
 
 
 @register(Tag)
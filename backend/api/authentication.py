@@ -0,0 +1,141 @@
+import copy
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from rest_framework import exceptions
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.authtoken.models import Token
+
+
+class TokenCache:
+    """Кеш токен -> (пользователь, токен) для CachedTokenAuthentication.
+
+    Без TOKEN_CACHE_ALIAS записи хранятся в LRU процесса не больше
+    TOKEN_CACHE_SIZE штук и не дольше TOKEN_CACHE_TTL секунд. Если задан
+    TOKEN_CACHE_ALIAS, записи хранятся только в общем кеше Django, а LRU
+    не используется: удаление записи при выходе или изменении
+    пользователя сразу видят все процессы. В общий кеш попадают только
+    поля токена и пользователя без хеша пароля; восстановленный
+    пользователь загружает пароль из БД при обращении к нему, а save()
+    без update_fields сохраняет только загруженные поля.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()
+
+    @property
+    def shared(self):
+        alias = settings.TOKEN_CACHE_ALIAS
+        return caches[alias] if alias else None
+
+    @staticmethod
+    def shared_key(key):
+        return f'auth:token:{key}'
+
+    def get(self, key):
+        if self.shared is not None:
+            data = self.shared.get(self.shared_key(key))
+            return None if data is None else self.restore(data)
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            expires, token = entry
+            if expires > time.monotonic():
+                self.entries.move_to_end(key)
+                return self.copy(token)
+            del self.entries[key]
+        return None
+
+    def set(self, key, token):
+        if self.shared is not None:
+            self.shared.set(self.shared_key(key), self.dump(token),
+                            timeout=settings.TOKEN_CACHE_SHARED_TTL)
+            return
+        self.remember(key, token)
+
+    @staticmethod
+    def dump(token):
+        """Данные токена для общего кеша: без хеша пароля пользователя."""
+        user = token.user
+        return {
+            'db': user._state.db,
+            'token': (token.key, token.created),
+            'user': {
+                field.attname: getattr(user, field.attname)
+                for field in user._meta.concrete_fields
+                if field.name != 'password'
+            },
+        }
+
+    @staticmethod
+    def restore(data):
+        """Токен и пользователь из dump() с отложенным полем password."""
+        names = list(data['user'])
+        user = get_user_model().from_db(
+            data['db'], names, [data['user'][name] for name in names])
+        token = Token.from_db(
+            data['db'], ['key', 'user_id', 'created'],
+            [data['token'][0], user.pk, data['token'][1]])
+        token.user = user
+        return token
+
+    def remember(self, key, token):
+        with self.lock:
+            self.entries[key] = (
+                time.monotonic() + settings.TOKEN_CACHE_TTL,
+                self.copy(token))
+            self.entries.move_to_end(key)
+            while len(self.entries) > settings.TOKEN_CACHE_SIZE:
+                self.entries.popitem(last=False)
+
+    @staticmethod
+    def copy(token):
+        """Копия токена с пользователем: запросы не делят объекты."""
+        user = copy.copy(token.user)
+        token = copy.copy(token)
+        token.user = user
+        return token
+
+    def forget(self, *keys):
+        with self.lock:
+            for key in keys:
+                self.entries.pop(key, None)
+        if self.shared is not None and keys:
+            self.shared.delete_many([self.shared_key(key) for key in keys])
+
+    def forget_user(self, user_id):
+        with self.lock:
+            keys = [key for key, (_, token) in self.entries.items()
+                    if token.user_id == user_id]
+        if self.shared is not None:
+            keys += Token.objects.filter(
+                user_id=user_id).values_list('key', flat=True)
+        self.forget(*set(keys))
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+
+token_cache = TokenCache()
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """TokenAuthentication без запроса к БД для известных токенов."""
+
+    def authenticate_credentials(self, key):
+        token = token_cache.get(key)
+        if token is None:
+            user, token = super().authenticate_credentials(key)
+            token_cache.set(key, token)
+            return user, token
+        if not token.user.is_active:
+            raise exceptions.AuthenticationFailed(
+                'Пользователь не активен или удалён.')
+        return token.user, token
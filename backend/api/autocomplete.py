@@ -0,0 +1,88 @@
+import threading
+from bisect import bisect_left
+
+from django.conf import settings
+
+from .conditional import get_versions
+from .constants import INGREDIENT_SEARCH_LIMIT
+from .models import Ingredient
+
+FIELDS = ('id', 'name', 'measurement_unit')
+
+
+class IngredientIndex:
+    """Индекс ингредиентов в памяти процесса для поиска по названию.
+
+    Таблица ингредиентов небольшая и почти не меняется, поэтому она целиком
+    загружается в отсортированный список. Сначала возвращаются названия,
+    начинающиеся с запроса, затем содержащие его. Перед поиском версия
+    индекса сверяется со счётчиком изменений ингредиентов, так что правки
+    из других процессов видны сразу.
+
+    Если ингредиентов больше INGREDIENT_INDEX_MAX_SIZE, индекс не строится
+    и поиск идёт в БД: на PostgreSQL для него есть индексы по UPPER(name)
+    с text_pattern_ops и pg_trgm.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._data = None
+
+    def _load(self, version):
+        if Ingredient.objects.count() > settings.INGREDIENT_INDEX_MAX_SIZE:
+            return version, None, None
+        entries = sorted(
+            (name.lower(), pk, {
+                'id': pk, 'name': name, 'measurement_unit': unit
+            })
+            for pk, name, unit in Ingredient.objects.values_list(*FIELDS)
+        )
+        keys = [key for key, _, _ in entries]
+        items = [item for _, _, item in entries]
+        return version, keys, items
+
+    def _get(self):
+        (version,), _ = get_versions((Ingredient,))
+        data = self._data
+        if data is None or data[0] != version:
+            with self._lock:
+                data = self._data
+                if data is None or data[0] != version:
+                    data = self._data = self._load(version)
+        return data[1], data[2]
+
+    def search(self, query, limit=INGREDIENT_SEARCH_LIMIT):
+        query = query.strip().lower()
+        if not query:
+            return []
+        keys, items = self._get()
+        if keys is None:
+            return self.search_database(query, limit)
+        results = []
+        start = index = bisect_left(keys, query)
+        while (index < len(keys) and len(results) < limit
+               and keys[index].startswith(query)):
+            results.append(items[index])
+            index += 1
+        prefix_end = index
+        for index, key in enumerate(keys):
+            if len(results) >= limit:
+                break
+            if start <= index < prefix_end:
+                continue
+            if query in key:
+                results.append(items[index])
+        return results
+
+    def search_database(self, query, limit):
+        """Тот же поиск запросами istartswith и icontains к БД."""
+        ingredients = Ingredient.objects.order_by('name', 'id')
+        results = list(ingredients.filter(
+            name__istartswith=query).values(*FIELDS)[:limit])
+        if len(results) < limit:
+            results += ingredients.filter(name__icontains=query).exclude(
+                name__istartswith=query).values(*FIELDS)[:limit - len(results)]
+        return results
+
+
+ingredient_index = IngredientIndex()
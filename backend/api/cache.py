@@ -0,0 +1,158 @@
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from rest_framework.response import Response
+
+from . import metrics, replicas
+from .filters import recipe_ordering
+
+IGNORED_ANONYMOUS_PARAMS = ('is_favorited', 'is_in_shopping_cart')
+
+
+class ResponseCache:
+    """Кеш данных ответов с инвалидацией по тегам.
+
+    У каждого тега есть версия, хранящаяся в том же кеше. Ключ записи
+    включает версии всех её тегов, поэтому сброс тега сводится к замене
+    его версии, а устаревшие записи вытесняются по таймауту. Версией
+    служит время сброса, поэтому вытесненная из кеша версия не может
+    совпасть со старой.
+    """
+
+    def __init__(self, prefix, alias='default', timeout=None):
+        self.prefix = prefix
+        self.alias = alias
+        self.timeout = timeout
+
+    @property
+    def cache(self):
+        return caches[self.alias]
+
+    def _tag_key(self, tag):
+        return f'{self.prefix}:tag:{tag}'
+
+    def _stat_key(self, name):
+        return f'{self.prefix}:stats:{name}'
+
+    def _tag_versions(self, tags):
+        keys = [self._tag_key(tag) for tag in tags]
+        versions = self.cache.get_many(keys)
+        for key in keys:
+            if key not in versions:
+                version = time.time_ns()
+                self.cache.add(key, version, timeout=None)
+                versions[key] = self.cache.get(key, version)
+        return [versions[key] for key in keys]
+
+    def make_key(self, params, tags):
+        tags = sorted(set(tags))
+        raw = repr((params, tags, self._tag_versions(tags)))
+        return f'{self.prefix}:{hashlib.md5(raw.encode()).hexdigest()}'
+
+    def _count(self, name):
+        key = self._stat_key(name)
+        if not self.cache.add(key, 1, timeout=None):
+            try:
+                self.cache.incr(key)
+            except ValueError:
+                self.cache.set(key, 1, timeout=None)
+
+    def get(self, key):
+        data = self.cache.get(key)
+        self._count('misses' if data is None else 'hits')
+        metrics.record_cache(self.prefix, data is not None)
+        return data
+
+    def set(self, key, data):
+        self.cache.set(key, data, timeout=self.timeout)
+
+    def storable(self, tags):
+        """Можно ли сохранить ответ, построенный по данным с тегами tags.
+
+        Реплика может ещё не получить изменения, после которых теги были
+        сброшены, поэтому прочитанное с неё в течение REPLICA_MAX_LAG
+        секунд после сброса не кешируется.
+        """
+        if not replicas.reading_from_replica():
+            return True
+        changed = max(self._tag_versions(sorted(set(tags)))) / 10 ** 9
+        return time.time() - changed >= settings.REPLICA_MAX_LAG
+
+    def invalidate(self, *tags):
+        """Сбрасывает записи с тегами после фиксации транзакции."""
+        tags = set(tags)
+
+        def bump():
+            version = time.time_ns()
+            self.cache.set_many(
+                {self._tag_key(tag): version for tag in tags}, timeout=None)
+
+        transaction.on_commit(bump)
+
+    def stats(self):
+        keys = [self._stat_key('hits'), self._stat_key('misses')]
+        values = self.cache.get_many(keys)
+        return {
+            'hits': values.get(keys[0], 0),
+            'misses': values.get(keys[1], 0),
+        }
+
+
+class RecipeFeedCache(ResponseCache):
+    """Кеш анонимной ленты рецептов.
+
+    Запись помечается тегами фильтров: tag:<slug> для каждого тега,
+    author:<id> для автора или feed для ленты без фильтров, order:<поле>
+    для каждого поля сортировки, а также общим тегом all.
+    """
+
+    def get_params(self, request):
+        return request.get_host(), sorted(
+            (name, sorted(values))
+            for name, values in request.query_params.lists()
+            if name not in IGNORED_ANONYMOUS_PARAMS
+        )
+
+    def get_tags(self, request):
+        tags = ['all']
+        tags += [f'tag:{slug}'
+                 for slug in request.query_params.getlist('tags')]
+        author = request.query_params.get('author')
+        if author is not None:
+            tags.append(f'author:{author}')
+        if len(tags) == 1:
+            tags.append('feed')
+        tags += [f'order:{field.lstrip("-")}'
+                 for field in recipe_ordering(request.query_params)]
+        return tags
+
+    def respond(self, request, handler):
+        tags = self.get_tags(request)
+        key = self.make_key(self.get_params(request), tags)
+        data = self.get(key)
+        if data is not None:
+            response = Response(data)
+            response['X-Cache'] = 'HIT'
+            return response
+        response = handler()
+        if response.status_code == 200 and self.storable(tags):
+            self.set(key, response.data)
+        response['X-Cache'] = 'MISS'
+        return response
+
+    def invalidate_recipe(self, author_id, tag_slugs):
+        """Сбрасывает страницы ленты, на которых может быть рецепт."""
+        self.invalidate(
+            'feed', f'author:{author_id}',
+            *(f'tag:{slug}' for slug in tag_slugs))
+
+    def invalidate_ordering(self, *fields):
+        """Сбрасывает страницы, отсортированные по полям fields."""
+        self.invalidate(*(f'order:{field}' for field in fields))
+
+
+recipe_feed_cache = RecipeFeedCache(
+    'recipes', timeout=settings.RECIPE_FEED_CACHE_TIMEOUT)
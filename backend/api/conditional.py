@@ -0,0 +1,130 @@
+import hashlib
+
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+from django.utils.cache import (get_conditional_response, patch_cache_control,
+                                patch_vary_headers)
+from django.utils.http import http_date, quote_etag
+
+from . import metrics
+from .models import ModelVersion
+
+CONDITIONAL_HEADERS = {'HTTP_IF_NONE_MATCH', 'HTTP_IF_MODIFIED_SINCE'}
+
+
+def model_label(model):
+    return model._meta.label_lower
+
+
+class PendingVersions:
+    """Модели, счётчики которых увеличатся при фиксации транзакции."""
+
+    def __init__(self):
+        self.models = set()
+        self.written = False
+
+    def __call__(self):
+        self.written = True
+        write_versions(self.models)
+
+
+def bump_versions(*models):
+    """Увеличивает счётчики изменений моделей.
+
+    Внутри транзакции счётчик каждой модели увеличивается один раз после
+    её фиксации: иначе все записи рецептов и ингредиентов ждали бы друг
+    друга на строке ModelVersion до конца своих транзакций, а другие
+    процессы могли бы получить новую версию раньше новых данных.
+    """
+    connection = transaction.get_connection()
+    if not connection.in_atomic_block:
+        write_versions(models)
+        return
+    pending = getattr(connection, 'pending_versions', None)
+    if pending is None or pending.written or not any(
+            callback is pending for _, callback in connection.run_on_commit):
+        pending = connection.pending_versions = PendingVersions()
+        transaction.on_commit(pending)
+    pending.models.update(models)
+
+
+def write_versions(models):
+    """Увеличивает счётчики сразу, в одном порядке во всех процессах."""
+    now = timezone.now()
+    with transaction.atomic():
+        for label in sorted({model_label(model) for model in models}):
+            updated = ModelVersion.objects.filter(name=label).update(
+                version=F('version') + 1, updated_at=now)
+            if not updated:
+                ModelVersion.objects.get_or_create(
+                    name=label, defaults={'version': 1, 'updated_at': now})
+
+
+def get_versions(models):
+    """Возвращает версии моделей и время последнего изменения."""
+    labels = [model_label(model) for model in models]
+    rows = dict(
+        (name, (version, updated_at))
+        for name, version, updated_at in ModelVersion.objects.filter(
+            name__in=labels).values_list('name', 'version', 'updated_at')
+    )
+    versions = [rows.get(label, (0, None))[0] for label in labels]
+    changes = [updated_at for _, updated_at in rows.values()]
+    return versions, max(changes) if changes else None
+
+
+class ConditionalGetMixin:
+    """Отвечает 304 на list и retrieve, пока данные моделей не менялись.
+
+    ETag строится по версиям моделей из conditional_models, которые
+    увеличиваются сигналами при сохранении и удалении, поэтому проверка
+    не обращается к самим данным и не вызывает сериализатор.
+    """
+    conditional_models = ()
+    conditional_actions = ('list', 'retrieve')
+    cache_control = {'public': True, 'max_age': 0}
+    vary = ()
+
+    def get_etag_parts(self, request):
+        """Части ETag помимо версий моделей, None отключает проверку.
+
+        Путь с параметрами входит в ETag, чтобы тег одного ответа не
+        подходил к другим адресам.
+        """
+        return [request.get_full_path(), request.accepted_renderer.format]
+
+    def get_validators(self, request):
+        parts = self.get_etag_parts(request)
+        if parts is None:
+            return None, None
+        versions, last_modified = get_versions(self.conditional_models)
+        etag = hashlib.md5(
+            ':'.join(map(str, parts + versions)).encode()).hexdigest()
+        return quote_etag(etag), (
+            last_modified and int(last_modified.timestamp()))
+
+    def conditional(self, handler, request, *args, **kwargs):
+        if self.action not in self.conditional_actions:
+            return handler(request, *args, **kwargs)
+        etag, last_modified = self.get_validators(request)
+        response = get_conditional_response(
+            request, etag=etag, last_modified=last_modified)
+        if etag and CONDITIONAL_HEADERS & request.META.keys():
+            metrics.record_cache('conditional', response is not None)
+        if response is None:
+            response = handler(request, *args, **kwargs)
+        if response.status_code in (200, 304) and etag:
+            response['ETag'] = etag
+            if last_modified:
+                response['Last-Modified'] = http_date(last_modified)
+            patch_cache_control(response, **self.cache_control)
+            if self.vary:
+                patch_vary_headers(response, self.vary)
+        return response
+
+    def list(self, request, *args, **kwargs):
+        return self.conditional(super().list, request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.conditional(super().retrieve, request, *args, **kwargs)
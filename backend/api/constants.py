@@ -1,2 +1,8 @@
 MIN_FIELD_VALUE = 1
 MAX_FIELD_VALUE = 32000
+
+INGREDIENT_SEARCH_LIMIT = 30
+
+REFERENCE_DATA_MAX_AGE = 60
+
+RECIPE_BATCH_MAX_SIZE = 500
@@ -0,0 +1,123 @@
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models import Count, F, OuterRef, Q, Subquery
+from django.db.models.functions import Coalesce
+
+from .cache import recipe_feed_cache
+from .db import insert_ignore
+from .models import Favorite, Recipe, ShoppingCart
+from users.models import AuthorStats
+
+User = get_user_model()
+
+BATCH_SIZE = 1000
+
+# Счётчик рецепта для каждого списка: модель списка -> поле Recipe.
+RECIPE_COUNTERS = {
+    Favorite: 'favorites_count',
+    ShoppingCart: 'cart_count',
+}
+
+
+def recipes_added(model, recipe_ids):
+    """Увеличивает счётчики рецептов, добавленных в список model."""
+    field = RECIPE_COUNTERS[model]
+    Recipe.objects.filter(pk__in=recipe_ids).update(
+        **{field: F(field) + 1})
+    recipe_feed_cache.invalidate_ordering(field)
+
+
+def recipes_removed(model, recipe_ids):
+    """Уменьшает счётчики рецептов, удалённых из списка model."""
+    field = RECIPE_COUNTERS[model]
+    Recipe.objects.filter(
+        pk__in=recipe_ids, **{f'{field}__gt': 0}
+    ).update(**{field: F(field) - 1})
+    recipe_feed_cache.invalidate_ordering(field)
+
+
+def user_deleted(user):
+    """Уменьшает счётчики рецептов из списков удаляемого пользователя."""
+    for model in RECIPE_COUNTERS:
+        recipes_removed(
+            model, model.objects.filter(user=user).values('recipe'))
+
+
+def recipe_created(author_id):
+    insert_ignore(AuthorStats, author_id=author_id)
+    AuthorStats.objects.filter(author_id=author_id).update(
+        recipes_count=F('recipes_count') + 1)
+
+
+def recipe_deleted(author_id):
+    AuthorStats.objects.filter(
+        author_id=author_id, recipes_count__gt=0
+    ).update(recipes_count=F('recipes_count') - 1)
+
+
+def count_related(model, field):
+    return Coalesce(Subquery(
+        model.objects.filter(**{field: OuterRef('pk')}).order_by().values(
+            field).annotate(total=Count('pk')).values('total')
+    ), 0)
+
+
+def actual_recipe_counters():
+    return {
+        field: count_related(model, 'recipe')
+        for model, field in RECIPE_COUNTERS.items()
+    }
+
+
+def recipe_mismatches():
+    """Рецепты, у которых счётчики расходятся со списками.
+
+    Возвращает {recipe_id: {поле: (было, нужно)}}.
+    """
+    mismatched = Q()
+    for field in RECIPE_COUNTERS.values():
+        mismatched |= ~Q(**{field: F(f'actual_{field}')})
+    rows = Recipe.objects.annotate(**{
+        f'actual_{field}': expression
+        for field, expression in actual_recipe_counters().items()
+    }).filter(mismatched).values('pk', *(
+        name for field in RECIPE_COUNTERS.values()
+        for name in (field, f'actual_{field}')
+    ))
+    return {
+        row['pk']: {
+            field: (row[field], row[f'actual_{field}'])
+            for field in RECIPE_COUNTERS.values()
+            if row[field] != row[f'actual_{field}']
+        }
+        for row in rows.iterator()
+    }
+
+
+def author_mismatches():
+    """Авторы с неверным числом рецептов: {user_id: (было, нужно)}."""
+    rows = User.objects.annotate(
+        stored=Coalesce('author_stats__recipes_count', 0),
+        actual=count_related(Recipe, 'author'),
+    ).exclude(stored=F('actual')).values_list('pk', 'stored', 'actual')
+    return {pk: (stored, actual) for pk, stored, actual in rows.iterator()}
+
+
+def reconcile():
+    """Исправляет разошедшиеся счётчики, возвращает число исправлений."""
+    with transaction.atomic():
+        recipe_ids = list(recipe_mismatches())
+        for start in range(0, len(recipe_ids), BATCH_SIZE):
+            Recipe.objects.filter(
+                pk__in=recipe_ids[start:start + BATCH_SIZE]
+            ).update(**actual_recipe_counters())
+        if recipe_ids:
+            recipe_feed_cache.invalidate_ordering(
+                *RECIPE_COUNTERS.values())
+        authors = author_mismatches()
+        AuthorStats.objects.filter(author_id__in=authors).delete()
+        AuthorStats.objects.bulk_create(
+            (AuthorStats(author_id=author_id, recipes_count=expected)
+             for author_id, (_, expected) in authors.items()),
+            batch_size=BATCH_SIZE)
+    return len(recipe_ids) + len(authors)
@@ -0,0 +1,100 @@
+from django.db import connections, router
+from django.db.models import sql
+
+
+def insert_ignore(model, **values):
+    """Добавляет строку одним INSERT, пропуская её при конфликте.
+
+    На PostgreSQL выполняется INSERT ... ON CONFLICT DO NOTHING, на SQLite -
+    INSERT OR IGNORE. Повторная вставка, в том числе параллельная,
+    отсекается ограничением уникальности в БД. Поля, не переданные в
+    values, заполняются как при save(): значениями по умолчанию и
+    auto_now_add. Возвращает True, если строка добавлена, и False, если
+    такая строка уже есть.
+    """
+    using = router.db_for_write(model)
+    meta = model._meta
+    obj = model(**values)
+    fields = [field for field in meta.concrete_fields
+              if field is not meta.auto_field]
+    query = sql.InsertQuery(model, ignore_conflicts=True)
+    query.insert_values(fields, [obj])
+    compiler = query.get_compiler(using=using)
+    with connections[using].cursor() as cursor:
+        for statement, params in compiler.as_sql():
+            cursor.execute(statement, params)
+        return cursor.rowcount == 1
+
+
+def delete_without_signals(model, pks):
+    """Удаляет строки model по pk без сигналов pre_delete и post_delete.
+
+    Подходит для моделей, на которые нет внешних ключей: строки
+    удаляются пачками DELETE ... WHERE id IN (...), а то, что сделали бы
+    обработчики сигналов, вызывающий код выполняет сам один раз.
+    Возвращает число удалённых строк.
+    """
+    using = router.db_for_write(model)
+    return sql.DeleteQuery(model).delete_batch(list(pks), using)
+
+
+def can_return_rows(connection):
+    """Поддерживает ли БД RETURNING в INSERT и DELETE."""
+    if connection.vendor == 'postgresql':
+        return True
+    return (connection.vendor == 'sqlite'
+            and connection.Database.sqlite_version_info >= (3, 35))
+
+
+def bulk_insert_ignore(model, objs, returning):
+    """Добавляет объекты пачками INSERT, пропуская конфликтующие строки.
+
+    Возвращает значения поля returning у строк, которые на самом деле
+    добавлены, по INSERT ... RETURNING. Если БД не поддерживает
+    RETURNING, возвращает None, и добавленные строки нужно определить
+    выборкой.
+    """
+    using = router.db_for_write(model)
+    connection = connections[using]
+    meta = model._meta
+    fields = [field for field in meta.concrete_fields
+              if field is not meta.auto_field]
+    objs = list(objs)
+    returning_sql = ''
+    if can_return_rows(connection):
+        column = meta.get_field(returning).column
+        returning_sql = f' RETURNING {connection.ops.quote_name(column)}'
+    batch_size = max(connection.ops.bulk_batch_size(fields, objs), 1)
+    inserted = []
+    with connection.cursor() as cursor:
+        for start in range(0, len(objs), batch_size):
+            query = sql.InsertQuery(model, ignore_conflicts=True)
+            query.insert_values(fields, objs[start:start + batch_size])
+            compiler = query.get_compiler(using=using)
+            for statement, params in compiler.as_sql():
+                cursor.execute(statement + returning_sql, params)
+                if returning_sql:
+                    inserted += [row[0] for row in cursor.fetchall()]
+    return inserted if returning_sql else None
+
+
+def delete_returning(queryset, returning):
+    """Удаляет строки queryset одним DELETE ... RETURNING без сигналов.
+
+    Возвращает значения поля returning у удалённых строк. Если БД не
+    поддерживает RETURNING, ничего не удаляет и возвращает None.
+    """
+    model = queryset.model
+    using = router.db_for_write(model)
+    connection = connections[using]
+    if not can_return_rows(connection):
+        return None
+    query = queryset.query
+    where, params = query.get_compiler(using=using).compile(query.where)
+    quote = connection.ops.quote_name
+    column = model._meta.get_field(returning).column
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'DELETE FROM {quote(model._meta.db_table)} WHERE {where} '
+            f'RETURNING {quote(column)}', params)
+        return [row[0] for row in cursor.fetchall()]
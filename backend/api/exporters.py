@@ -0,0 +1,136 @@
+import csv
+import json
+
+from django.utils import timezone
+from rest_framework.exceptions import NotAcceptable
+from rest_framework.negotiation import DefaultContentNegotiation
+
+FORMAT_PARAM = 'file_format'
+CURSOR_CHUNK_SIZE = 2000
+
+
+class ExportContentNegotiation(DefaultContentNegotiation):
+    """Не отклоняет запрос, если Accept указывает на формат выгрузки."""
+
+    def select_renderer(self, request, renderers, format_suffix=None):
+        try:
+            return super().select_renderer(request, renderers, format_suffix)
+        except NotAcceptable:
+            return renderers[0], renderers[0].media_type
+
+
+class ShoppingListExporter:
+    """Базовый формат выгрузки списка покупок.
+
+    Строки списка читаются из items по одной, а файл отдаётся частями,
+    поэтому расход памяти не зависит от размера списка.
+    """
+    extension = None
+    content_type = None
+
+    def __init__(self, user, items):
+        self.user = user
+        self.items = items
+        self.created = timezone.localtime()
+
+    @property
+    def filename(self):
+        return f'{self.user.username}_shopping_list.{self.extension}'
+
+    def header(self):
+        return ''
+
+    def row(self, item):
+        raise NotImplementedError
+
+    def footer(self):
+        return ''
+
+    def __iter__(self):
+        yield self.header()
+        for item in self.items:
+            yield self.row(item)
+        yield self.footer()
+
+
+class TextExporter(ShoppingListExporter):
+    extension = 'txt'
+    content_type = 'text/plain'
+
+    def header(self):
+        return (f'Список покупок({self.user.first_name})\n'
+                f'{self.created.strftime("%d/%m/%Y %H:%M")}\n\n')
+
+    def row(self, item):
+        return (f'{item["ingredient__name"]}: {item["amount"]} '
+                f'{item["ingredient__measurement_unit"]}\n')
+
+    def footer(self):
+        return '\nFoodgram'
+
+
+class _Echo:
+    """Буфер для csv.writer, возвращающий записанную строку."""
+
+    def write(self, value):
+        return value
+
+
+class CsvExporter(ShoppingListExporter):
+    extension = 'csv'
+    content_type = 'text/csv'
+
+    def __init__(self, user, items):
+        super().__init__(user, items)
+        self.writer = csv.writer(_Echo())
+
+    def header(self):
+        return self.writer.writerow(('name', 'amount', 'measurement_unit'))
+
+    def row(self, item):
+        return self.writer.writerow((
+            item['ingredient__name'],
+            item['amount'],
+            item['ingredient__measurement_unit'],
+        ))
+
+
+class JsonExporter(ShoppingListExporter):
+    extension = 'json'
+    content_type = 'application/json'
+    separator = ''
+
+    def header(self):
+        return (f'{{"user": {json.dumps(self.user.username)}, '
+                f'"created": "{self.created.isoformat()}", "items": [')
+
+    def row(self, item):
+        line = self.separator + json.dumps({
+            'name': item['ingredient__name'],
+            'amount': item['amount'],
+            'measurement_unit': item['ingredient__measurement_unit'],
+        }, ensure_ascii=False)
+        self.separator = ', '
+        return line
+
+    def footer(self):
+        return ']}'
+
+
+EXPORTERS = {
+    exporter.extension: exporter
+    for exporter in (TextExporter, CsvExporter, JsonExporter)
+}
+
+
+def get_exporter_class(request):
+    """Выбирает формат по параметру file_format или заголовку Accept."""
+    file_format = request.query_params.get(FORMAT_PARAM)
+    if file_format is not None:
+        return EXPORTERS.get(file_format)
+    for media_type in request.META.get('HTTP_ACCEPT', '').split(','):
+        media_type = media_type.split(';')[0].strip()
+        for exporter in EXPORTERS.values():
+            if exporter.content_type == media_type:
+                return exporter
+    return TextExporter
@@ -0,0 +1,12 @@
+from django.core.files.uploadedfile import UploadedFile
+from drf_extra_fields.fields import Base64ImageField
+from rest_framework.fields import ImageField
+
+
+class StreamedBase64ImageField(Base64ImageField):
+    """Base64ImageField, принимающий и уже декодированный парсером файл."""
+
+    def to_internal_value(self, data):
+        if isinstance(data, UploadedFile):
+            return ImageField.to_internal_value(self, data)
+        return super().to_internal_value(data)
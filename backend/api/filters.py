@@ -1,14 +1,32 @@
 from django.contrib.auth import get_user_model
 from django_filters import FilterSet, filters
-from rest_framework.filters import SearchFilter
 
+from . import search
 from .models import Recipe, Tag
 
 User = get_user_model()
 
+# Порядок ленты для параметра ordering, по умолчанию - новые рецепты.
+RECIPE_ORDERINGS = {
+    'relevance': ('-search_rank', '-id'),
+    'popular': ('-favorites_count', '-id'),
+    'trending': ('-trending_score', '-id'),
+}
+DEFAULT_RECIPE_ORDERING = ('-id',)
 
-class IngredientFilter(SearchFilter):
-    search_param = 'name'
+
+def recipe_ordering(params):
+    """Порядок ленты для параметров запроса.
+
+    При поиске по умолчанию рецепты идут по релевантности, без поиска
+    ordering=relevance игнорируется.
+    """
+    ordering = params.get('ordering')
+    if params.get('search', '').strip():
+        ordering = ordering or 'relevance'
+    elif ordering == 'relevance':
+        ordering = None
+    return RECIPE_ORDERINGS.get(ordering, DEFAULT_RECIPE_ORDERING)
 
 
 class RecipeFilter(FilterSet):
@@ -22,10 +40,16 @@ class RecipeFilter(FilterSet):
     is_in_shopping_cart = filters.NumberFilter(
         method='get_is_in_shopping_cart'
     )
+    search = filters.CharFilter(method='get_search')
+    ordering = filters.ChoiceFilter(
+        choices=[(name, name) for name in RECIPE_ORDERINGS],
+        method='get_ordering'
+    )
 
     class Meta:
         model = Recipe
-        fields = ('is_favorited', 'is_in_shopping_cart', 'author', 'tags')
+        fields = ('is_favorited', 'is_in_shopping_cart', 'author', 'tags',
+                  'search', 'ordering')
 
     def get_is_favorited(self, queryset, name, value):
         if value and not self.request.user.is_anonymous:
@@ -36,3 +60,10 @@ class RecipeFilter(FilterSet):
         if value and not self.request.user.is_anonymous:
             return queryset.filter(cart__user=self.request.user)
         return queryset
+
+    def get_search(self, queryset, name, value):
+        return search.search(queryset, value).order_by(
+            *recipe_ordering(self.data))
+
+    def get_ordering(self, queryset, name, value):
+        return queryset.order_by(*recipe_ordering(self.data))
@@ -0,0 +1,238 @@
+import base64
+import random
+import time
+from urllib.parse import urlencode
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test import Client
+from django.test.utils import CaptureQueriesContext, override_settings
+from rest_framework.authtoken.models import Token
+
+from api import recipe_lists, search
+from api.autocomplete import ingredient_index
+from api.models import (Ingredient, Recipe, RecipeIngredient, ShoppingCart,
+                        Tag)
+
+User = get_user_model()
+
+LARGE_CART_USERNAME = 'benchmark_large_cart'
+BATCH_SIZE = 1000
+
+
+def percentile(values, percent):
+    """Процентиль по методу ближайшего ранга."""
+    ordered = sorted(values)
+    rank = max(0, min(len(ordered) - 1,
+                      round(percent / 100 * len(ordered) + 0.5) - 1))
+    return ordered[rank]
+
+
+def cursor_for(position):
+    """Курсор DRF CursorPagination, указывающий на позицию position."""
+    return base64.b64encode(
+        urlencode({'p': position}).encode()).decode()
+
+
+class Command(BaseCommand):
+    help = ('Замеряет задержки и число запросов к БД на основных '
+            'маршрутах API')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=50)
+        parser.add_argument('--warmup', type=int, default=3)
+        parser.add_argument(
+            '--user', help='Имя пользователя для авторизованных запросов')
+        parser.add_argument(
+            '--scenario', action='append', dest='scenarios',
+            help='Запустить только сценарии, содержащие строку')
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument(
+            '--large-cart', type=int, default=0,
+            help='Добавить сценарии download large cart со списком '
+                 'покупок из стольких строк; данные для них создаются в '
+                 'транзакции, которая затем откатывается')
+        parser.add_argument(
+            '--reconnect', action='store_true',
+            help='Закрывать соединение с БД перед каждым запросом, как '
+                 'сервер делает в конце запроса при CONN_MAX_AGE=0')
+
+    def get_user(self, username):
+        users = User.objects.all()
+        if username:
+            users = users.filter(username=username)
+        user = users.filter(cart__isnull=False).order_by('id').first()
+        if user is None:
+            user = users.order_by('id').first()
+        if user is None:
+            raise CommandError('Нет пользователей, выполните generate_data')
+        return user
+
+    def large_cart_user(self, size):
+        """Пользователь со списком покупок из size разных ингредиентов.
+
+        Список состоит из одного рецепта пользователя; недостающие
+        ингредиенты добавляются. Вызывается только внутри транзакции,
+        которая потом откатывается.
+        """
+        user, _ = User.objects.get_or_create(
+            username=LARGE_CART_USERNAME,
+            defaults={'email': f'{LARGE_CART_USERNAME}@example.com'})
+        Ingredient.objects.bulk_create((
+            Ingredient(name=f'Ингредиент для замера {number}',
+                       measurement_unit='г')
+            for number in range(size - Ingredient.objects.count())
+        ), batch_size=BATCH_SIZE, ignore_conflicts=True)
+        ingredient_ids = Ingredient.objects.order_by('id').values_list(
+            'id', flat=True)[:size]
+        recipe = Recipe.objects.create(
+            author=user, name='Большой список покупок',
+            text='Рецепт для замера выгрузки списка покупок',
+            cooking_time=1)
+        RecipeIngredient.objects.bulk_create((
+            RecipeIngredient(recipe=recipe, ingredient_id=pk, amount=1)
+            for pk in ingredient_ids
+        ), batch_size=BATCH_SIZE)
+        search.update_recipes([recipe.pk])
+        recipe_lists.add(ShoppingCart, user, [recipe.pk])
+        return user
+
+    def large_cart_scenarios(self, size):
+        token, _ = Token.objects.get_or_create(
+            user=self.large_cart_user(size))
+        client = Client(HTTP_AUTHORIZATION=f'Token {token.key}')
+        return (
+            (f'download large cart txt ({size})',
+             lambda: client.get('/api/recipes/download_shopping_cart/')),
+            (f'download large cart csv ({size})',
+             lambda: client.get('/api/recipes/download_shopping_cart/',
+                                {'file_format': 'csv'})),
+        )
+
+    def scenarios(self, user, rng):
+        token, _ = Token.objects.get_or_create(user=user)
+        anonymous = Client()
+        authorized = Client(HTTP_AUTHORIZATION=f'Token {token.key}')
+        recipe_count = Recipe.objects.count()
+        last_page = max(1, (recipe_count + 9) // 10)
+        deep_id = Recipe.objects.order_by('id').values_list(
+            'id', flat=True).first() or 0
+        recipe_ids = list(Recipe.objects.order_by('?').values_list(
+            'id', flat=True)[:100]) or [0]
+        slugs = list(Tag.objects.values_list('slug', flat=True)) or ['']
+        names = list(Ingredient.objects.values_list(
+            'name', flat=True)[:500]) or ['а']
+
+        def get(client, url):
+            return lambda: client.get(url)
+
+        return (
+            ('recipes anonymous page 1',
+             get(anonymous, '/api/recipes/')),
+            ('recipes anonymous page 1 no cache',
+             lambda: anonymous.get(
+                 '/api/recipes/', {'nocache': time.perf_counter_ns()})),
+            ('recipes page 1', get(authorized, '/api/recipes/')),
+            ('recipes last page',
+             get(authorized, f'/api/recipes/?page={last_page}')),
+            ('recipes cursor first page',
+             get(authorized, '/api/recipes/?pagination=cursor')),
+            ('recipes cursor last page',
+             get(authorized, f'/api/recipes/?cursor='
+                             f'{cursor_for(deep_id + 10)}')),
+            ('recipes limit 100',
+             get(authorized, '/api/recipes/?limit=100')),
+            ('recipes by tag',
+             lambda: authorized.get(
+                 '/api/recipes/', {'tags': rng.choice(slugs)})),
+            ('recipes trending',
+             get(authorized, '/api/recipes/?ordering=trending')),
+            ('recipes trending by tag',
+             lambda: authorized.get('/api/recipes/', {
+                 'ordering': 'trending', 'tags': rng.choice(slugs)})),
+            ('recipes search',
+             lambda: authorized.get(
+                 '/api/recipes/', {'search': rng.choice(names)})),
+            ('recipes favorited',
+             get(authorized, '/api/recipes/?is_favorited=1')),
+            ('recipes in cart',
+             get(authorized, '/api/recipes/?is_in_shopping_cart=1')),
+            ('recipe detail',
+             lambda: authorized.get(
+                 f'/api/recipes/{rng.choice(recipe_ids)}/')),
+            ('subscriptions',
+             get(authorized,
+                 '/api/users/subscriptions/?recipes_limit=3')),
+            ('download shopping cart txt',
+             get(authorized, '/api/recipes/download_shopping_cart/')),
+            ('download shopping cart csv',
+             get(authorized,
+                 '/api/recipes/download_shopping_cart/?file_format=csv')),
+            ('ingredient search',
+             lambda: anonymous.get(
+                 '/api/ingredients/', {'name': rng.choice(names)[:3]})),
+            ('ingredient index lookup',
+             lambda: ingredient_index.search(rng.choice(names)[:3])),
+            ('tags', get(anonymous, '/api/tags/')),
+        )
+
+    def run_scenario(self, action, iterations, warmup, reconnect):
+        for _ in range(warmup):
+            self.consume(action())
+        timings, queries = [], []
+        for _ in range(iterations):
+            with CaptureQueriesContext(connection) as context:
+                if reconnect:
+                    connection.close()
+                started = time.perf_counter()
+                response = action()
+                self.consume(response)
+                timings.append((time.perf_counter() - started) * 1000)
+            queries.append(len(context.captured_queries))
+            status = getattr(response, 'status_code', 200)
+            if status >= 400:
+                raise CommandError(f'Ответ {status}: {response.content!r}')
+        return timings, queries
+
+    def consume(self, response):
+        if getattr(response, 'streaming', False):
+            for _ in response.streaming_content:
+                pass
+
+    @override_settings(ALLOWED_HOSTS=['*'])
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        user = self.get_user(options['user'])
+        self.stdout.write(
+            f'БД: {connection.settings_dict["ENGINE"]}, '
+            f'пользователь: {user.username}, '
+            f'итераций: {options["iterations"]}')
+        header = (f'{"сценарий":<36}{"p50, мс":>10}{"p95, мс":>10}'
+                  f'{"p99, мс":>10}{"запросов":>10}')
+        self.stdout.write(header)
+        self.stdout.write('-' * len(header))
+        self.run_scenarios(self.scenarios(user, rng), options)
+        if options['large_cart']:
+            # Пользователь, рецепт и ингредиенты для замера не должны
+            # оставаться в БД. Внутри транзакции соединение не
+            # закрывается, поэтому --reconnect здесь не действует.
+            with transaction.atomic():
+                self.run_scenarios(
+                    self.large_cart_scenarios(options['large_cart']),
+                    {**options, 'reconnect': False})
+                transaction.set_rollback(True)
+
+    def run_scenarios(self, scenarios, options):
+        for name, action in scenarios:
+            if options['scenarios'] and not any(
+                    part in name for part in options['scenarios']):
+                continue
+            timings, queries = self.run_scenario(
+                action, options['iterations'], options['warmup'],
+                options['reconnect'])
+            self.stdout.write(
+                f'{name:<36}{percentile(timings, 50):>10.2f}'
+                f'{percentile(timings, 95):>10.2f}'
+                f'{percentile(timings, 99):>10.2f}'
+                f'{percentile(queries, 50):>10}')
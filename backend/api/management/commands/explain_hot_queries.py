@@ -0,0 +1,84 @@
+import re
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from api.models import Favorite, Recipe, ShoppingCart, Tag
+from users.models import Subscription
+
+User = get_user_model()
+
+FULL_SCAN_PATTERNS = {
+    'postgresql': r'Seq Scan on {table}\b',
+    'sqlite': r'\bSCAN (TABLE )?{table}\b(?! USING)',
+}
+
+
+class Command(BaseCommand):
+    help = ('Проверяет через EXPLAIN, что частые запросы фильтрации и '
+            'проверки членства используют индексы')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--verbose-plans', action='store_true',
+            help='Печатать планы всех запросов')
+
+    def hot_queries(self):
+        user = User.objects.order_by('id').first()
+        recipe = Recipe.objects.order_by('id').first()
+        tag = Tag.objects.order_by('id').first()
+        if user is None or recipe is None or tag is None:
+            raise CommandError(
+                'Нужны пользователь, рецепт и тег: заполните базу')
+        return (
+            ('is_favorited', 'api_favorite',
+             Recipe.objects.filter(favorites__user=user)),
+            ('is_in_shopping_cart', 'api_shoppingcart',
+             Recipe.objects.filter(cart__user=user)),
+            ('favorite exists', 'api_favorite',
+             Favorite.objects.filter(user=user, recipe=recipe)),
+            ('cart exists', 'api_shoppingcart',
+             ShoppingCart.objects.filter(user=user, recipe=recipe)),
+            ('subscription exists', 'users_subscription',
+             Subscription.objects.filter(user=user, author=recipe.author)),
+            ('user subscriptions', 'users_subscription',
+             Subscription.objects.filter(user=user)),
+            ('tags filter', 'api_recipe_tags',
+             Recipe.objects.filter(tags__slug=tag.slug)),
+            ('trending feed', 'api_recipe',
+             Recipe.objects.order_by('-trending_score', '-id')[:10]),
+            ('author recipes', 'api_recipe',
+             Recipe.objects.filter(author=recipe.author)[:3]),
+            ('cart totals', 'api_shoppingcartingredient',
+             user.cart_totals.all()),
+        )
+
+    def handle(self, *args, **options):
+        pattern = FULL_SCAN_PATTERNS.get(connection.vendor)
+        if pattern is None:
+            raise CommandError(
+                f'EXPLAIN не поддерживается для {connection.vendor}')
+        if connection.vendor == 'postgresql':
+            # На небольших таблицах планировщик выбирает полный просмотр
+            # даже при наличии индекса, поэтому проверяется, что индекс
+            # вообще может быть использован.
+            with connection.cursor() as cursor:
+                cursor.execute('SET enable_seqscan = off')
+        failures = []
+        for name, table, queryset in self.hot_queries():
+            plan = queryset.explain()
+            full_scan = re.search(pattern.format(table=table), plan)
+            if full_scan:
+                failures.append(name)
+            if full_scan or options['verbose_plans']:
+                self.stdout.write(f'{name}:\n{plan}\n')
+            status = (self.style.ERROR('FULL SCAN') if full_scan
+                      else self.style.SUCCESS('index'))
+            self.stdout.write(f'{name} ({table}): {status}')
+        if connection.vendor == 'postgresql':
+            with connection.cursor() as cursor:
+                cursor.execute('RESET enable_seqscan')
+        if failures:
+            raise CommandError(
+                f'Полный просмотр таблиц в запросах: {", ".join(failures)}')
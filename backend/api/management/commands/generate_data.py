@@ -0,0 +1,212 @@
+import csv
+import io
+import json
+import random
+import time
+from datetime import timedelta
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.utils import timezone
+
+from api import counters, search, shopping_cart, trending
+from api.cache import recipe_feed_cache
+from api.conditional import bump_versions
+from api.models import (Favorite, Ingredient, Recipe, RecipeIngredient,
+                        ShoppingCart, Tag)
+from users.models import Subscription
+
+User = get_user_model()
+
+USERNAME_PREFIX = 'bench_user_'
+IMAGE_NAME = 'recipes/images/bench.png'
+# Прозрачный PNG 1x1.
+IMAGE_CONTENT = bytes.fromhex(
+    '89504e470d0a1a0a0000000d4948445200000001000000010806000000'
+    '1f15c4890000000d49444154789c63000100000500010d0a2db4000000'
+    '0049454e44ae426082'
+)
+TAGS = (
+    ('Завтрак', '#E26C2D', 'breakfast'),
+    ('Обед', '#49B64E', 'lunch'),
+    ('Ужин', '#8775D2', 'dinner'),
+)
+
+
+class Command(BaseCommand):
+    help = ('Заполняет базу воспроизводимым набором синтетических данных '
+            'для нагрузочного тестирования')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--recipes', type=int, default=10000)
+        parser.add_argument('--ingredients-per-recipe', type=int, default=10)
+        parser.add_argument('--favorites-per-user', type=int, default=20)
+        parser.add_argument('--carts-per-user', type=int, default=5)
+        parser.add_argument('--subscriptions-per-user', type=int,
+                            default=10)
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument('--seed', type=int, default=0)
+
+    def insert(self, model, fields, rows):
+        """Вставляет строки пачками: COPY на PostgreSQL, иначе bulk_create.
+
+        Возвращает число вставленных строк.
+        """
+        fields = [model._meta.get_field(field) for field in fields]
+        defaults = [
+            field for field in model._meta.concrete_fields
+            if field.has_default() and field not in fields
+        ]
+        fields += defaults
+        defaults = tuple(field.get_default() for field in defaults)
+        total = 0
+        batch = []
+        for row in rows:
+            batch.append(tuple(row) + defaults)
+            if len(batch) >= self.batch_size:
+                total += self.flush(model, fields, batch)
+                batch = []
+        total += self.flush(model, fields, batch)
+        return total
+
+    def flush(self, model, fields, batch):
+        if not batch:
+            return 0
+        if connection.vendor == 'postgresql':
+            buffer = io.StringIO()
+            csv.writer(buffer).writerows(
+                [json.dumps(value) if isinstance(value, (dict, list))
+                 else value for value in row]
+                for row in batch)
+            buffer.seek(0)
+            with connection.cursor() as cursor:
+                columns = ', '.join(field.column for field in fields)
+                cursor.copy_expert(
+                    f'COPY {model._meta.db_table} ({columns}) '
+                    f'FROM STDIN WITH (FORMAT csv)', buffer)
+        else:
+            attnames = [field.attname for field in fields]
+            model.objects.bulk_create(
+                [model(**dict(zip(attnames, row))) for row in batch])
+        return len(batch)
+
+    def step(self, title, model, fields, rows):
+        started = time.perf_counter()
+        count = self.insert(model, fields, rows)
+        elapsed = time.perf_counter() - started
+        self.stdout.write(
+            f'{title}: {count} за {elapsed:.1f} с '
+            f'({count / max(elapsed, 1e-9):.0f} строк/с)')
+
+    def handle(self, *args, **options):
+        if User.objects.filter(
+                username__startswith=USERNAME_PREFIX).exists():
+            raise CommandError(
+                'Синтетические данные уже загружены, очистите базу')
+        ingredient_ids = list(Ingredient.objects.values_list('id', flat=True))
+        if len(ingredient_ids) < options['ingredients_per_recipe']:
+            raise CommandError(
+                'Недостаточно ингредиентов, выполните load_ing')
+        self.batch_size = options['batch_size']
+        rng = random.Random(options['seed'])
+
+        for name, color, slug in TAGS:
+            Tag.objects.get_or_create(
+                slug=slug, defaults={'name': name, 'color': color})
+        tag_ids = list(Tag.objects.values_list('id', flat=True))
+        if not default_storage.exists(IMAGE_NAME):
+            default_storage.save(IMAGE_NAME, ContentFile(IMAGE_CONTENT))
+
+        password = make_password('password')
+        self.step('Пользователи', User, (
+            'username', 'email', 'first_name', 'last_name', 'password',
+            'is_active', 'is_staff', 'is_superuser', 'date_joined',
+        ), (
+            (f'{USERNAME_PREFIX}{n}', f'{USERNAME_PREFIX}{n}@example.com',
+             f'Имя{n}', f'Фамилия{n}', password, True, False, False,
+             '2024-01-01T00:00:00+00:00')
+            for n in range(options['users'])
+        ))
+        user_ids = list(User.objects.filter(
+            username__startswith=USERNAME_PREFIX).values_list('id', flat=True))
+
+        self.step('Рецепты', Recipe, (
+            'name', 'author', 'image', 'text', 'cooking_time',
+        ), (
+            (f'Рецепт {n}', rng.choice(user_ids), IMAGE_NAME,
+             f'Описание рецепта {n}', rng.randint(1, 180))
+            for n in range(options['recipes'])
+        ))
+        recipe_ids = list(Recipe.objects.filter(
+            author__username__startswith=USERNAME_PREFIX
+        ).values_list('id', flat=True))
+
+        self.step('Ингредиенты рецептов', RecipeIngredient, (
+            'recipe', 'ingredient', 'amount',
+        ), (
+            (recipe_id, ingredient_id, rng.randint(1, 500))
+            for recipe_id in recipe_ids
+            for ingredient_id in rng.sample(
+                ingredient_ids, options['ingredients_per_recipe'])
+        ))
+        self.step('Теги рецептов', Recipe.tags.through, (
+            'recipe', 'tag',
+        ), (
+            (recipe_id, tag_id)
+            for recipe_id in recipe_ids
+            for tag_id in rng.sample(tag_ids, rng.randint(1, len(tag_ids)))
+        ))
+
+        def pairs(targets, per_user, exclude_self=False):
+            per_user = min(per_user, len(targets) - exclude_self)
+            for user_id in user_ids:
+                chosen = set()
+                while len(chosen) < per_user:
+                    target = rng.choice(targets)
+                    if not (exclude_self and target == user_id):
+                        chosen.add(target)
+                for target in chosen:
+                    yield user_id, target
+
+        now = timezone.now()
+
+        def added(rows):
+            """Добавляет к парам время в пределах последних 30 дней."""
+            for row in rows:
+                yield row + (now - timedelta(
+                    seconds=rng.randint(0, 30 * 24 * 3600)),)
+
+        self.step('Избранное', Favorite, ('user', 'recipe', 'created'),
+                  added(pairs(recipe_ids, options['favorites_per_user'])))
+        self.step('Списки покупок', ShoppingCart,
+                  ('user', 'recipe', 'created'),
+                  added(pairs(recipe_ids, options['carts_per_user'])))
+        self.step('Подписки', Subscription, ('user', 'author'),
+                  pairs(user_ids, options['subscriptions_per_user'],
+                        exclude_self=True))
+
+        started = time.perf_counter()
+        shopping_cart.rebuild(
+            User.objects.filter(username__startswith=USERNAME_PREFIX))
+        self.stdout.write(f'Суммы списков покупок пересобраны за '
+                          f'{time.perf_counter() - started:.1f} с')
+        started = time.perf_counter()
+        counters.reconcile()
+        self.stdout.write(f'Счётчики пересчитаны за '
+                          f'{time.perf_counter() - started:.1f} с')
+        started = time.perf_counter()
+        search.rebuild()
+        self.stdout.write(f'Поисковый индекс построен за '
+                          f'{time.perf_counter() - started:.1f} с')
+        started = time.perf_counter()
+        trending.update()
+        self.stdout.write(f'Рейтинги пересчитаны за '
+                          f'{time.perf_counter() - started:.1f} с')
+        bump_versions(Ingredient, Recipe, RecipeIngredient, Tag, User)
+        recipe_feed_cache.invalidate('all')
+        self.stdout.write(self.style.SUCCESS('Данные сгенерированы'))
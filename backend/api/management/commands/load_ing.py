@@ -1,22 +1,162 @@
 import csv
+import io
+import json
+import os
+import time
+from itertools import islice
 
-from django.core.management.base import BaseCommand
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
 
+from api.conditional import bump_versions
 from api.models import Ingredient
 
+DEFAULT_PATH = os.path.join(settings.BASE_DIR, 'api', 'data',
+                            'ingredients.csv')
+READ_SIZE = 64 * 1024
+
+
+def read_csv(file):
+    for row in csv.reader(file):
+        if len(row) >= 2:
+            yield row[0], row[1]
+        elif row:
+            yield row[0], None
+
+
+def read_json(file):
+    """Читает массив объектов JSON по одному, не загружая файл целиком."""
+    decoder = json.JSONDecoder()
+    buffer = ''
+    position = 0
+    started = False
+    while True:
+        chunk = file.read(READ_SIZE)
+        buffer = buffer[position:] + chunk
+        position = 0
+        while True:
+            while position < len(buffer) and buffer[position] in ' \t\r\n,':
+                position += 1
+            if position == len(buffer):
+                break
+            if not started:
+                if buffer[position] != '[':
+                    raise CommandError('Ожидается массив JSON')
+                started = True
+                position += 1
+                continue
+            if buffer[position] == ']':
+                return
+            try:
+                item, end = decoder.raw_decode(buffer, position)
+            except json.JSONDecodeError:
+                if not chunk:
+                    raise CommandError(
+                        f'Некорректный JSON рядом с: {buffer[position:][:50]}')
+                break
+            position = end
+            if not isinstance(item, dict):
+                raise CommandError('Элементы массива JSON должны быть '
+                                   'объектами')
+            yield item.get('name'), item.get('measurement_unit')
+        if not chunk:
+            if started:
+                raise CommandError('Массив JSON не закрыт')
+            return
+
+
+READERS = {'csv': read_csv, 'json': read_json}
+
 
 class Command(BaseCommand):
-    help = 'Загружает таблицу ингредиентов из csv-файла'
+    help = ('Загружает ингредиенты из csv- или json-файла, пропуская уже '
+            'существующие пары название + единица измерения. Других полей '
+            'у ингредиента нет, поэтому обновлять при совпадении нечего.')
 
-    def handle(self, *args, **options):
-        ingredients = []
-        with open('api/data/ingredients.csv', encoding='utf-8') as file:
-            data_reader = csv.reader(file)
-            for row in data_reader:
-                name, unit = row
-                ingredients.append(
-                    Ingredient(name=name, measurement_unit=unit))
+    def add_arguments(self, parser):
+        parser.add_argument('path', nargs='?', default=DEFAULT_PATH)
+        parser.add_argument(
+            '--format', choices=READERS,
+            help='Формат файла, по умолчанию определяется по расширению')
+        parser.add_argument('--batch-size', type=int, default=10000)
+        parser.add_argument('--encoding', default='utf-8')
+
+    def clean(self, rows):
+        name_length = Ingredient._meta.get_field('name').max_length
+        unit_length = Ingredient._meta.get_field(
+            'measurement_unit').max_length
+        for name, unit in rows:
+            self.read += 1
+            name, unit = (name or '').strip(), (unit or '').strip()
+            if (not name or not unit or len(name) > name_length
+                    or len(unit) > unit_length):
+                self.skipped += 1
+                continue
+            yield name, unit
 
-        Ingredient.objects.bulk_create(ingredients)
+    def batches(self, rows, batch_size):
+        rows = iter(rows)
+        while True:
+            batch = list(islice(rows, batch_size))
+            if not batch:
+                return
+            yield batch
 
-        self.stdout.write(self.style.SUCCESS('Ингредиенты загружены'))
+    def load_postgresql(self, rows, batch_size):
+        """COPY во временную таблицу и вставка с ON CONFLICT DO NOTHING."""
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'CREATE TEMPORARY TABLE ingredient_import '
+                '(name text, measurement_unit text) ON COMMIT DROP')
+            for batch in self.batches(rows, batch_size):
+                buffer = io.StringIO()
+                csv.writer(buffer).writerows(batch)
+                buffer.seek(0)
+                cursor.copy_expert(
+                    'COPY ingredient_import (name, measurement_unit) '
+                    'FROM STDIN WITH (FORMAT csv)', buffer)
+            cursor.execute(
+                f'INSERT INTO {Ingredient._meta.db_table} '
+                '(name, measurement_unit) '
+                'SELECT DISTINCT name, measurement_unit '
+                'FROM ingredient_import '
+                'ON CONFLICT (name, measurement_unit) DO NOTHING')
+            return cursor.rowcount
+
+    def load_default(self, rows, batch_size):
+        before = Ingredient.objects.count()
+        for batch in self.batches(rows, batch_size):
+            Ingredient.objects.bulk_create(
+                (Ingredient(name=name, measurement_unit=unit)
+                 for name, unit in batch),
+                ignore_conflicts=True)
+        return Ingredient.objects.count() - before
+
+    def handle(self, *args, **options):
+        path = options['path']
+        file_format = options['format'] or os.path.splitext(
+            path)[1].lstrip('.').lower()
+        if file_format not in READERS:
+            raise CommandError(f'Неизвестный формат файла: {path}')
+        load = (self.load_postgresql if connection.vendor == 'postgresql'
+                else self.load_default)
+        self.read = self.skipped = 0
+        started = time.perf_counter()
+        try:
+            with open(path, encoding=options['encoding'], newline='') as file:
+                with transaction.atomic():
+                    created = load(
+                        self.clean(READERS[file_format](file)),
+                        options['batch_size'])
+        except OSError as error:
+            raise CommandError(f'Не удалось прочитать {path}: {error}')
+        elapsed = time.perf_counter() - started
+        if created:
+            bump_versions(Ingredient)
+        existing = self.read - self.skipped - created
+        self.stdout.write(self.style.SUCCESS(
+            f'Ингредиенты загружены: прочитано {self.read}, добавлено '
+            f'{created}, уже были или повторялись {existing}, пропущено '
+            f'некорректных {self.skipped} за '
+            f'{elapsed:.1f} с ({self.read / max(elapsed, 1e-9):.0f} строк/с)'))
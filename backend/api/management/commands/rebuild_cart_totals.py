@@ -0,0 +1,36 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from api import shopping_cart
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = 'Пересобирает или сверяет суммы ингредиентов в списках покупок'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--verify', action='store_true',
+            help='Только сверить суммы с рецептами, ничего не меняя')
+        parser.add_argument(
+            '--user', action='append', dest='usernames', metavar='USERNAME',
+            help='Ограничить пользователем (можно указать несколько раз)')
+
+    def handle(self, *args, **options):
+        users = None
+        if options['usernames']:
+            users = User.objects.filter(username__in=options['usernames'])
+        if options['verify']:
+            mismatches = shopping_cart.verify(users)
+            for (user_id, ingredient_id), (actual, expected) in sorted(
+                    mismatches.items()):
+                self.stdout.write(
+                    f'user={user_id} ingredient={ingredient_id}: '
+                    f'{actual} вместо {expected}')
+            if mismatches:
+                raise CommandError(f'Расхождений: {len(mismatches)}')
+            self.stdout.write(self.style.SUCCESS('Расхождений нет'))
+            return
+        shopping_cart.rebuild(users)
+        self.stdout.write(self.style.SUCCESS('Списки покупок пересобраны'))
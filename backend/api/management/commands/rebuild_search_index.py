@@ -0,0 +1,16 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from api import search
+
+
+class Command(BaseCommand):
+    help = 'Строит поисковый индекс рецептов заново'
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        search.rebuild()
+        self.stdout.write(self.style.SUCCESS(
+            f'Поисковый индекс пересобран за '
+            f'{time.perf_counter() - started:.1f} с'))
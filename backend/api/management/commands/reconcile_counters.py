@@ -0,0 +1,35 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from api import counters
+
+
+class Command(BaseCommand):
+    help = ('Сверяет и исправляет счётчики избранного, списков покупок и '
+            'рецептов авторов')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--verify', action='store_true',
+            help='Только сверить счётчики, ничего не меняя')
+
+    def handle(self, *args, **options):
+        if options['verify']:
+            mismatches = 0
+            for recipe_id, fields in sorted(
+                    counters.recipe_mismatches().items()):
+                for field, (actual, expected) in fields.items():
+                    self.stdout.write(f'recipe={recipe_id} {field}: '
+                                      f'{actual} вместо {expected}')
+                    mismatches += 1
+            for author_id, (actual, expected) in sorted(
+                    counters.author_mismatches().items()):
+                self.stdout.write(f'author={author_id} recipes_count: '
+                                  f'{actual} вместо {expected}')
+                mismatches += 1
+            if mismatches:
+                raise CommandError(f'Расхождений: {mismatches}')
+            self.stdout.write(self.style.SUCCESS('Расхождений нет'))
+            return
+        fixed = counters.reconcile()
+        self.stdout.write(self.style.SUCCESS(
+            f'Счётчики сверены, исправлено записей: {fixed}'))
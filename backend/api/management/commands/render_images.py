@@ -0,0 +1,33 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from api import renditions
+from api.models import Recipe
+
+
+class Command(BaseCommand):
+    help = ('Строит уменьшенные копии изображений рецептов, у которых их '
+            'ещё нет')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--all', action='store_true',
+            help='Перестроить копии для всех рецептов')
+
+    def handle(self, *args, **options):
+        recipes = Recipe.objects.exclude(image='').only(
+            'id', 'image', 'image_renditions').order_by('id')
+        started = time.perf_counter()
+        done = 0
+        for recipe in recipes.iterator():
+            if not options['all'] and not renditions.needs_renditions(
+                    recipe):
+                continue
+            try:
+                done += renditions.render(recipe.pk)
+            except Exception as error:
+                self.stderr.write(f'Рецепт {recipe.pk}: {error}')
+        self.stdout.write(self.style.SUCCESS(
+            f'Обработано изображений: {done} за '
+            f'{time.perf_counter() - started:.1f} с'))
@@ -0,0 +1,31 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from api import trending
+
+
+class Command(BaseCommand):
+    help = ('Пересчитывает рейтинг популярности рецептов для сортировки '
+            'ordering=trending')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--interval', type=int, default=0, metavar='SECONDS',
+            help='Пересчитывать в цикле с указанным интервалом')
+
+    def update(self):
+        started = time.perf_counter()
+        updated = trending.update()
+        self.stdout.write(self.style.SUCCESS(
+            f'Рейтинги обновлены: {updated} рецептов за '
+            f'{time.perf_counter() - started:.1f} с'))
+
+    def handle(self, *args, **options):
+        interval = options['interval']
+        self.update()
+        while interval > 0:
+            time.sleep(interval)
+            close_old_connections()
+            self.update()
@@ -0,0 +1,373 @@
+import atexit
+import fcntl
+import glob
+import json
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5,
+                    5.0, 10.0)
+QUERY_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200)
+POOL_WAIT_BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0)
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+# Метрики-значения: у завершившегося процесса они уже не действуют.
+GAUGES = frozenset(('pool_connections', 'pool_max'))
+# Файл METRICS_DIR/<FINISHED>.json со счётчиками завершившихся процессов.
+FINISHED = 'finished'
+
+
+class Registry:
+    """Метрики процесса с агрегацией между воркерами через файлы.
+
+    Каждый процесс хранит свои значения в памяти и не чаще раза в
+    METRICS_FLUSH_INTERVAL секунд сохраняет их в METRICS_DIR/<pid>.json.
+    Эндпоинт метрик складывает файлы всех процессов, поэтому видит данные
+    всех воркеров gunicorn независимо от того, какой из них ответил.
+    Чтобы счётчики не убывали, а файлы не копились, при сборе счётчики
+    завершившихся воркеров переносятся в общий файл finished.json, а их
+    файлы удаляются. Значения из GAUGES в сумму входят только у живых
+    процессов.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.pid = None
+        self.flushed = 0.0
+
+    def path(self, pid):
+        return os.path.join(settings.METRICS_DIR, f'{pid}.json')
+
+    def ensure_process(self):
+        """Начинает значения заново в новом процессе, например после fork."""
+        pid = os.getpid()
+        if self.pid == pid:
+            return
+        self.pid = pid
+        self.values = {}
+        try:
+            with open(self.path(pid)) as file:
+                self.values = self.load(file)
+        except (OSError, ValueError):
+            pass
+
+    @staticmethod
+    def load(file):
+        return {
+            name: {tuple(labels): value for labels, value in series}
+            for name, series in json.load(file).items()
+        }
+
+    def add(self, name, labels, value):
+        series = self.values.setdefault(name, {})
+        series[labels] = series.get(labels, 0) + value
+
+    def observe(self, name, labels, value, buckets):
+        """Добавляет значение в гистограмму.
+
+        Гистограмма хранится списком: накопительные счётчики корзин,
+        общее число значений и их сумма.
+        """
+        series = self.values.setdefault(name, {})
+        histogram = series.get(labels)
+        if histogram is None:
+            histogram = series[labels] = [0] * (len(buckets) + 2)
+        for index, bound in enumerate(buckets):
+            if value <= bound:
+                histogram[index] += 1
+        histogram[-2] += 1
+        histogram[-1] += value
+
+    def record_request(self, route, method, status, duration, queries,
+                       db_duration):
+        with self.lock:
+            self.ensure_process()
+            self.add('requests', (route, method, str(status)), 1)
+            self.observe('duration', (route,), duration, DURATION_BUCKETS)
+            self.observe('queries', (route,), queries, QUERY_BUCKETS)
+            self.add('db_duration', (route,), db_duration)
+            self.flush_if_due()
+
+    def record_cache(self, cache, hit):
+        with self.lock:
+            self.ensure_process()
+            self.add('cache', (cache, 'hit' if hit else 'miss'), 1)
+
+    def record_route(self, database, reason):
+        with self.lock:
+            self.ensure_process()
+            self.add('routes', (database, reason), 1)
+
+    def record_pool_checkout(self, alias, result, wait):
+        with self.lock:
+            self.ensure_process()
+            self.add('pool_checkouts', (alias, result), 1)
+            self.observe('pool_wait', (alias,), wait, POOL_WAIT_BUCKETS)
+
+    def record_pool_discard(self, alias, reason):
+        with self.lock:
+            self.ensure_process()
+            self.add('pool_discards', (alias, reason), 1)
+
+    def record_pool_state(self, alias, in_use, idle, max_size):
+        """Сохраняет текущее состояние пула: это значения, а не счётчики."""
+        with self.lock:
+            self.ensure_process()
+            connections = self.values.setdefault('pool_connections', {})
+            connections[(alias, 'in_use')] = in_use
+            connections[(alias, 'idle')] = idle
+            self.values.setdefault('pool_max', {})[(alias,)] = max_size
+
+    def flush_if_due(self):
+        if time.monotonic() - self.flushed >= settings.METRICS_FLUSH_INTERVAL:
+            self.flush()
+
+    def flush(self):
+        self.flushed = time.monotonic()
+        path = self.path(self.pid)
+        try:
+            self.save(path, self.values)
+        except OSError:
+            logger.exception('Не удалось сохранить метрики в %s', path)
+
+    @staticmethod
+    def save(path, values):
+        data = {
+            name: [[list(labels), value] for labels, value in series.items()]
+            for name, series in values.items()
+        }
+        os.makedirs(settings.METRICS_DIR, exist_ok=True)
+        with open(f'{path}.tmp', 'w') as file:
+            json.dump(data, file)
+        os.replace(f'{path}.tmp', path)
+
+    def read(self, path):
+        try:
+            with open(path) as file:
+                return self.load(file)
+        except (OSError, ValueError):
+            return None
+
+    def files(self):
+        """Файлы процессов: [(pid, путь)]."""
+        result = []
+        for path in glob.glob(os.path.join(settings.METRICS_DIR, '*.json')):
+            name = os.path.basename(path)[:-len('.json')]
+            if name.isdigit():
+                result.append((int(name), path))
+        return result
+
+    def flush_now(self):
+        with self.lock:
+            if self.pid == os.getpid():
+                self.flush()
+
+    @contextmanager
+    def locked(self):
+        """Блокировка каталога метрик между процессами."""
+        os.makedirs(settings.METRICS_DIR, exist_ok=True)
+        path = os.path.join(settings.METRICS_DIR, f'{FINISHED}.lock')
+        with open(path, 'w') as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            yield
+
+    def fold_finished(self):
+        """Переносит счётчики завершившихся процессов в finished.json."""
+        finished = [path for pid, path in self.files()
+                    if not process_alive(pid)]
+        if not finished:
+            return
+        path = self.path(FINISHED)
+        total = self.read(path) or {}
+        for finished_path in finished:
+            merge(total, self.read(finished_path) or {}, gauges=False)
+        self.save(path, total)
+        for finished_path in finished:
+            os.remove(finished_path)
+
+    def collect(self):
+        """Сумма значений всех процессов.
+
+        Перенос и чтение идут под блокировкой, чтобы два воркера не
+        перенесли одни и те же значения дважды и не прочитали файлы
+        посередине переноса.
+        """
+        self.flush_now()
+        with self.locked():
+            try:
+                self.fold_finished()
+            except OSError:
+                logger.exception(
+                    'Не удалось перенести метрики завершившихся процессов')
+            total = {}
+            merge(total, self.read(self.path(FINISHED)) or {}, gauges=False)
+            for pid, path in self.files():
+                values = self.read(path)
+                if values is not None:
+                    merge(total, values, gauges=process_alive(pid))
+        return total
+
+
+def merge(total, values, gauges):
+    """Добавляет values к total; gauges=False пропускает GAUGES."""
+    for name, series in values.items():
+        if name in GAUGES and not gauges:
+            continue
+        merged = total.setdefault(name, {})
+        for labels, value in series.items():
+            current = merged.get(labels)
+            if current is None:
+                merged[labels] = value
+            elif isinstance(value, list):
+                merged[labels] = [a + b for a, b in zip(current, value)]
+            else:
+                merged[labels] = current + value
+
+
+def process_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+registry = Registry()
+atexit.register(registry.flush_now)
+
+
+def record_request(request, response, performance):
+    match = getattr(request, 'resolver_match', None)
+    route = match.view_name if match is not None else 'unmatched'
+    registry.record_request(
+        route, request.method, response.status_code, performance.duration,
+        performance.stats.count, performance.stats.duration)
+
+
+def record_cache(cache, hit):
+    registry.record_cache(cache, hit)
+
+
+def record_route(database, reason):
+    registry.record_route(database, reason)
+
+
+def record_pool_checkout(alias, result, wait):
+    registry.record_pool_checkout(alias, result, wait)
+
+
+def record_pool_discard(alias, reason):
+    registry.record_pool_discard(alias, reason)
+
+
+def record_pool_state(alias, in_use, idle, max_size):
+    registry.record_pool_state(alias, in_use, idle, max_size)
+
+
+def escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace(
+        '\n', '\\n')
+
+
+def format_labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    return ','.join(f'{name}="{escape(value)}"' for name, value in pairs)
+
+
+def histogram_lines(name, label_names, series, buckets):
+    for labels, histogram in sorted(series.items()):
+        bounds = [*buckets, '+Inf']
+        counts = [*histogram[:len(buckets)], histogram[-2]]
+        for bound, count in zip(bounds, counts):
+            extra = [('le', bound)]
+            yield (f'{name}_bucket'
+                   f'{{{format_labels(label_names, labels, extra)}}} {count}')
+        labels = format_labels(label_names, labels)
+        yield f'{name}_sum{{{labels}}} {histogram[-1]}'
+        yield f'{name}_count{{{labels}}} {histogram[-2]}'
+
+
+def counter_lines(name, label_names, series):
+    for labels, value in sorted(series.items()):
+        yield f'{name}{{{format_labels(label_names, labels)}}} {value}'
+
+
+def render():
+    """Метрики всех процессов в текстовом формате Prometheus."""
+    values = registry.collect()
+    cache = values.get('cache', {})
+    ratios = {}
+    for (name, result), count in cache.items():
+        hits, total = ratios.get((name,), (0, 0))
+        ratios[(name,)] = (hits + (count if result == 'hit' else 0),
+                           total + count)
+    sections = (
+        ('foodgram_http_requests_total', 'counter',
+         'Число ответов по маршрутам, методам и статусам',
+         counter_lines('foodgram_http_requests_total',
+                       ('route', 'method', 'status'),
+                       values.get('requests', {}))),
+        ('foodgram_http_request_duration_seconds', 'histogram',
+         'Время обработки запроса',
+         histogram_lines('foodgram_http_request_duration_seconds',
+                         ('route',), values.get('duration', {}),
+                         DURATION_BUCKETS)),
+        ('foodgram_http_request_queries', 'histogram',
+         'Число запросов к БД на запрос',
+         histogram_lines('foodgram_http_request_queries', ('route',),
+                         values.get('queries', {}), QUERY_BUCKETS)),
+        ('foodgram_db_duration_seconds_total', 'counter',
+         'Суммарное время запросов к БД',
+         counter_lines('foodgram_db_duration_seconds_total', ('route',),
+                       values.get('db_duration', {}))),
+        ('foodgram_cache_requests_total', 'counter',
+         'Обращения к кешам: hit или miss',
+         counter_lines('foodgram_cache_requests_total',
+                       ('cache', 'result'), cache)),
+        ('foodgram_cache_hit_ratio', 'gauge',
+         'Доля попаданий в кеш',
+         counter_lines('foodgram_cache_hit_ratio', ('cache',), {
+             labels: hits / total
+             for labels, (hits, total) in ratios.items() if total
+         })),
+        ('foodgram_db_routes_total', 'counter',
+         'Запросы по БД для чтения: replica, pinned, unhealthy или write',
+         counter_lines('foodgram_db_routes_total', ('database', 'reason'),
+                       values.get('routes', {}))),
+        ('foodgram_db_pool_checkouts_total', 'counter',
+         'Выдачи соединений из пула: reused, new или timeout',
+         counter_lines('foodgram_db_pool_checkouts_total',
+                       ('alias', 'result'),
+                       values.get('pool_checkouts', {}))),
+        ('foodgram_db_pool_wait_seconds', 'histogram',
+         'Ожидание соединения из пула',
+         histogram_lines('foodgram_db_pool_wait_seconds', ('alias',),
+                         values.get('pool_wait', {}), POOL_WAIT_BUCKETS)),
+        ('foodgram_db_pool_discards_total', 'counter',
+         'Закрытые соединения пула по причинам',
+         counter_lines('foodgram_db_pool_discards_total',
+                       ('alias', 'reason'),
+                       values.get('pool_discards', {}))),
+        ('foodgram_db_pool_connections', 'gauge',
+         'Соединения пула всех воркеров: in_use или idle',
+         counter_lines('foodgram_db_pool_connections', ('alias', 'state'),
+                       values.get('pool_connections', {}))),
+        ('foodgram_db_pool_max_connections', 'gauge',
+         'Предельный размер пулов всех воркеров',
+         counter_lines('foodgram_db_pool_max_connections', ('alias',),
+                       values.get('pool_max', {}))),
+    )
+    lines = []
+    for name, kind, help_text, samples in sections:
+        lines.append(f'# HELP {name} {help_text}')
+        lines.append(f'# TYPE {name} {kind}')
+        lines.extend(samples)
+    return '\n'.join(lines) + '\n'
@@ -0,0 +1,176 @@
+import hashlib
+import logging
+import time
+from collections import Counter
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import DEFAULT_DB_ALIAS, connections
+from rest_framework.permissions import SAFE_METHODS
+
+from . import metrics, replicas
+
+logger = logging.getLogger(__name__)
+
+MAX_LOGGED_SQL = 1000
+
+
+def fingerprint(sql):
+    """Короткий отпечаток текста запроса без параметров."""
+    return hashlib.md5(sql.encode()).hexdigest()[:12]
+
+
+class QueryStats:
+    """Обёртка execute_wrapper: время, число и повторы запросов к БД.
+
+    Запросы сравниваются по тексту SQL без параметров, поэтому N+1 по
+    одному шаблону виден как повторы одного отпечатка.
+    """
+
+    def __init__(self, slow_query):
+        self.slow_query = slow_query
+        self.duration = 0.0
+        self.count = 0
+        self.statements = Counter()
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            duration = time.perf_counter() - started
+            self.duration += duration
+            self.count += 1
+            self.statements[sql] += 1
+            if duration >= self.slow_query:
+                logger.warning(
+                    'slow_query duration_ms=%.1f alias=%s fingerprint=%s '
+                    'sql="%s"', duration * 1000,
+                    context['connection'].alias, fingerprint(sql),
+                    sql[:MAX_LOGGED_SQL])
+
+    def duplicates(self):
+        """Повторявшиеся запросы: [(отпечаток, число)], частые первыми."""
+        return [
+            (fingerprint(sql), count)
+            for sql, count in self.statements.most_common()
+            if count > 1
+        ]
+
+
+class RequestPerformance:
+    """Итоги запроса: время, запросы к БД и их повторы."""
+
+    def __init__(self, request, stats):
+        self.request = request
+        self.stats = stats
+        self.started = time.perf_counter()
+        self.duration = None
+
+    def finish(self):
+        self.duration = time.perf_counter() - self.started
+
+    def server_timing(self):
+        stats = self.stats
+        return (
+            f'app;dur={self.duration * 1000:.1f}, '
+            f'db;dur={stats.duration * 1000:.1f};'
+            f'desc="{stats.count} queries", '
+            f'dup;desc="{len(stats.duplicates())} duplicated"'
+        )
+
+    def report(self, response):
+        """Записывает метрики запроса и строку лога, если он медленный."""
+        metrics.record_request(self.request, response, self)
+        if self.duration < settings.PERFORMANCE_SLOW_REQUEST:
+            return
+        duplicates = self.stats.duplicates()
+        logger.warning(
+            'slow_request method=%s path=%s status=%s duration_ms=%.1f '
+            'db_ms=%.1f queries=%d duplicates=%s',
+            self.request.method, self.request.path, response.status_code,
+            self.duration * 1000, self.stats.duration * 1000,
+            self.stats.count,
+            ','.join(f'{key}x{count}' for key, count in duplicates) or '-')
+
+
+class PerformanceMiddleware:
+    """Измеряет время запроса и работу с БД.
+
+    Результат отдаётся в заголовке Server-Timing, сохраняется в
+    request.performance и попадает в метрики маршрута; запросы дольше
+    PERFORMANCE_SLOW_REQUEST и SQL дольше PERFORMANCE_SLOW_QUERY секунд
+    пишутся в лог. Для потоковых ответов заголовок содержит время до
+    начала передачи, а метрики и строка лога пишутся после её окончания.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        stats = QueryStats(settings.PERFORMANCE_SLOW_QUERY)
+        performance = RequestPerformance(request, stats)
+        request.performance = performance
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(stats))
+            response = self.get_response(request)
+        performance.finish()
+        if settings.PERFORMANCE_SERVER_TIMING:
+            response['Server-Timing'] = performance.server_timing()
+        if response.streaming:
+            response.streaming_content = self.measure_stream(
+                response.streaming_content, performance, response)
+        else:
+            performance.report(response)
+        return response
+
+    def measure_stream(self, content, performance, response):
+        wrapped = connections.all()
+        for connection in wrapped:
+            connection.execute_wrappers.append(performance.stats)
+        try:
+            yield from content
+        finally:
+            for connection in wrapped:
+                if performance.stats in connection.execute_wrappers:
+                    connection.execute_wrappers.remove(performance.stats)
+            performance.finish()
+            performance.report(response)
+
+
+class ReplicaMiddleware:
+    """Направляет чтение безопасных запросов на реплики из DB_REPLICAS.
+
+    GET, HEAD и OPTIONS читают с исправной реплики, остальные запросы
+    работают только с основной БД. После записи клиент на
+    REPLICA_PIN_SECONDS закрепляется за основной БД, чтобы видеть свои
+    изменения. Если исправных реплик нет, чтение идёт с основной БД.
+    """
+
+    def __init__(self, get_response):
+        if not settings.DATABASE_REPLICAS:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if request.method not in SAFE_METHODS:
+            metrics.record_route(DEFAULT_DB_ALIAS, 'write')
+            response = self.get_response(request)
+            replicas.pin(request)
+            return response
+        if replicas.pinned(request):
+            alias, reason = None, 'pinned'
+        else:
+            alias = replicas.choose_replica()
+            reason = 'unhealthy' if alias is None else 'replica'
+        metrics.record_route(alias or DEFAULT_DB_ALIAS, reason)
+        if alias is None:
+            return self.get_response(request)
+        token = replicas.read_database.set(alias)
+        try:
+            with replicas.watch_connection(alias):
+                return self.get_response(request)
+        finally:
+            replicas.read_database.reset(token)
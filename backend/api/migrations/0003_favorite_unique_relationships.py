@@ -0,0 +1,53 @@
+# Generated by Django 3.2.3 on 2026-10-18 18:15
+
+import django.core.validators
+from django.db import migrations, models
+
+
+def remove_duplicate_favorites(apps, schema_editor):
+    Favorite = apps.get_model('api', 'Favorite')
+    duplicates = Favorite.objects.values('user', 'recipe').annotate(
+        first_id=models.Min('id'), total=models.Count('id')
+    ).filter(total__gt=1).order_by()
+    for row in duplicates:
+        Favorite.objects.filter(
+            user=row['user'], recipe=row['recipe']
+        ).exclude(id=row['first_id']).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0002_alter_tag_color'),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            remove_duplicate_favorites, migrations.RunPython.noop),
+        migrations.AlterModelOptions(
+            name='favorite',
+            options={'ordering': ['id'], 'verbose_name': 'Избранное', 'verbose_name_plural': 'Избранное'},
+        ),
+        migrations.AlterModelOptions(
+            name='recipeingredient',
+            options={'ordering': ['id'], 'verbose_name': 'Ингредиент рецепта', 'verbose_name_plural': 'Ингредиенты рецептов'},
+        ),
+        migrations.AlterModelOptions(
+            name='shoppingcart',
+            options={'ordering': ['id'], 'verbose_name': 'Список покупок', 'verbose_name_plural': 'Списки покупок'},
+        ),
+        migrations.AlterField(
+            model_name='recipe',
+            name='cooking_time',
+            field=models.PositiveSmallIntegerField(validators=[django.core.validators.MinValueValidator(1), django.core.validators.MaxValueValidator(32000)], verbose_name='Время приготовления'),
+        ),
+        migrations.AlterField(
+            model_name='recipeingredient',
+            name='amount',
+            field=models.PositiveSmallIntegerField(validators=[django.core.validators.MinValueValidator(1), django.core.validators.MaxValueValidator(32000)], verbose_name='Количество'),
+        ),
+        migrations.AddConstraint(
+            model_name='favorite',
+            constraint=models.UniqueConstraint(fields=('recipe', 'user'), name='api_favorite_unique_relationships'),
+        ),
+    ]
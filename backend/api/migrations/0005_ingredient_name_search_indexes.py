@@ -0,0 +1,43 @@
+from django.db import migrations
+
+POSTGRES_FORWARD = (
+    'CREATE EXTENSION IF NOT EXISTS pg_trgm',
+    'CREATE INDEX IF NOT EXISTS api_ingredient_name_prefix_idx '
+    'ON api_ingredient (UPPER(name) text_pattern_ops)',
+    'CREATE INDEX IF NOT EXISTS api_ingredient_name_trgm_idx '
+    'ON api_ingredient USING gin (UPPER(name) gin_trgm_ops)',
+)
+POSTGRES_BACKWARD = (
+    'DROP INDEX IF EXISTS api_ingredient_name_trgm_idx',
+    'DROP INDEX IF EXISTS api_ingredient_name_prefix_idx',
+)
+
+
+def run_on_postgres(statements):
+    def run(apps, schema_editor):
+        if schema_editor.connection.vendor != 'postgresql':
+            return
+        for statement in statements:
+            schema_editor.execute(statement)
+    return run
+
+
+class Migration(migrations.Migration):
+    """Индексы для поиска ингредиентов по началу и части названия.
+
+    Нужны поиску в БД, когда каталог больше INGREDIENT_INDEX_MAX_SIZE
+    (api/autocomplete.py). Поиск выполняется по UPPER(name), как в
+    lookup-ах istartswith и icontains. На других СУБД миграция ничего не
+    делает.
+    """
+
+    dependencies = [
+        ('api', '0004_shoppingcartingredient'),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            run_on_postgres(POSTGRES_FORWARD),
+            run_on_postgres(POSTGRES_BACKWARD),
+        ),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 3.2.3 on 2026-10-18 18:18
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0005_ingredient_name_search_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ModelVersion',
+            fields=[
+                ('name', models.CharField(max_length=100, primary_key=True, serialize=False, verbose_name='Модель')),
+                ('version', models.PositiveBigIntegerField(default=0, verbose_name='Версия')),
+                ('updated_at', models.DateTimeField(default=django.utils.timezone.now, verbose_name='Изменена')),
+            ],
+            options={
+                'verbose_name': 'Версия модели',
+                'verbose_name_plural': 'Версии моделей',
+                'ordering': ('name',),
+            },
+        ),
+    ]
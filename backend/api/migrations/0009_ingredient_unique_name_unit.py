@@ -0,0 +1,56 @@
+# Generated by Django 3.2.3 on 2026-10-18 18:31
+
+from django.db import migrations, models
+
+RECIPE_AMOUNT_LIMIT = 32767
+
+
+def merge_duplicate_ingredients(apps, schema_editor):
+    """Оставляет один ингредиент из повторов, перенося ссылки на него."""
+    Ingredient = apps.get_model('api', 'Ingredient')
+    references = (
+        (apps.get_model('api', 'RecipeIngredient'), 'recipe_id',
+         RECIPE_AMOUNT_LIMIT),
+        (apps.get_model('api', 'ShoppingCartIngredient'), 'user_id', None),
+    )
+    duplicates = Ingredient.objects.values(
+        'name', 'measurement_unit'
+    ).annotate(
+        first_id=models.Min('id'), total=models.Count('id')
+    ).filter(total__gt=1).order_by()
+    for row in duplicates:
+        first_id = row['first_id']
+        duplicate_ids = list(Ingredient.objects.filter(
+            name=row['name'], measurement_unit=row['measurement_unit']
+        ).exclude(id=first_id).values_list('id', flat=True))
+        for model, owner, limit in references:
+            for item in model.objects.filter(ingredient_id__in=duplicate_ids):
+                kept = model.objects.filter(
+                    ingredient_id=first_id, **{owner: getattr(item, owner)}
+                ).first()
+                if kept is None:
+                    item.ingredient_id = first_id
+                    item.save(update_fields=['ingredient'])
+                    continue
+                kept.amount += item.amount
+                if limit is not None:
+                    kept.amount = min(kept.amount, limit)
+                kept.save(update_fields=['amount'])
+                item.delete()
+        Ingredient.objects.filter(id__in=duplicate_ids).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0008_recipe_image_renditions'),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            merge_duplicate_ingredients, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='ingredient',
+            constraint=models.UniqueConstraint(fields=('name', 'measurement_unit'), name='unique_ingredient_name_unit'),
+        ),
+    ]
@@ -0,0 +1,61 @@
+# Generated by Django 3.2.3 on 2026-10-18 18:40
+
+from django.conf import settings
+import django.contrib.postgres.search
+from django.db import migrations
+
+FTS_TABLE = 'api_recipe_fts'
+INGREDIENT_NAMES = (
+    "SELECT {concat} FROM api_recipeingredient ri "
+    "JOIN api_ingredient i ON i.id = ri.ingredient_id "
+    "WHERE ri.recipe_id = r.id"
+)
+
+
+def create_search_index(apps, schema_editor):
+    """GIN-индекс на PostgreSQL или таблица FTS5 на SQLite."""
+    vendor = schema_editor.connection.vendor
+    if vendor == 'postgresql':
+        names = INGREDIENT_NAMES.format(concat="string_agg(i.name, ' ')")
+        schema_editor.execute(
+            'UPDATE api_recipe r SET search_vector = '
+            "setweight(to_tsvector(%s::regconfig, r.name), 'A') || "
+            f"setweight(to_tsvector(%s::regconfig, coalesce(({names}), '')),"
+            " 'B') || "
+            "setweight(to_tsvector(%s::regconfig, r.text), 'C')",
+            [settings.SEARCH_CONFIG] * 3)
+        schema_editor.execute(
+            'CREATE INDEX recipe_search_vector_idx ON api_recipe '
+            'USING gin (search_vector)')
+    elif vendor == 'sqlite':
+        names = INGREDIENT_NAMES.format(concat="group_concat(i.name, ' ')")
+        schema_editor.execute(
+            f'CREATE VIRTUAL TABLE {FTS_TABLE} USING fts5('
+            "name, text, ingredients, tokenize='unicode61')")
+        schema_editor.execute(
+            f'INSERT INTO {FTS_TABLE} (rowid, name, text, ingredients) '
+            f'SELECT r.id, r.name, r.text, ({names}) FROM api_recipe r')
+
+
+def drop_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'postgresql':
+        schema_editor.execute('DROP INDEX IF EXISTS recipe_search_vector_idx')
+    elif vendor == 'sqlite':
+        schema_editor.execute(f'DROP TABLE IF EXISTS {FTS_TABLE}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0011_recipe_trending'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True, verbose_name='Поисковый вектор'),
+        ),
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
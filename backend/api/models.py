@@ -1,9 +1,13 @@
 from colorfield.fields import ColorField
 from django.contrib.auth import get_user_model
 from django.db import models
+from django.db.models import BooleanField, Exists, OuterRef, Prefetch, Value
+from django.contrib.postgres.search import SearchVectorField
 from django.core.validators import MaxValueValidator, MinValueValidator
+from django.utils import timezone
 
 from .constants import MIN_FIELD_VALUE, MAX_FIELD_VALUE
+from users.models import annotate_is_subscribed
 
 User = get_user_model()
 
@@ -40,11 +44,45 @@ class Ingredient(models.Model):
         verbose_name = 'Ингредиент'
         verbose_name_plural = 'Ингредиенты'
         ordering = ('name',)
+        constraints = (
+            models.UniqueConstraint(fields=('name', 'measurement_unit'),
+                                    name='unique_ingredient_name_unit'),
+        )
 
     def __str__(self):
         return f'{self.name} {self.measurement_unit}'
 
 
+class RecipeQuerySet(models.QuerySet):
+    """Выборки рецептов с данными для сериализации без N+1 запросов."""
+
+    def with_user_flags(self, user):
+        """Добавляет флаги is_favorited и is_in_shopping_cart для user."""
+        if user.is_anonymous:
+            false = Value(False, output_field=BooleanField())
+            return self.annotate(is_favorited=false, is_in_shopping_cart=false)
+        return self.annotate(
+            is_favorited=Exists(Favorite.objects.filter(
+                user=user, recipe=OuterRef('pk'))),
+            is_in_shopping_cart=Exists(ShoppingCart.objects.filter(
+                user=user, recipe=OuterRef('pk'))),
+        )
+
+    def for_feed(self, user):
+        """Рецепты со всеми связями, нужными RecipeListSerializer."""
+        return self.with_user_flags(user).prefetch_related(
+            'tags',
+            Prefetch(
+                'recipe_ingredient',
+                queryset=RecipeIngredient.objects.select_related('ingredient')
+            ),
+            Prefetch(
+                'author',
+                queryset=annotate_is_subscribed(User.objects.all(), user)
+            ),
+        )
+
+
 class Recipe(models.Model):
     """Модель для рецептов."""
     name = models.CharField(
@@ -61,6 +99,12 @@ class Recipe(models.Model):
         verbose_name='Изображение',
         upload_to='recipes/images/',
     )
+    image_renditions = models.JSONField(
+        verbose_name='Уменьшенные копии изображения',
+        default=dict,
+        blank=True,
+        editable=False,
+    )
     text = models.TextField(verbose_name='Описание', max_length=5000)
     ingredients = models.ManyToManyField(
         Ingredient,
@@ -76,14 +120,72 @@ class Recipe(models.Model):
         ]
     )
 
+    favorites_count = models.PositiveIntegerField(
+        verbose_name='В избранном',
+        default=0,
+        editable=False,
+    )
+    cart_count = models.PositiveIntegerField(
+        verbose_name='В списках покупок',
+        default=0,
+        editable=False,
+    )
+    trending_score = models.FloatField(
+        verbose_name='Рейтинг популярности',
+        default=0,
+        editable=False,
+    )
+    # Заполняется api.search. GIN-индекс создаётся миграцией только на
+    # PostgreSQL, на SQLite поле пустое, а поиск идёт по таблице FTS5.
+    search_vector = SearchVectorField(
+        verbose_name='Поисковый вектор',
+        null=True,
+        editable=False,
+    )
+
+    objects = RecipeQuerySet.as_manager()
+
+    # Поля, которые меняются только запросами UPDATE: счётчики, рейтинг,
+    # копии изображения и поисковый вектор.
+    MAINTAINED_FIELDS = frozenset((
+        'image_renditions', 'favorites_count', 'cart_count',
+        'trending_score', 'search_vector',
+    ))
+
     class Meta:
         verbose_name = 'Рецепт'
         verbose_name_plural = 'Рецепты'
         ordering = ('-id',)
+        indexes = (
+            models.Index(fields=('author', '-id'),
+                         name='recipe_author_id_idx'),
+            models.Index(fields=('-favorites_count', '-id'),
+                         name='recipe_popular_idx'),
+            models.Index(fields=('-trending_score', '-id'),
+                         name='recipe_trending_idx'),
+        )
 
     def __str__(self):
         return f'{self.name}. Автор: {self.author.username}'
 
+    def save(self, *args, **kwargs):
+        """Сохраняет рецепт, не перезаписывая MAINTAINED_FIELDS.
+
+        Значения этих полей в загруженном объекте могут устареть, пока
+        его редактируют, поэтому при обновлении без update_fields
+        сохраняются только остальные загруженные поля.
+        """
+        if (not self._state.adding and not kwargs.get('force_insert')
+                and kwargs.get('update_fields') is None):
+            deferred = self.get_deferred_fields()
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key
+                and field.name not in self.MAINTAINED_FIELDS
+                and field.attname not in deferred
+            ]
+        super().save(*args, **kwargs)
+
 
 class RecipeIngredient(models.Model):
     """Модель для связывания количества ингредиентов в рецепте."""
@@ -134,6 +236,10 @@ class Favorite(models.Model):
         on_delete=models.CASCADE,
         verbose_name='Пользователь'
     )
+    created = models.DateTimeField(
+        verbose_name='Добавлено',
+        auto_now_add=True,
+    )
 
     class Meta:
         verbose_name = 'Избранное'
@@ -144,6 +250,12 @@ class Favorite(models.Model):
                 fields=('recipe', 'user'),
             ),
         )
+        indexes = (
+            models.Index(fields=('user', 'recipe'),
+                         name='favorite_user_recipe_idx'),
+            models.Index(fields=('created',),
+                         name='favorite_created_idx'),
+        )
         ordering = ['id']
 
     def __str__(self):
@@ -164,6 +276,10 @@ class ShoppingCart(models.Model):
         on_delete=models.CASCADE,
         verbose_name='Пользователь'
     )
+    created = models.DateTimeField(
+        verbose_name='Добавлено',
+        auto_now_add=True,
+    )
 
     class Meta:
         verbose_name = 'Список покупок'
@@ -173,7 +289,72 @@ class ShoppingCart(models.Model):
                 fields=['recipe', 'user'],
                 name='unique_user_recipe_in_cart'),
         )
+        indexes = (
+            models.Index(fields=('user', 'recipe'),
+                         name='cart_user_recipe_idx'),
+            models.Index(fields=('created',),
+                         name='cart_created_idx'),
+        )
         ordering = ['id']
 
     def __str__(self):
         return f'{self.user} / {self.recipe}'
+
+
+class ShoppingCartIngredient(models.Model):
+    """Суммарное количество ингредиента в списке покупок пользователя.
+
+    Поддерживается при изменении списка покупок и ингредиентов рецептов,
+    пересобирается командой rebuild_cart_totals.
+    """
+    user = models.ForeignKey(
+        User,
+        related_name='cart_totals',
+        on_delete=models.CASCADE,
+        verbose_name='Пользователь'
+    )
+    ingredient = models.ForeignKey(
+        Ingredient,
+        related_name='cart_totals',
+        on_delete=models.CASCADE,
+        verbose_name='Ингредиент'
+    )
+    amount = models.PositiveIntegerField(verbose_name='Количество')
+
+    class Meta:
+        verbose_name = 'Ингредиент списка покупок'
+        verbose_name_plural = 'Ингредиенты списков покупок'
+        constraints = (
+            models.UniqueConstraint(
+                fields=['user', 'ingredient'],
+                name='unique_user_ingredient_in_cart_totals'),
+        )
+        ordering = ['id']
+
+    def __str__(self):
+        return f'{self.user} / {self.ingredient} - {self.amount}'
+
+
+class ModelVersion(models.Model):
+    """Счётчик изменений модели для ETag и Last-Modified."""
+    name = models.CharField(
+        verbose_name='Модель',
+        max_length=100,
+        primary_key=True
+    )
+    version = models.PositiveBigIntegerField(
+        verbose_name='Версия',
+        default=0
+    )
+    updated_at = models.DateTimeField(
+        verbose_name='Изменена',
+        default=timezone.now
+    )
+
+    class Meta:
+        verbose_name = 'Версия модели'
+        verbose_name_plural = 'Версии моделей'
+        ordering = ('name',)
+
+    def __str__(self):
+        return f'{self.name}: {self.version}'
@@ -0,0 +1,66 @@
+from rest_framework.pagination import CursorPagination, PageNumberPagination
+
+CURSOR_MODE_PARAM = 'pagination'
+CURSOR_MODE = 'cursor'
+
+
+class LimitPageNumberPagination(PageNumberPagination):
+    page_size = 10
+    page_size_query_param = 'limit'
+
+
+class LimitCursorPagination(CursorPagination):
+    """Пагинация по ключу без COUNT и OFFSET.
+
+    Порядок берётся из атрибута cursor_ordering представления. Курсор
+    хранит значение только первого поля порядка, поэтому он пригоден лишь
+    для полей из stable_fields, которые не меняются у записи: при порядке
+    по счётчикам или рейтингу страницы пропускали бы или повторяли записи.
+    """
+    page_size = 10
+    page_size_query_param = 'limit'
+    ordering = '-id'
+    stable_fields = ('id', '-id', 'pub_date', '-pub_date')
+
+    def get_ordering(self, request, queryset, view):
+        ordering = getattr(view, 'cursor_ordering', self.ordering)
+        if isinstance(ordering, str):
+            return (ordering,)
+        return tuple(ordering)
+
+    def supports(self, request, view):
+        return self.get_ordering(request, None, view)[0] in self.stable_fields
+
+
+class LimitPagination(LimitPageNumberPagination):
+    """Постраничная пагинация с курсорным режимом по запросу.
+
+    По умолчанию страницы выбираются параметрами page и limit. Курсорный
+    режим включается параметром pagination=cursor для первой страницы,
+    дальше клиент переходит по ссылкам next и previous с параметром
+    cursor. Для порядков, которые курсор не поддерживает, используются
+    обычные страницы.
+    """
+    cursor_pagination_class = LimitCursorPagination
+
+    def __init__(self):
+        self.cursor_paginator = None
+
+    def use_cursor(self, request):
+        return (request.query_params.get(CURSOR_MODE_PARAM) == CURSOR_MODE
+                or self.cursor_pagination_class.cursor_query_param
+                in request.query_params)
+
+    def paginate_queryset(self, queryset, request, view=None):
+        cursor_paginator = self.cursor_pagination_class()
+        if (self.use_cursor(request)
+                and cursor_paginator.supports(request, view)):
+            self.cursor_paginator = cursor_paginator
+            return self.cursor_paginator.paginate_queryset(
+                queryset, request, view)
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        if self.cursor_paginator is not None:
+            return self.cursor_paginator.get_paginated_response(data)
+        return super().get_paginated_response(data)
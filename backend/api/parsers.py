@@ -0,0 +1,281 @@
+import base64
+import binascii
+import json
+import re
+import uuid
+
+from django.conf import settings
+from django.core.files.uploadedfile import TemporaryUploadedFile
+from django.utils.datastructures import MultiValueDict
+from rest_framework import status
+from rest_framework.exceptions import APIException, ParseError
+from rest_framework.parsers import JSONParser
+
+QUOTE, BACKSLASH, COLON = b'"', b'\\', b':'
+OPENING, CLOSING = b'{[', b'}]'
+WHITESPACE = b' \t\r\n'
+DATA_URI_HEADER = re.compile(rb'data:image/[\w.+-]+;base64')
+MAX_HEADER_SIZE = 100
+# Сигнатуры допустимых форматов: (смещение, байты, расширение).
+IMAGE_SIGNATURES = (
+    (0, b'\x89PNG\r\n\x1a\n', 'png'),
+    (0, b'\xff\xd8\xff', 'jpg'),
+    (0, b'GIF87a', 'gif'),
+    (0, b'GIF89a', 'gif'),
+    (8, b'WEBP', 'webp'),
+)
+SIGNATURE_SIZE = 12
+
+
+class RequestEntityTooLarge(APIException):
+    status_code = status.HTTP_413_REQUEST_ENTITY_TOO_LARGE
+    default_detail = 'Слишком большой запрос.'
+    default_code = 'request_entity_too_large'
+
+
+def guess_image_extension(head):
+    for offset, signature, extension in IMAGE_SIGNATURES:
+        if head[offset:offset + len(signature)] == signature:
+            return extension
+    return None
+
+
+class Base64ImageDecoder:
+    """Частями декодирует base64 из JSON-строки во временный файл."""
+
+    def __init__(self, max_size):
+        self.max_size = max_size
+        self.header = bytearray()
+        self.in_header = True
+        self.pending = bytearray()
+        self.escape = False
+        self.size = 0
+        self.head = bytearray()
+        self.file = TemporaryUploadedFile('image', None, 0, None)
+
+    def feed(self, data):
+        if self.in_header:
+            self.header += data
+            if len(self.header) < len(b'data:') and b',' not in self.header:
+                return
+            if not self.header.startswith(b'data:'):
+                self.in_header = False
+                data, self.header = bytes(self.header), bytearray()
+            else:
+                header, comma, data = bytes(self.header).partition(b',')
+                if not comma:
+                    if len(self.header) > MAX_HEADER_SIZE:
+                        raise ParseError('Некорректный заголовок data URI.')
+                    return
+                header = header.replace(b'\\/', b'/')
+                if not DATA_URI_HEADER.fullmatch(header):
+                    raise ParseError('Поддерживаются только изображения.')
+                self.in_header = False
+                self.header = bytearray()
+        self.pending += self.unescape(data)
+        aligned = len(self.pending) // 4 * 4
+        if aligned:
+            self.write(bytes(self.pending[:aligned]))
+            del self.pending[:aligned]
+
+    def unescape(self, data):
+        """Убирает допустимые в JSON экранирования: \\/, \\n и \\r."""
+        if self.escape:
+            data = BACKSLASH + data
+            self.escape = False
+        if BACKSLASH not in data:
+            return data
+        if data.endswith(BACKSLASH) and not data.endswith(BACKSLASH * 2):
+            self.escape = True
+            data = data[:-1]
+        data = data.replace(b'\\/', b'/').replace(b'\\n', b'').replace(
+            b'\\r', b'')
+        if BACKSLASH in data:
+            raise ParseError('Некорректная строка base64.')
+        return data
+
+    def write(self, encoded):
+        try:
+            decoded = base64.b64decode(encoded, validate=True)
+        except binascii.Error:
+            raise ParseError('Некорректная строка base64.')
+        self.size += len(decoded)
+        if self.size > self.max_size:
+            raise RequestEntityTooLarge(
+                f'Изображение больше {self.max_size} байт.')
+        if len(self.head) < SIGNATURE_SIZE:
+            self.head += decoded[:SIGNATURE_SIZE - len(self.head)]
+            if len(self.head) >= SIGNATURE_SIZE:
+                self.check_signature()
+        self.file.write(decoded)
+
+    def check_signature(self):
+        extension = guess_image_extension(bytes(self.head))
+        if extension is None:
+            raise ParseError('Файл не является изображением.')
+        self.file.name = f'{uuid.uuid4()}.{extension}'
+
+    def finish(self):
+        """Возвращает файл с изображением или None для пустой строки."""
+        if self.in_header and not self.header:
+            self.close()
+            return None
+        if self.in_header or self.escape or self.pending:
+            raise ParseError('Некорректная строка base64.')
+        if len(self.head) < SIGNATURE_SIZE:
+            self.check_signature()
+        self.file.size = self.size
+        self.file.seek(0)
+        return self.file
+
+    def close(self):
+        self.file.close()
+
+
+class JSONImageScanner:
+    """Отделяет строку поля image верхнего уровня от остального JSON.
+
+    Вместо строки в документ подставляется null, а её содержимое
+    передаётся в Base64ImageDecoder. Структура JSON отслеживается по
+    байтам: в UTF-8 служебные символы не встречаются внутри
+    многобайтовых последовательностей.
+    """
+
+    def __init__(self, field, max_document_size, max_image_size):
+        self.key = json.dumps(field).encode()
+        self.max_document_size = max_document_size
+        self.max_image_size = max_image_size
+        self.document = bytearray()
+        self.stack = []
+        self.in_string = False
+        self.escape = False
+        self.string_start = None
+        self.last_string = None
+        self.current_key = None
+        self.awaiting_value = False
+        self.decoder = None
+        self.image = None
+        self.image_open = False
+
+    def at_top_level(self):
+        return self.stack == [OPENING[0]]
+
+    def feed(self, chunk):
+        position = 0
+        while position < len(chunk):
+            if self.image is not None and self.image_open:
+                position = self.feed_image(chunk, position)
+            else:
+                position = self.feed_document(chunk, position)
+        if len(self.document) > self.max_document_size:
+            raise RequestEntityTooLarge()
+
+    def feed_image(self, chunk, position):
+        end = chunk.find(QUOTE, position)
+        if end == -1:
+            self.decoder.feed(chunk[position:])
+            return len(chunk)
+        self.decoder.feed(chunk[position:end])
+        self.image = self.decoder.finish()
+        self.image_open = False
+        return end + 1
+
+    def feed_document(self, chunk, position):
+        document = self.document
+        for index in range(position, len(chunk)):
+            byte = chunk[index]
+            if self.in_string:
+                document.append(byte)
+                if self.escape:
+                    self.escape = False
+                elif byte == BACKSLASH[0]:
+                    self.escape = True
+                elif byte == QUOTE[0]:
+                    self.in_string = False
+                    if self.at_top_level() and not self.awaiting_value:
+                        self.last_string = bytes(
+                            document[self.string_start:])
+                    self.awaiting_value = False
+                continue
+            if byte in WHITESPACE:
+                document.append(byte)
+                continue
+            if byte == QUOTE[0]:
+                if (self.awaiting_value and self.at_top_level()
+                        and self.current_key == self.key
+                        and self.image is None):
+                    document += b'null'
+                    self.awaiting_value = False
+                    self.decoder = Base64ImageDecoder(self.max_image_size)
+                    self.image = self.decoder.file
+                    self.image_open = True
+                    return index + 1
+                self.in_string = True
+                self.string_start = len(document)
+            elif byte in OPENING:
+                self.stack.append(byte)
+                self.awaiting_value = False
+            elif byte in CLOSING:
+                if self.stack:
+                    self.stack.pop()
+            elif byte == COLON[0] and self.at_top_level():
+                self.current_key = self.last_string
+                self.awaiting_value = True
+            else:
+                self.awaiting_value = False
+            document.append(byte)
+        return len(chunk)
+
+    def finish(self):
+        if self.image is not None and self.image_open:
+            raise ParseError('JSON parse error - незакрытая строка.')
+        return bytes(self.document), self.image
+
+    def close(self):
+        if self.decoder is not None:
+            self.decoder.close()
+
+
+class StreamingImageJSONParser(JSONParser):
+    """JSON-парсер, декодирующий изображение в base64 по мере чтения.
+
+    Значение поля image верхнего уровня не собирается в строку: оно
+    декодируется частями во временный файл, размер которого ограничен
+    RECIPE_IMAGE_MAX_SIZE, а файл без сигнатуры изображения отклоняется
+    по первым байтам. Остальной документ разбирается обычным json и не
+    может быть больше RECIPE_JSON_MAX_SIZE.
+
+    Файл попадает в request.FILES и, как при multipart-загрузке,
+    закрывается и удаляется вместе с запросом.
+    """
+    image_field = 'image'
+    chunk_size = 64 * 1024
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        parser_context = parser_context or {}
+        encoding = parser_context.get('encoding', settings.DEFAULT_CHARSET)
+        scanner = JSONImageScanner(
+            self.image_field, settings.RECIPE_JSON_MAX_SIZE,
+            settings.RECIPE_IMAGE_MAX_SIZE)
+        try:
+            for chunk in iter(lambda: stream.read(self.chunk_size), b''):
+                scanner.feed(chunk)
+            document, image = scanner.finish()
+            data = json.loads(document.decode(encoding))
+        except ValueError as error:
+            scanner.close()
+            raise ParseError(f'JSON parse error - {error}')
+        except Exception:
+            scanner.close()
+            raise
+        if image is None:
+            return data
+        if not isinstance(data, dict):
+            image.close()
+            return data
+        data[self.image_field] = image
+        request = parser_context.get('request')
+        if request is not None:
+            request._request._files = MultiValueDict(
+                {self.image_field: [image]})
+        return data
@@ -0,0 +1,38 @@
+from django.db.backends.postgresql import base
+
+from .creation import DatabaseCreation
+from .pool import get_pool
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    """PostgreSQL с пулом соединений процесса.
+
+    Django открывает соединение при первом запросе к БД и закрывает его
+    в конце HTTP-запроса (при CONN_MAX_AGE=0); здесь соединение вместо
+    этого берётся из пула и возвращается в него. Размер пула задаётся
+    ключом POOL в настройках БД: MAX_SIZE, TIMEOUT, MAX_LIFETIME,
+    CHECK_IDLE.
+    """
+
+    creation_class = DatabaseCreation
+
+    def pool(self, conn_params):
+        return get_pool(self.alias, conn_params,
+                        self.settings_dict.get('POOL', {}))
+
+    def get_new_connection(self, conn_params):
+        self.pooled_from = self.pool(conn_params)
+        connection = self.pooled_from.checkout(
+            lambda: super(DatabaseWrapper, self).get_new_connection(
+                conn_params))
+        self.isolation_level = self.settings_dict['OPTIONS'].get(
+            'isolation_level', connection.isolation_level)
+        return connection
+
+    def _close(self):
+        # Соединение, закрытое внутри atomic(), остаётся в
+        # self.connection до выхода из блока, поэтому в пул не
+        # возвращается.
+        with self.wrap_database_errors:
+            self.pooled_from.checkin(
+                self.connection, reusable=not self.in_atomic_block)
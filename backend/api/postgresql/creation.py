@@ -0,0 +1,12 @@
+from django.db.backends.postgresql import creation
+
+from .pool import close_pools
+
+
+class DatabaseCreation(creation.DatabaseCreation):
+
+    def _destroy_test_db(self, test_database_name, verbosity):
+        # Простаивающие соединения пула с тестовой БД не дают выполнить
+        # DROP DATABASE.
+        close_pools(self.connection.alias)
+        super()._destroy_test_db(test_database_name, verbosity)
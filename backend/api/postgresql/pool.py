@@ -0,0 +1,201 @@
+import atexit
+import os
+import threading
+import time
+from collections import deque
+
+import psycopg2
+from psycopg2 import extensions
+
+from .. import metrics
+
+IDLE = extensions.TRANSACTION_STATUS_IDLE
+UNKNOWN = extensions.TRANSACTION_STATUS_UNKNOWN
+
+
+class ConnectionPool:
+    """Ограниченный пул соединений процесса с одной БД.
+
+    Соединения выдаются в порядке LIFO: первым берётся то, что вернули
+    последним. Соединение, простоявшее в пуле дольше check_idle секунд,
+    перед выдачей проверяется запросом SELECT 1; если проверка не прошла,
+    например после перезапуска PostgreSQL, все простаивающие соединения
+    закрываются и открывается новое. То же происходит, когда соединение
+    возвращают оборванным. Соединения старше max_lifetime секунд
+    закрываются. Если открыто max_size
+    соединений и все заняты, checkout ждёт освобождения не дольше
+    timeout секунд, затем бросает OperationalError.
+    """
+
+    def __init__(self, alias, max_size, timeout, max_lifetime,
+                 check_idle=0):
+        self.alias = alias
+        self.max_size = max_size
+        self.timeout = timeout
+        self.max_lifetime = max_lifetime
+        self.check_idle = check_idle
+        self.condition = threading.Condition()
+        self.idle = deque()
+        self.created = {}
+        self.returned = {}
+        self.size = 0
+
+    def checkout(self, connect):
+        """Свободное проверенное соединение или новое, открытое connect()."""
+        started = time.monotonic()
+        with self.condition:
+            while not self.idle and self.size >= self.max_size:
+                remaining = started + self.timeout - time.monotonic()
+                if remaining <= 0:
+                    metrics.record_pool_checkout(
+                        self.alias, 'timeout', time.monotonic() - started)
+                    raise psycopg2.OperationalError(
+                        f'Все {self.max_size} соединений пула заняты '
+                        f'дольше {self.timeout} с')
+                self.condition.wait(remaining)
+            if self.idle:
+                connection = self.idle.pop()
+            else:
+                connection = None
+                self.size += 1
+        if connection is not None:
+            reason = self.check(connection)
+            if reason is None:
+                self.record_checkout('reused', started)
+                return connection
+            self.discard(connection, reason, release=False)
+            if reason == 'unhealthy':
+                self.clear(reason)
+        try:
+            connection = connect()
+        except Exception:
+            self.release()
+            raise
+        with self.condition:
+            self.created[id(connection)] = time.monotonic()
+        self.record_checkout('new', started)
+        return connection
+
+    def checkin(self, connection, reusable=True):
+        """Возвращает соединение в пул, откатив незавершённую транзакцию."""
+        reason = None if reusable else 'broken'
+        if reason is None and self.expired(connection):
+            reason = 'expired'
+        if reason is None:
+            try:
+                status = (UNKNOWN if connection.closed
+                          else connection.info.transaction_status)
+                if status == UNKNOWN:
+                    reason = 'unhealthy'
+                elif status != IDLE:
+                    connection.rollback()
+            except psycopg2.Error:
+                reason = 'unhealthy'
+        if reason is not None:
+            self.discard(connection, reason)
+            if reason == 'unhealthy':
+                self.clear(reason)
+            return
+        with self.condition:
+            self.returned[id(connection)] = time.monotonic()
+            self.idle.append(connection)
+            self.condition.notify()
+        self.record_state()
+
+    def check(self, connection):
+        """Причина не выдавать соединение или None, если оно исправно."""
+        if self.expired(connection):
+            return 'expired'
+        if connection.closed:
+            return 'unhealthy'
+        returned = self.returned.get(id(connection), 0.0)
+        if time.monotonic() - returned < self.check_idle:
+            return None
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute('SELECT 1')
+            if connection.info.transaction_status != IDLE:
+                connection.rollback()
+        except psycopg2.Error:
+            return 'unhealthy'
+        return None
+
+    def expired(self, connection):
+        created = self.created.get(id(connection), 0.0)
+        return (self.max_lifetime is not None
+                and time.monotonic() - created >= self.max_lifetime)
+
+    def discard(self, connection, reason, release=True):
+        """Закрывает соединение; release=False оставляет его место занятым."""
+        with self.condition:
+            self.created.pop(id(connection), None)
+            self.returned.pop(id(connection), None)
+        try:
+            connection.close()
+        except psycopg2.Error:
+            pass
+        metrics.record_pool_discard(self.alias, reason)
+        if release:
+            self.release()
+
+    def release(self):
+        with self.condition:
+            self.size -= 1
+            self.condition.notify()
+        self.record_state()
+
+    def clear(self, reason):
+        """Закрывает все простаивающие соединения."""
+        with self.condition:
+            idle, self.idle = list(self.idle), deque()
+        for connection in idle:
+            self.discard(connection, reason)
+
+    def record_checkout(self, result, started):
+        metrics.record_pool_checkout(
+            self.alias, result, time.monotonic() - started)
+        self.record_state()
+
+    def record_state(self):
+        with self.condition:
+            idle = len(self.idle)
+            in_use = self.size - idle
+        metrics.record_pool_state(self.alias, in_use, idle, self.max_size)
+
+
+pools = {}
+pools_lock = threading.Lock()
+
+
+def get_pool(alias, conn_params, options):
+    """Пул текущего процесса для соединений с параметрами conn_params.
+
+    Пулы не наследуются после fork: соединения родителя нельзя
+    использовать в дочернем процессе, поэтому ключ включает pid.
+    """
+    key = (os.getpid(), alias, tuple(sorted(
+        (name, str(value)) for name, value in conn_params.items())))
+    with pools_lock:
+        pool = pools.get(key)
+        if pool is None:
+            pool = pools[key] = ConnectionPool(
+                alias, options.get('MAX_SIZE', 10),
+                options.get('TIMEOUT', 5), options.get('MAX_LIFETIME'),
+                options.get('CHECK_IDLE', 0))
+        return pool
+
+
+def close_pools(alias=None):
+    """Закрывает простаивающие соединения пулов процесса.
+
+    Если задан alias, закрываются только пулы этого подключения.
+    """
+    with pools_lock:
+        current = [pool for (pid, pool_alias, _), pool in pools.items()
+                   if pid == os.getpid()
+                   and alias in (None, pool_alias)]
+    for pool in current:
+        pool.clear('closed')
+
+
+atexit.register(close_pools)
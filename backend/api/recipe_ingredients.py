@@ -0,0 +1,53 @@
+from django.db import transaction
+
+from .conditional import bump_versions
+from .db import delete_without_signals
+from .models import RecipeIngredient
+
+BATCH_SIZE = 1000
+
+
+def diff(existing, amounts):
+    """Сравнивает строки рецепта с новыми количествами.
+
+    existing - {ingredient_id: RecipeIngredient}, amounts -
+    {ingredient_id: amount}. Возвращает id ингредиентов для вставки,
+    изменённые строки и строки для удаления.
+    """
+    to_create = [pk for pk in amounts if pk not in existing]
+    to_update = []
+    for pk, row in existing.items():
+        if pk in amounts and row.amount != amounts[pk]:
+            row.amount = amounts[pk]
+            to_update.append(row)
+    to_delete = [row for pk, row in existing.items() if pk not in amounts]
+    return to_create, to_update, to_delete
+
+
+def apply_amounts(recipe, amounts):
+    """Приводит ингредиенты рецепта к amounts {ingredient_id: amount}.
+
+    Меняются только отличающиеся строки: bulk_create, bulk_update и один
+    DELETE в одной транзакции. Сигналы строк не отправляются, кеш ленты
+    сбрасывается при сохранении самого рецепта. Возвращает прежние
+    количества.
+    """
+    with transaction.atomic():
+        existing = {
+            row.ingredient_id: row
+            for row in RecipeIngredient.objects.filter(recipe=recipe)
+        }
+        old_amounts = {pk: row.amount for pk, row in existing.items()}
+        to_create, to_update, to_delete = diff(existing, amounts)
+        RecipeIngredient.objects.bulk_create([
+            RecipeIngredient(recipe=recipe, ingredient_id=pk,
+                             amount=amounts[pk])
+            for pk in to_create
+        ], batch_size=BATCH_SIZE)
+        RecipeIngredient.objects.bulk_update(
+            to_update, ('amount',), batch_size=BATCH_SIZE)
+        delete_without_signals(
+            RecipeIngredient, [row.pk for row in to_delete])
+        if to_create or to_update or to_delete:
+            bump_versions(RecipeIngredient)
+    return old_amounts
@@ -0,0 +1,91 @@
+from django.contrib.auth import get_user_model
+from django.db import transaction
+
+from . import counters, shopping_cart
+from .db import bulk_insert_ignore, delete_returning
+from .models import Recipe, ShoppingCart
+
+User = get_user_model()
+
+ADDED = 'added'
+ALREADY_ADDED = 'already_added'
+REMOVED = 'removed'
+NOT_IN_LIST = 'not_in_list'
+NOT_FOUND = 'not_found'
+
+
+def lock_user(user):
+    """Блокирует строку пользователя до конца транзакции.
+
+    Изменения одного списка выполняются по очереди, поэтому результаты
+    для каждого рецепта и суммы списка покупок не зависят от гонок.
+    """
+    list(User.objects.select_for_update().filter(
+        pk=user.pk).values_list('pk', flat=True))
+
+
+def split_ids(model, user, recipe_ids):
+    """Делит id на отсутствующие рецепты, уже добавленные и остальные."""
+    found = set(Recipe.objects.filter(
+        pk__in=recipe_ids).values_list('pk', flat=True))
+    listed = set(model.objects.filter(
+        user=user, recipe_id__in=found).values_list('recipe_id', flat=True))
+    return found, listed
+
+
+def add(model, user, recipe_ids):
+    """Добавляет рецепты в избранное или список покупок user.
+
+    Возвращает статус для каждого id: added, already_added или not_found.
+    Строки добавляются одним INSERT; статус added и счётчики получают
+    только строки, которые он на самом деле добавил.
+    """
+    with transaction.atomic():
+        lock_user(user)
+        found, listed = split_ids(model, user, recipe_ids)
+        new = [pk for pk in recipe_ids if pk in found and pk not in listed]
+        added = bulk_insert_ignore(
+            model, (model(user=user, recipe_id=pk) for pk in new),
+            'recipe')
+        if added is None:
+            # Без RETURNING: под блокировкой пользователя новые строки
+            # из new могли появиться только от этого INSERT.
+            added = model.objects.filter(
+                user=user, recipe_id__in=new
+            ).values_list('recipe_id', flat=True)
+        added = set(added)
+        if added:
+            counters.recipes_added(model, added)
+            if model is ShoppingCart:
+                shopping_cart.add_recipes(user, added)
+    return {
+        pk: (NOT_FOUND if pk not in found
+             else ADDED if pk in added else ALREADY_ADDED)
+        for pk in recipe_ids
+    }
+
+
+def remove(model, user, recipe_ids):
+    """Удаляет рецепты из избранного или списка покупок user.
+
+    Возвращает статус для каждого id: removed, not_in_list или not_found.
+    Счётчики и суммы уменьшаются только для строк, которые удалил DELETE.
+    """
+    with transaction.atomic():
+        lock_user(user)
+        found, listed = split_ids(model, user, recipe_ids)
+        rows = model.objects.filter(user=user, recipe_id__in=found)
+        removed = delete_returning(rows, 'recipe')
+        if removed is None:
+            rows.delete()
+            removed = listed
+        removed = set(removed)
+        if removed:
+            counters.recipes_removed(model, removed)
+            if model is ShoppingCart:
+                shopping_cart.remove_recipes(user, removed)
+    return {
+        pk: (NOT_FOUND if pk not in found
+             else REMOVED if pk in removed else NOT_IN_LIST)
+        for pk in recipe_ids
+    }
@@ -0,0 +1,183 @@
+import io
+import logging
+import os
+import posixpath
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import connections, transaction
+from PIL import Image, ImageOps, features
+
+from .cache import recipe_feed_cache
+from .conditional import bump_versions
+from .models import Recipe
+
+logger = logging.getLogger(__name__)
+
+RENDITIONS_DIR = 'recipes/renditions/'
+# Название и наибольшая сторона уменьшенной копии в пикселях.
+RENDITIONS = (
+    ('thumbnail', 160),
+    ('card', 480),
+    ('full', 1280),
+)
+WEBP_SUFFIX = '_webp'
+JPEG_QUALITY = 85
+WEBP_QUALITY = 80
+
+_executor = None
+_executor_pid = None
+_executor_lock = threading.Lock()
+
+
+def get_executor():
+    """Пул потоков обработки изображений, свой в каждом процессе."""
+    global _executor, _executor_pid
+    with _executor_lock:
+        if _executor is None or _executor_pid != os.getpid():
+            _executor = ThreadPoolExecutor(
+                max_workers=settings.IMAGE_WORKERS,
+                thread_name_prefix='renditions')
+            _executor_pid = os.getpid()
+        return _executor
+
+
+def has_alpha(image):
+    return image.mode in ('RGBA', 'LA') or (
+        image.mode == 'P' and 'transparency' in image.info)
+
+
+def encode(image, image_format, **options):
+    buffer = io.BytesIO()
+    image.save(buffer, image_format, **options)
+    return ContentFile(buffer.getvalue())
+
+
+def store(name, content):
+    if default_storage.exists(name):
+        default_storage.delete(name)
+    return default_storage.save(name, content)
+
+
+def make_renditions(source):
+    """Сохраняет уменьшенные копии файла source в хранилище.
+
+    Для каждого размера создаются копия в формате JPEG (PNG, если у
+    изображения есть прозрачность) и копия в WebP, если Pillow собран с
+    его поддержкой. Возвращает словарь {название копии: имя файла}.
+    """
+    stem = posixpath.splitext(posixpath.basename(source))[0]
+    with default_storage.open(source) as file:
+        with Image.open(file) as original:
+            original = ImageOps.exif_transpose(original)
+            original.load()
+    if has_alpha(original):
+        original = original.convert('RGBA')
+        image_format, extension, options = 'PNG', 'png', {'optimize': True}
+    else:
+        original = original.convert('RGB')
+        image_format, extension, options = 'JPEG', 'jpg', {
+            'quality': JPEG_QUALITY, 'optimize': True, 'progressive': True}
+    renditions = {'source': source}
+    webp = features.check('webp')
+    for name, size in RENDITIONS:
+        image = original.copy()
+        image.thumbnail((size, size), Image.LANCZOS)
+        path = f'{RENDITIONS_DIR}{stem}_{name}'
+        renditions[name] = store(
+            f'{path}.{extension}', encode(image, image_format, **options))
+        if webp:
+            renditions[name + WEBP_SUFFIX] = store(
+                f'{path}.webp', encode(image, 'WEBP', quality=WEBP_QUALITY))
+    return renditions
+
+
+def delete_renditions(renditions, keep=()):
+    """Удаляет файлы копий из словаря renditions, кроме файлов из keep.
+
+    Исходное изображение не удаляется.
+    """
+    for key, name in renditions.items():
+        if key == 'source' or name in keep:
+            continue
+        try:
+            default_storage.delete(name)
+        except OSError:
+            logger.warning('Не удалось удалить копию изображения %s', name)
+
+
+def render(recipe_id):
+    """Строит уменьшенные копии изображения рецепта.
+
+    Копии сохраняются в рецепт, только если за время обработки
+    изображение не заменили; после этого копии прежнего изображения
+    удаляются. Возвращает True, если копии сохранены.
+    """
+    recipe = Recipe.objects.filter(pk=recipe_id).only(
+        'id', 'author', 'image', 'image_renditions').first()
+    if recipe is None or not recipe.image:
+        return False
+    renditions = make_renditions(recipe.image.name)
+    updated = Recipe.objects.filter(
+        pk=recipe_id, image=recipe.image.name
+    ).update(image_renditions=renditions)
+    if not updated:
+        # Изображение заменили, копии строит уже другая задача.
+        delete_renditions(renditions)
+    else:
+        delete_renditions(recipe.image_renditions,
+                          keep=set(renditions.values()))
+        bump_versions(Recipe)
+        recipe_feed_cache.invalidate_recipe(
+            recipe.author_id, recipe.tags.values_list('slug', flat=True))
+    return bool(updated)
+
+
+def run(recipe_id):
+    try:
+        render(recipe_id)
+    except Exception:
+        logger.exception(
+            'Не удалось обработать изображение рецепта %s', recipe_id)
+    finally:
+        connections.close_all()
+
+
+def schedule(recipe_id):
+    """Ставит обработку изображения в пул после фиксации транзакции."""
+    transaction.on_commit(lambda: get_executor().submit(run, recipe_id))
+
+
+def delete_later(renditions):
+    """Удаляет файлы копий после фиксации транзакции."""
+    transaction.on_commit(lambda: delete_renditions(renditions))
+
+
+def needs_renditions(recipe):
+    return bool(recipe.image) and (
+        recipe.image_renditions.get('source') != recipe.image.name)
+
+
+def rendition_urls(recipe, request=None):
+    """Адреса уменьшенных копий изображения рецепта.
+
+    Пока копии не готовы, вместо каждой отдаётся исходное изображение,
+    а без копии в WebP - копия того же размера в исходном формате.
+    """
+    if not recipe.image:
+        return None
+    renditions = {}
+    if not needs_renditions(recipe):
+        renditions = recipe.image_renditions
+    urls = {}
+    for name, _ in RENDITIONS:
+        fallback = renditions.get(name, recipe.image.name)
+        for key in (name, name + WEBP_SUFFIX):
+            url = default_storage.url(renditions.get(key, fallback))
+            if request is not None:
+                url = request.build_absolute_uri(url)
+            urls[key] = url
+    return urls
@@ -0,0 +1,170 @@
+import hashlib
+import logging
+import random
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import (DEFAULT_DB_ALIAS, DatabaseError, InterfaceError,
+                       OperationalError, connections)
+
+logger = logging.getLogger(__name__)
+
+# Реплика, с которой читает текущий запрос; None - основная БД.
+read_database = ContextVar('read_database', default=None)
+# Приложения, которые всегда читаются с основной БД: токен или сессия,
+# созданные при входе, могут ещё не дойти до реплики.
+PRIMARY_APPS = {'authtoken', 'sessions'}
+# Ошибки соединения с БД, а не самого запроса.
+CONNECTION_ERRORS = (OperationalError, InterfaceError)
+# Отставание реплики PostgreSQL в секундах; 0, если реплика получила и
+# применила весь WAL, и NULL на основной БД.
+LAG_SQL = '''
+    SELECT CASE
+        WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+        ELSE EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp())
+    END
+'''
+
+
+class ReplicaRouter:
+    """Чтение с реплики, выбранной ReplicaMiddleware, запись - в default."""
+
+    def db_for_read(self, model, **hints):
+        if model._meta.app_label in PRIMARY_APPS:
+            return DEFAULT_DB_ALIAS
+        return read_database.get()
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        databases = {DEFAULT_DB_ALIAS, *settings.DATABASE_REPLICAS}
+        if {obj1._state.db, obj2._state.db} <= databases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, **hints):
+        if db in settings.DATABASE_REPLICAS:
+            return False
+        return None
+
+
+class ReplicaHealth:
+    """Исправность реплик в процессе.
+
+    Реплика проверяется не чаще раза в REPLICA_CHECK_INTERVAL секунд при
+    выборе реплики для запроса. Неисправной считается реплика, к которой
+    не удалось подключиться или которая отстаёт больше чем на
+    REPLICA_MAX_LAG секунд, а также реплика, соединение с которой
+    оборвалось во время запроса.
+    """
+
+    def __init__(self):
+        self.status = {}
+
+    def healthy(self, alias):
+        healthy, checked = self.status.get(alias, (False, None))
+        if (checked is not None and time.monotonic() - checked
+                < settings.REPLICA_CHECK_INTERVAL):
+            return healthy
+        healthy = self.check(alias)
+        self.status[alias] = (healthy, time.monotonic())
+        return healthy
+
+    def check(self, alias):
+        connection = connections[alias]
+        try:
+            with connection.cursor() as cursor:
+                if connection.vendor == 'postgresql':
+                    cursor.execute(LAG_SQL)
+                    lag = cursor.fetchone()[0] or 0
+                else:
+                    cursor.execute('SELECT 1')
+                    lag = 0
+        except DatabaseError as error:
+            logger.warning('replica_unavailable alias=%s error="%s"',
+                           alias, error)
+            connection.close()
+            return False
+        if lag > settings.REPLICA_MAX_LAG:
+            logger.warning('replica_lagging alias=%s lag_s=%.1f',
+                           alias, lag)
+            return False
+        return True
+
+    def mark_failed(self, alias):
+        logger.warning('replica_failed alias=%s', alias)
+        self.status[alias] = (False, time.monotonic())
+
+
+health = ReplicaHealth()
+
+
+def choose_replica():
+    """Случайная исправная реплика или None, если таких нет."""
+    replicas = list(settings.DATABASE_REPLICAS)
+    random.shuffle(replicas)
+    for alias in replicas:
+        if health.healthy(alias):
+            return alias
+    return None
+
+
+@contextmanager
+def watch_connection(alias):
+    """Отмечает реплику alias неисправной при ошибке соединения с ней.
+
+    Ошибки самих запросов (ProgrammingError, DataError и т.д.) о
+    неисправности реплики не говорят и не учитываются.
+    """
+    connection = connections[alias]
+    failed = []
+
+    def execute(execute, sql, params, many, context):
+        try:
+            return execute(sql, params, many, context)
+        except CONNECTION_ERRORS:
+            failed.append(alias)
+            raise
+
+    if connection.connection is None:
+        # Флаг мог остаться от соединения, закрытого после ошибки.
+        connection.errors_occurred = False
+    try:
+        with connection.execute_wrapper(execute):
+            yield
+    finally:
+        # Неудачное подключение до execute не доходит: соединение не
+        # открыто, а ошибка отмечена в errors_occurred.
+        if failed or (connection.connection is None
+                      and connection.errors_occurred):
+            health.mark_failed(alias)
+
+
+def reading_from_replica():
+    return read_database.get() is not None
+
+
+def pin_key(request):
+    """Ключ клиента по токену или сессии; None для анонимов."""
+    credentials = (request.META.get('HTTP_AUTHORIZATION')
+                   or request.COOKIES.get(settings.SESSION_COOKIE_NAME))
+    if not credentials:
+        return None
+    digest = hashlib.md5(credentials.encode()).hexdigest()
+    return f'replica:pin:{digest}'
+
+
+def pin(request):
+    """Направляет чтение клиента в основную БД на REPLICA_PIN_SECONDS."""
+    key = pin_key(request)
+    if key is not None:
+        cache.set(key, True, timeout=settings.REPLICA_PIN_SECONDS)
+
+
+def pinned(request):
+    key = pin_key(request)
+    return key is not None and cache.get(key) is not None
@@ -0,0 +1,142 @@
+import re
+
+from django.conf import settings
+from django.contrib.postgres.aggregates import StringAgg
+from django.contrib.postgres.search import (SearchQuery, SearchRank,
+                                            SearchVector)
+from django.db import connections, router
+from django.db.models import F, FloatField, OuterRef, Q, Subquery, Value
+from django.db.models.expressions import RawSQL
+
+from .models import Ingredient, Recipe, RecipeIngredient
+
+BATCH_SIZE = 1000
+# Таблица FTS5, которая заменяет search_vector на SQLite.
+FTS_TABLE = 'api_recipe_fts'
+# Веса столбцов FTS5 в порядке name, text, ingredients.
+FTS_WEIGHTS = (10.0, 1.0, 4.0)
+WORD = re.compile(r'\w+')
+# Поля рецепта, после изменения которых нужно обновить индекс.
+INDEXED_FIELDS = {'name', 'text'}
+
+
+def vendor(using):
+    return connections[using].vendor
+
+
+def ingredient_names():
+    return Subquery(RecipeIngredient.objects.filter(
+        recipe=OuterRef('pk')
+    ).values('recipe').annotate(
+        names=StringAgg('ingredient__name', ' ')
+    ).order_by().values('names'))
+
+
+def search_vector():
+    config = settings.SEARCH_CONFIG
+    return (SearchVector('name', weight='A', config=config)
+            + SearchVector(ingredient_names(), weight='B', config=config)
+            + SearchVector('text', weight='C', config=config))
+
+
+def update_fts(using, recipe_ids=None):
+    """Перезаписывает строки FTS5 рецептов recipe_ids (None - всех)."""
+    fts_rows = recipe_rows = ''
+    params = []
+    if recipe_ids is not None:
+        placeholders = ', '.join(['%s'] * len(recipe_ids))
+        fts_rows = f'WHERE rowid IN ({placeholders})'
+        recipe_rows = f'WHERE r.id IN ({placeholders})'
+        params = list(recipe_ids)
+    with connections[using].cursor() as cursor:
+        cursor.execute(f'DELETE FROM {FTS_TABLE} {fts_rows}', params)
+        cursor.execute(
+            f'INSERT INTO {FTS_TABLE} (rowid, name, text, ingredients) '
+            f'SELECT r.id, r.name, r.text, ('
+            f"SELECT group_concat(i.name, ' ') "
+            f'FROM {RecipeIngredient._meta.db_table} ri '
+            f'JOIN {Ingredient._meta.db_table} i '
+            f'ON i.id = ri.ingredient_id WHERE ri.recipe_id = r.id) '
+            f'FROM {Recipe._meta.db_table} r {recipe_rows}', params)
+
+
+def update_recipes(recipe_ids):
+    """Обновляет поисковый индекс рецептов после изменения их текста.
+
+    Вызывается в той же транзакции, что и изменение названия, описания
+    или ингредиентов рецепта.
+    """
+    recipe_ids = list(recipe_ids)
+    using = router.db_for_write(Recipe)
+    for start in range(0, len(recipe_ids), BATCH_SIZE):
+        batch = recipe_ids[start:start + BATCH_SIZE]
+        if vendor(using) == 'postgresql':
+            Recipe.objects.filter(pk__in=batch).update(
+                search_vector=search_vector())
+        elif vendor(using) == 'sqlite':
+            update_fts(using, batch)
+
+
+def update_ingredient(ingredient_id):
+    """Обновляет индекс рецептов с переименованным ингредиентом."""
+    update_recipes(RecipeIngredient.objects.filter(
+        ingredient_id=ingredient_id).values_list('recipe_id', flat=True))
+
+
+def forget_recipe(recipe_id):
+    using = router.db_for_write(Recipe)
+    if vendor(using) == 'sqlite':
+        with connections[using].cursor() as cursor:
+            cursor.execute(
+                f'DELETE FROM {FTS_TABLE} WHERE rowid = %s', [recipe_id])
+
+
+def rebuild():
+    """Строит поисковый индекс всех рецептов заново."""
+    using = router.db_for_write(Recipe)
+    if vendor(using) == 'postgresql':
+        Recipe.objects.update(search_vector=search_vector())
+    elif vendor(using) == 'sqlite':
+        update_fts(using)
+
+
+def fts_query(text):
+    """Запрос FTS5: все слова, последнее - как префикс."""
+    words = WORD.findall(text)
+    if not words:
+        return None
+    terms = [f'"{word}"' for word in words]
+    terms[-1] += '*'
+    return ' '.join(terms)
+
+
+def search(queryset, text):
+    """Рецепты, подходящие под запрос text, с релевантностью search_rank.
+
+    На PostgreSQL используется поле search_vector с GIN-индексом, на
+    SQLite - таблица FTS5, на остальных БД - поиск подстроки в названии
+    и описании без ранжирования.
+    """
+    db_vendor = vendor(queryset.db)
+    if db_vendor == 'postgresql':
+        query = SearchQuery(text, config=settings.SEARCH_CONFIG,
+                            search_type='websearch')
+        return queryset.filter(search_vector=query).annotate(
+            search_rank=SearchRank(F('search_vector'), query))
+    if db_vendor == 'sqlite':
+        match = fts_query(text)
+        if match is None:
+            return queryset.none().annotate(
+                search_rank=Value(0.0, output_field=FloatField()))
+        weights = ', '.join(str(weight) for weight in FTS_WEIGHTS)
+        table = Recipe._meta.db_table
+        return queryset.filter(pk__in=RawSQL(
+            f'SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s',
+            (match,))
+        ).annotate(search_rank=RawSQL(
+            f'SELECT -bm25({FTS_TABLE}, {weights}) FROM {FTS_TABLE} '
+            f'WHERE {FTS_TABLE} MATCH %s AND rowid = "{table}"."id"',
+            (match,), output_field=FloatField()))
+    return queryset.filter(
+        Q(name__icontains=text) | Q(text__icontains=text)
+    ).annotate(search_rank=Value(0.0, output_field=FloatField()))
@@ -1,18 +1,50 @@
+from collections import Counter
+
 from django.contrib.auth import get_user_model
-from django.shortcuts import get_object_or_404
+from django.db import transaction
 from drf_extra_fields.fields import Base64ImageField
 from rest_framework import serializers
 from rest_framework.validators import UniqueTogetherValidator
 
+from . import recipe_ingredients, renditions, search, shopping_cart
+from .fields import StreamedBase64ImageField
 from .models import (Favorite, Ingredient, RecipeIngredient, Recipe,
                      ShoppingCart, Tag)
-from .constants import MIN_FIELD_VALUE, MAX_FIELD_VALUE
+from .constants import (MIN_FIELD_VALUE, MAX_FIELD_VALUE,
+                        RECIPE_BATCH_MAX_SIZE)
 from users.serializers import UserSerializer
-from users.models import Subscription
+from users.models import AuthorStats, Subscription
 
 User = get_user_model()
 
 
+def get_recipes_limit(request):
+    """Возвращает значение параметра recipes_limit или None."""
+    limit = request.query_params.get('recipes_limit')
+    if limit is None or not limit.isdigit():
+        return None
+    return int(limit)
+
+
+def resolve_ids(model, ids):
+    """Загружает объекты model с переданными id одним запросом.
+
+    Возвращает словарь {id: объект} и список ошибок, в которых
+    перечислены все ненайденные и повторяющиеся id.
+    """
+    objects = model.objects.in_bulk(set(ids))
+    errors = []
+    missing = sorted({pk for pk in ids if pk not in objects})
+    if missing:
+        errors.append(f'Не найдены id: {", ".join(map(str, missing))}')
+    duplicates = sorted(
+        pk for pk, count in Counter(ids).items() if count > 1)
+    if duplicates:
+        errors.append(
+            f'Не должны повторяться id: {", ".join(map(str, duplicates))}')
+    return objects, errors
+
+
 class IngredientSerializer(serializers.ModelSerializer):
 
     class Meta:
@@ -68,21 +100,29 @@ class RecipeListSerializer(serializers.ModelSerializer):
     )
     is_favorited = serializers.SerializerMethodField()
     is_in_shopping_cart = serializers.SerializerMethodField()
+    images = serializers.SerializerMethodField()
 
     class Meta:
         model = Recipe
         fields = ('id', 'tags', 'author', 'ingredients', 'is_favorited',
-                  'is_in_shopping_cart', 'name', 'image', 'text',
+                  'is_in_shopping_cart', 'name', 'image', 'images', 'text',
                   'cooking_time')
         read_only_fields = ('author', 'tags',)
 
+    def get_images(self, obj):
+        return renditions.rendition_urls(obj, self.context.get('request'))
+
     def get_is_favorited(self, obj):
+        if hasattr(obj, 'is_favorited'):
+            return obj.is_favorited
         user = self.context['request'].user
         if user.is_anonymous:
             return False
         return obj.favorites.filter(user=user).exists()
 
     def get_is_in_shopping_cart(self, obj):
+        if hasattr(obj, 'is_in_shopping_cart'):
+            return obj.is_in_shopping_cart
         user = self.context['request'].user
         if user.is_anonymous:
             return False
@@ -91,7 +131,12 @@ class RecipeListSerializer(serializers.ModelSerializer):
 
 class RecipeCreateAndUpdateSerializer(serializers.ModelSerializer):
     author = UserSerializer(read_only=True)
-    image = Base64ImageField(max_length=None, use_url=True)
+    image = StreamedBase64ImageField(max_length=None, use_url=True)
+    tags = serializers.ListField(
+        child=serializers.IntegerField(),
+        allow_empty=False,
+        error_messages={'empty': 'Должен быть хотя бы один тег'}
+    )
     ingredients = RecipeingredientCreateSerializer(many=True)
     cooking_time = serializers.IntegerField(
         min_value=MIN_FIELD_VALUE,
@@ -104,36 +149,34 @@ class RecipeCreateAndUpdateSerializer(serializers.ModelSerializer):
                   'image', 'text', 'cooking_time')
 
     def validate(self, data):
-        tags = data['tags']
-        if not tags:
-            raise serializers.ValidationError('Должен быть хотя бы один тег')
-        if len(tags) != len(set(tags)):
-            raise serializers.ValidationError('Теги не должны повторяться')
-
-        ingredient_set = set()
-        ingredients = data.get('ingredients', [])
-        for ingredient_item in ingredients:
-            ingredient = get_object_or_404(
-                Ingredient, id=ingredient_item['id']
-            )
-            if ingredient in ingredient_set:
-                raise serializers.ValidationError(
-                    'Ингредиенты не должны повторяться')
-            ingredient_set.add(ingredient)
-
+        """Проверяет теги и ингредиенты запросом на каждую модель.
+
+        Все ненайденные и повторяющиеся id возвращаются одной ошибкой,
+        а найденные ингредиенты сохраняются для create_ingredients.
+        """
+        errors = {}
+        if 'tags' in data:
+            tags, errors['tags'] = resolve_ids(Tag, data['tags'])
+            data['tags'] = [tags[pk] for pk in data['tags'] if pk in tags]
+        if 'ingredients' in data:
+            self.ingredient_objects, errors['ingredients'] = resolve_ids(
+                Ingredient, [item['id'] for item in data['ingredients']])
+        errors = {field: error for field, error in errors.items() if error}
+        if errors:
+            raise serializers.ValidationError(errors)
         return data
 
     def create_ingredients(self, ingredients, recipe):
-        recipe_ingredients = [
+        RecipeIngredient.objects.bulk_create([
             RecipeIngredient(
                 recipe=recipe,
-                ingredient_id=ingredient['id'],
+                ingredient=self.ingredient_objects[ingredient['id']],
                 amount=ingredient['amount']
             )
             for ingredient in ingredients
-        ]
-        RecipeIngredient.objects.bulk_create(recipe_ingredients)
+        ])
 
+    @transaction.atomic
     def create(self, validated_data):
         tags_data = validated_data.pop('tags')
         ingredients_data = validated_data.pop('ingredients')
@@ -141,33 +184,56 @@ class RecipeCreateAndUpdateSerializer(serializers.ModelSerializer):
         recipe = Recipe.objects.create(image=image, **validated_data)
         self.create_ingredients(ingredients_data, recipe)
         recipe.tags.set(tags_data)
+        search.update_recipes((recipe.pk,))
         return recipe
 
+    @transaction.atomic
     def update(self, recipe, validated_data):
+        reindex = bool(search.INDEXED_FIELDS & validated_data.keys())
         if 'ingredients' in validated_data:
-            ingredients = validated_data.pop('ingredients')
-            recipe.ingredients.clear()
-            self.create_ingredients(ingredients, recipe)
+            reindex = True
+            amounts = {
+                ingredient['id']: ingredient['amount']
+                for ingredient in validated_data.pop('ingredients')
+            }
+            old_amounts = recipe_ingredients.apply_amounts(recipe, amounts)
+            shopping_cart.change_recipe(recipe.id, old_amounts, amounts)
         if 'tags' in validated_data:
             tags_data = validated_data.pop('tags')
             recipe.tags.set(tags_data)
-        return super().update(recipe, validated_data)
+        recipe = super().update(recipe, validated_data)
+        if reindex:
+            search.update_recipes((recipe.pk,))
+        return recipe
 
     def to_representation(self, instance):
         request = self.context.get('request')
         context = {'request': request}
+        instance = Recipe.objects.for_feed(request.user).get(pk=instance.pk)
         return RecipeListSerializer(
             instance, context=context).data
 
 
 class ShortRecipeSerializer(serializers.ModelSerializer):
     image = Base64ImageField()
+    images = serializers.SerializerMethodField()
 
     class Meta:
         model = Recipe
-        fields = ('id', 'name', 'image', 'cooking_time')
+        fields = ('id', 'name', 'image', 'images', 'cooking_time')
         read_only_fields = ('id', 'name', 'image', 'cooking_time')
 
+    def get_images(self, obj):
+        return renditions.rendition_urls(obj, self.context.get('request'))
+
+
+class RecipeIdsSerializer(serializers.Serializer):
+    recipes = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        allow_empty=False,
+        max_length=RECIPE_BATCH_MAX_SIZE
+    )
+
 
 class ShoppingCartSerializer(serializers.ModelSerializer):
     id = serializers.ReadOnlyField(source='recipe.id')
@@ -239,16 +305,21 @@ class SubscribeSerializer(serializers.ModelSerializer):
         return data
 
     def get_is_subscribed(self, obj):
+        if hasattr(obj, 'is_subscribed'):
+            return obj.is_subscribed
         user = self.context['request'].user
         return user.subscriptions.filter(author=obj.author).exists()
 
     def get_recipes(self, obj):
-        request = self.context.get('request')
-        limit = request.GET.get('recipes_limit')
-        queryset = obj.author.recipes.all()
-        if limit:
-            queryset = queryset[:int(limit)]
+        if hasattr(obj.author, 'preview_recipes'):
+            queryset = obj.author.preview_recipes
+        else:
+            limit = get_recipes_limit(self.context.get('request'))
+            queryset = obj.author.recipes.all()[:limit]
         return ShortRecipeSerializer(queryset, many=True).data
 
     def get_recipes_count(self, obj):
-        return obj.author.recipes.count()
+        if hasattr(obj, 'recipes_count'):
+            return obj.recipes_count
+        stats = AuthorStats.objects.filter(author=obj.author).first()
+        return stats.recipes_count if stats else 0
@@ -0,0 +1,161 @@
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models import Sum
+
+from .models import RecipeIngredient, ShoppingCart, ShoppingCartIngredient
+
+User = get_user_model()
+
+BATCH_SIZE = 1000
+
+
+def live_totals(users=None):
+    """Суммы ингредиентов списков покупок, посчитанные по рецептам."""
+    lookup = ({'recipe__cart__isnull': False} if users is None
+              else {'recipe__cart__user__in': users})
+    return RecipeIngredient.objects.filter(**lookup).values(
+        'recipe__cart__user', 'ingredient'
+    ).annotate(amount=Sum('amount')).order_by()
+
+
+def apply_deltas(deltas):
+    """Применяет изменения {(user_id, ingredient_id): delta} к суммам.
+
+    Строки пользователей блокируются, чтобы параллельные изменения одного
+    списка покупок не теряли друг друга.
+    """
+    deltas = {key: delta for key, delta in deltas.items() if delta}
+    if not deltas:
+        return
+    user_ids = sorted({user_id for user_id, _ in deltas})
+    ingredient_ids = {ingredient_id for _, ingredient_id in deltas}
+    with transaction.atomic():
+        list(User.objects.select_for_update().filter(
+            pk__in=user_ids).order_by('pk').values_list('pk', flat=True))
+        existing = {
+            (total.user_id, total.ingredient_id): total
+            for total in ShoppingCartIngredient.objects.filter(
+                user_id__in=user_ids, ingredient_id__in=ingredient_ids)
+        }
+        to_create, to_update, to_delete = [], [], []
+        for (user_id, ingredient_id), delta in deltas.items():
+            total = existing.get((user_id, ingredient_id))
+            if total is None:
+                if delta > 0:
+                    to_create.append(ShoppingCartIngredient(
+                        user_id=user_id, ingredient_id=ingredient_id,
+                        amount=delta))
+                continue
+            total.amount += delta
+            if total.amount > 0:
+                to_update.append(total)
+            else:
+                to_delete.append(total.pk)
+        ShoppingCartIngredient.objects.bulk_create(
+            to_create, batch_size=BATCH_SIZE)
+        ShoppingCartIngredient.objects.bulk_update(
+            to_update, ('amount',), batch_size=BATCH_SIZE)
+        if to_delete:
+            ShoppingCartIngredient.objects.filter(pk__in=to_delete).delete()
+
+
+def recipe_amounts(recipe_id):
+    return dict(RecipeIngredient.objects.filter(
+        recipe_id=recipe_id).values_list('ingredient_id', 'amount'))
+
+
+def recipes_amounts(recipe_ids):
+    """Суммы ингредиентов нескольких рецептов одним запросом."""
+    return dict(RecipeIngredient.objects.filter(
+        recipe_id__in=recipe_ids
+    ).values('ingredient').annotate(
+        total=Sum('amount')).order_by().values_list('ingredient', 'total'))
+
+
+def add_recipes(user, recipe_ids):
+    """Учитывает рецепты, добавленные в список покупок user."""
+    apply_deltas({
+        (user.pk, ingredient_id): amount
+        for ingredient_id, amount in recipes_amounts(recipe_ids).items()
+    })
+
+
+def remove_recipes(user, recipe_ids):
+    """Учитывает рецепты, удалённые из списка покупок user."""
+    apply_deltas({
+        (user.pk, ingredient_id): -amount
+        for ingredient_id, amount in recipes_amounts(recipe_ids).items()
+    })
+
+
+def add_recipe(user, recipe_id):
+    """Учитывает рецепт, добавленный в список покупок user."""
+    add_recipes(user, (recipe_id,))
+
+
+def remove_recipe(user, recipe_id):
+    """Учитывает рецепт, удалённый из списка покупок user."""
+    remove_recipes(user, (recipe_id,))
+
+
+def change_recipe(recipe_id, old_amounts, new_amounts):
+    """Переносит изменение ингредиентов рецепта в списки покупок."""
+    changes = {
+        ingredient_id: (new_amounts.get(ingredient_id, 0)
+                        - old_amounts.get(ingredient_id, 0))
+        for ingredient_id in old_amounts.keys() | new_amounts.keys()
+    }
+    changes = {key: delta for key, delta in changes.items() if delta}
+    if not changes:
+        return
+    user_ids = ShoppingCart.objects.filter(
+        recipe_id=recipe_id).values_list('user_id', flat=True)
+    apply_deltas({
+        (user_id, ingredient_id): delta
+        for user_id in user_ids
+        for ingredient_id, delta in changes.items()
+    })
+
+
+def delete_recipe(recipe_id):
+    """Убирает удаляемый рецепт из всех списков покупок."""
+    change_recipe(recipe_id, recipe_amounts(recipe_id), {})
+
+
+def rebuild(users=None):
+    """Пересобирает суммы по рецептам в списках покупок."""
+    with transaction.atomic():
+        totals = ShoppingCartIngredient.objects.all()
+        if users is not None:
+            totals = totals.filter(user__in=users)
+        totals.delete()
+        batch = []
+        for row in live_totals(users).iterator(chunk_size=BATCH_SIZE):
+            batch.append(ShoppingCartIngredient(
+                user_id=row['recipe__cart__user'],
+                ingredient_id=row['ingredient'],
+                amount=row['amount']))
+            if len(batch) >= BATCH_SIZE:
+                ShoppingCartIngredient.objects.bulk_create(batch)
+                batch = []
+        ShoppingCartIngredient.objects.bulk_create(batch)
+
+
+def verify(users=None):
+    """Возвращает расхождения {(user_id, ingredient_id): (было, нужно)}."""
+    expected = {}
+    for row in live_totals(users).iterator(chunk_size=BATCH_SIZE):
+        expected[row['recipe__cart__user'], row['ingredient']] = row['amount']
+    totals = ShoppingCartIngredient.objects.all()
+    if users is not None:
+        totals = totals.filter(user__in=users)
+    actual = {
+        (user_id, ingredient_id): amount
+        for user_id, ingredient_id, amount in totals.values_list(
+            'user_id', 'ingredient_id', 'amount').iterator()
+    }
+    return {
+        key: (actual.get(key, 0), expected.get(key, 0))
+        for key in actual.keys() | expected.keys()
+        if actual.get(key, 0) != expected.get(key, 0)
+    }
@@ -0,0 +1,158 @@
+from django.contrib.auth import get_user_model
+from django.db.models.signals import (m2m_changed, post_delete, post_save,
+                                      pre_delete, pre_save)
+from django.dispatch import receiver
+from rest_framework.authtoken.models import Token
+
+from . import counters, renditions, search, shopping_cart
+from .authentication import token_cache
+from .cache import recipe_feed_cache
+from .conditional import bump_versions
+from .models import Ingredient, Recipe, RecipeIngredient, Tag
+
+User = get_user_model()
+
+VERSIONED_MODELS = (Ingredient, Recipe, RecipeIngredient, Tag)
+# Поля пользователя, которые попадают в ответы с рецептами.
+SERIALIZED_USER_FIELDS = frozenset(
+    ('username', 'email', 'first_name', 'last_name'))
+
+
+def serialized_user_changed(instance, update_fields):
+    """Изменились ли поля пользователя, которые видны в ответах API."""
+    if update_fields is not None:
+        return not SERIALIZED_USER_FIELDS.isdisjoint(update_fields)
+    return getattr(instance, '_serialized_fields_changed', True)
+
+
+@receiver(pre_delete, sender=Recipe)
+def remove_deleted_recipe_from_carts(sender, instance, **kwargs):
+    shopping_cart.delete_recipe(instance.pk)
+
+
+@receiver(post_save, sender=Recipe)
+def count_created_recipe(sender, instance, created, **kwargs):
+    if created:
+        counters.recipe_created(instance.author_id)
+
+
+@receiver(post_delete, sender=Recipe)
+def count_deleted_recipe(sender, instance, **kwargs):
+    counters.recipe_deleted(instance.author_id)
+
+
+@receiver(post_delete, sender=Recipe)
+def forget_deleted_recipe_search(sender, instance, **kwargs):
+    search.forget_recipe(instance.pk)
+
+
+@receiver(post_save, sender=Ingredient)
+def reindex_renamed_ingredient(sender, instance, created, **kwargs):
+    if not created:
+        search.update_ingredient(instance.pk)
+
+
+@receiver(pre_delete, sender=User)
+def forget_deleted_user_lists(sender, instance, **kwargs):
+    counters.user_deleted(instance)
+
+
+@receiver(post_save, sender=Recipe)
+def schedule_image_renditions(sender, instance, **kwargs):
+    if renditions.needs_renditions(instance):
+        renditions.schedule(instance.pk)
+
+
+@receiver(post_delete, sender=Recipe)
+def delete_image_renditions(sender, instance, **kwargs):
+    renditions.delete_later(instance.image_renditions)
+
+
+def invalidate_recipe_feed(recipe, tag_slugs=None):
+    if tag_slugs is None:
+        tag_slugs = recipe.tags.values_list('slug', flat=True)
+    recipe_feed_cache.invalidate_recipe(recipe.author_id, tag_slugs)
+
+
+@receiver(post_save, sender=Recipe)
+@receiver(pre_delete, sender=Recipe)
+def invalidate_feed_on_recipe_change(sender, instance, **kwargs):
+    invalidate_recipe_feed(instance)
+
+
+@receiver(post_save, sender=RecipeIngredient)
+@receiver(post_delete, sender=RecipeIngredient)
+def invalidate_feed_on_ingredients_change(sender, instance, **kwargs):
+    invalidate_recipe_feed(instance.recipe)
+
+
+@receiver(m2m_changed, sender=Recipe.tags.through)
+def invalidate_feed_on_tags_change(sender, instance, action, reverse,
+                                   pk_set, **kwargs):
+    if reverse:
+        if action.startswith('post_'):
+            recipe_feed_cache.invalidate('all')
+    elif action in ('post_add', 'post_remove'):
+        invalidate_recipe_feed(instance, Tag.objects.filter(
+            pk__in=pk_set).values_list('slug', flat=True))
+    elif action == 'pre_clear':
+        invalidate_recipe_feed(instance)
+
+
+@receiver(post_save, sender=Tag)
+@receiver(post_delete, sender=Tag)
+@receiver(post_save, sender=Ingredient)
+@receiver(post_delete, sender=Ingredient)
+def invalidate_feed(sender, **kwargs):
+    recipe_feed_cache.invalidate('all')
+
+
+@receiver(pre_save, sender=User)
+def compare_serialized_user_fields(sender, instance, update_fields,
+                                   **kwargs):
+    if instance.pk is None or update_fields is not None:
+        return
+    saved = User.objects.filter(pk=instance.pk).values(
+        *SERIALIZED_USER_FIELDS).first()
+    instance._serialized_fields_changed = saved is None or any(
+        saved[field] != getattr(instance, field)
+        for field in SERIALIZED_USER_FIELDS)
+
+
+@receiver(post_save, sender=User)
+def invalidate_on_user_change(sender, instance, created, update_fields,
+                              **kwargs):
+    # Новый пользователь ещё не встречается в ответах с рецептами.
+    if created or not serialized_user_changed(instance, update_fields):
+        return
+    bump_versions(User)
+    recipe_feed_cache.invalidate('all')
+
+
+@receiver(post_save, sender=User)
+def forget_cached_user_tokens(sender, instance, created, update_fields,
+                              **kwargs):
+    if not created and update_fields != frozenset(('last_login',)):
+        token_cache.forget_user(instance.pk)
+
+
+@receiver(post_delete, sender=Token)
+def forget_cached_token(sender, instance, **kwargs):
+    token_cache.forget(instance.key)
+
+
+def bump_model_version(sender, **kwargs):
+    bump_versions(sender)
+
+
+def bump_recipe_version(sender, action, **kwargs):
+    if action.startswith('post_'):
+        bump_versions(Recipe)
+
+
+for model in VERSIONED_MODELS:
+    post_save.connect(bump_model_version, sender=model)
+    post_delete.connect(bump_model_version, sender=model)
+post_delete.connect(bump_model_version, sender=User)
+m2m_changed.connect(bump_recipe_version, sender=Recipe.tags.through)
+m2m_changed.connect(bump_recipe_version, sender=Recipe.ingredients.through)
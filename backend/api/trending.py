@@ -0,0 +1,68 @@
+from collections import defaultdict
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count
+from django.db.models.functions import TruncHour
+from django.utils import timezone
+
+from .cache import recipe_feed_cache
+from .models import Favorite, Recipe, ShoppingCart
+
+BATCH_SIZE = 1000
+
+# Вклад одного добавления в рейтинг. Список покупок весит больше:
+# рецепт в нём собираются приготовить.
+WEIGHTS = {
+    Favorite: 1.0,
+    ShoppingCart: 2.0,
+}
+
+
+def scores(now=None):
+    """Рейтинги рецептов {recipe_id: score} на момент now.
+
+    Каждое добавление в избранное или список покупок за последние
+    TRENDING_WINDOW_DAYS дней даёт вклад, который уменьшается вдвое
+    каждые TRENDING_HALF_LIFE_HOURS часов. Добавления группируются в БД
+    по рецепту и часу, поэтому строк читается не больше, чем рецептов на
+    число часов окна.
+    """
+    now = now or timezone.now()
+    half_life = settings.TRENDING_HALF_LIFE_HOURS * 3600
+    since = now - timedelta(days=settings.TRENDING_WINDOW_DAYS)
+    result = defaultdict(float)
+    for model, weight in WEIGHTS.items():
+        rows = model.objects.filter(created__gte=since).annotate(
+            hour=TruncHour('created')
+        ).values('recipe', 'hour').annotate(
+            total=Count('pk')).order_by().values_list(
+                'recipe', 'hour', 'total')
+        for recipe_id, hour, total in rows.iterator():
+            age = max((now - hour).total_seconds(), 0)
+            result[recipe_id] += weight * total * 0.5 ** (age / half_life)
+    return result
+
+
+def update(now=None):
+    """Записывает рейтинги в Recipe.trending_score.
+
+    Возвращает число рецептов с ненулевым рейтингом.
+    """
+    new_scores = scores(now)
+    with transaction.atomic():
+        stale = set(Recipe.objects.filter(
+            trending_score__gt=0).values_list('pk', flat=True))
+        stale.difference_update(new_scores)
+        stale = list(stale)
+        for start in range(0, len(stale), BATCH_SIZE):
+            Recipe.objects.filter(
+                pk__in=stale[start:start + BATCH_SIZE]
+            ).update(trending_score=0)
+        Recipe.objects.bulk_update(
+            [Recipe(pk=pk, trending_score=score)
+             for pk, score in new_scores.items()],
+            ('trending_score',), batch_size=BATCH_SIZE)
+    recipe_feed_cache.invalidate('all')
+    return len(new_scores)
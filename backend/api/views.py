@@ -1,57 +1,119 @@
-from rest_framework import pagination
 from django.contrib.auth import get_user_model
-from django.db.models import Sum
-from django.http import HttpResponse
-from django.utils import timezone
+from django.db import transaction
+from django.db.models import Exists, OuterRef
+from django.http import HttpResponse, StreamingHttpResponse
 from django_filters.rest_framework import DjangoFilterBackend
 from rest_framework import status, viewsets, permissions
 from rest_framework.decorators import action
 from rest_framework.generics import get_object_or_404
+from rest_framework.parsers import FormParser, MultiPartParser
 from rest_framework.response import Response
 from rest_framework.viewsets import ReadOnlyModelViewSet
 
-from .filters import IngredientFilter, RecipeFilter
+from . import counters, metrics, recipe_lists, shopping_cart
+from .autocomplete import ingredient_index
+from .cache import recipe_feed_cache
+from .conditional import ConditionalGetMixin
+from .constants import REFERENCE_DATA_MAX_AGE
+from .db import insert_ignore
+from .exporters import (CURSOR_CHUNK_SIZE, EXPORTERS, FORMAT_PARAM,
+                        ExportContentNegotiation, get_exporter_class)
+from .filters import RecipeFilter, recipe_ordering
+from .pagination import LimitPagination
+from .parsers import StreamingImageJSONParser
 from .permissions import IsAdminOrReadOnly, IsAuthorOrReadOnly
 from .serializers import (RecipeCreateAndUpdateSerializer,
                           IngredientSerializer,
+                          RecipeIdsSerializer,
                           RecipeListSerializer,
                           ShortRecipeSerializer,
                           TagSerializer)
 from .models import (Favorite,
                      Ingredient,
-                     RecipeIngredient,
                      Recipe,
+                     RecipeIngredient,
                      ShoppingCart,
                      Tag)
+from users.models import Subscription
 
 User = get_user_model()
 
 
-class LimitPageNumberPagination(pagination.PageNumberPagination):
-    page_size = 10
-    page_size_query_param = 'limit'
-
-
-class TagsViewSet(ReadOnlyModelViewSet):
+class TagsViewSet(ConditionalGetMixin, ReadOnlyModelViewSet):
     permission_classes = (IsAdminOrReadOnly,)
     queryset = Tag.objects.all()
     serializer_class = TagSerializer
+    conditional_models = (Tag,)
+    cache_control = {'public': True, 'max_age': REFERENCE_DATA_MAX_AGE}
 
 
-class IngredientsViewSet(ReadOnlyModelViewSet):
+class IngredientsViewSet(ConditionalGetMixin, ReadOnlyModelViewSet):
     permission_classes = (IsAdminOrReadOnly,)
     queryset = Ingredient.objects.all()
     serializer_class = IngredientSerializer
-    filter_backends = (IngredientFilter,)
-    search_fields = ('^name',)
+    conditional_models = (Ingredient,)
+    cache_control = {'public': True, 'max_age': REFERENCE_DATA_MAX_AGE}
+
+    def list(self, request, *args, **kwargs):
+        if not request.query_params.get('name'):
+            return super().list(request, *args, **kwargs)
+        return self.conditional(self.search, request)
+
+    def search(self, request):
+        return Response(
+            ingredient_index.search(request.query_params['name']))
 
 
-class RecipeViewSet(viewsets.ModelViewSet):
-    queryset = Recipe.objects.all()
-    pagination_class = LimitPageNumberPagination
+class RecipeViewSet(ConditionalGetMixin, viewsets.ModelViewSet):
+    pagination_class = LimitPagination
     filter_backends = (DjangoFilterBackend,)
     filter_class = RecipeFilter
     permission_classes = (IsAuthorOrReadOnly,)
+    parser_classes = (StreamingImageJSONParser, FormParser, MultiPartParser)
+    conditional_models = (Recipe, RecipeIngredient, Ingredient, Tag, User)
+    conditional_actions = ('retrieve',)
+    cache_control = {'private': True, 'no_cache': True}
+    vary = ('Authorization',)
+
+    @property
+    def cursor_ordering(self):
+        return recipe_ordering(self.request.query_params)
+
+    def get_etag_parts(self, request):
+        user = request.user
+        state = Recipe.objects.with_user_flags(user)
+        fields = ['pk', 'is_favorited', 'is_in_shopping_cart']
+        if user.is_authenticated:
+            state = state.annotate(is_subscribed=Exists(
+                Subscription.objects.filter(
+                    user=user, author=OuterRef('author'))))
+            fields.append('is_subscribed')
+        try:
+            row = state.filter(
+                pk=self.kwargs['pk']).values_list(*fields).first()
+        except (TypeError, ValueError):
+            return None
+        if row is None:
+            return None
+        return super().get_etag_parts(request) + list(row)
+
+    def get_validators(self, request):
+        etag, last_modified = super().get_validators(request)
+        if request.user.is_authenticated:
+            return etag, None
+        return etag, last_modified
+
+    def list(self, request, *args, **kwargs):
+        if request.user.is_authenticated:
+            return super().list(request, *args, **kwargs)
+        return recipe_feed_cache.respond(
+            request, lambda: super(RecipeViewSet, self).list(
+                request, *args, **kwargs))
+
+    def get_queryset(self):
+        if self.action in ('list', 'retrieve'):
+            return Recipe.objects.for_feed(self.request.user)
+        return Recipe.objects.all()
 
     def get_serializer_class(self):
         if (self.action == 'list' or self.action == 'retrieve'):
@@ -77,50 +139,92 @@ class RecipeViewSet(viewsets.ModelViewSet):
         if request.method == 'DELETE':
             return self.delete_recipe(ShoppingCart, request.user, pk)
 
-    @action(detail=False, methods=('get',),
+    @action(detail=False, methods=('post', 'delete'),
+            url_path='favorite/batch',
+            permission_classes=(permissions.IsAuthenticated,))
+    def favorite_batch(self, request):
+        return self.change_recipes(Favorite, request)
+
+    @action(detail=False, methods=('post', 'delete'),
+            url_path='shopping_cart/batch',
             permission_classes=(permissions.IsAuthenticated,))
+    def shopping_cart_batch(self, request):
+        return self.change_recipes(ShoppingCart, request)
+
+    @action(detail=False, methods=('get',),
+            permission_classes=(permissions.IsAuthenticated,),
+            content_negotiation_class=ExportContentNegotiation)
     def download_shopping_cart(self, request):
         user = request.user
+        exporter_class = get_exporter_class(request)
+        if exporter_class is None:
+            return Response({
+                'errors': (f'Параметр {FORMAT_PARAM} должен быть одним из: '
+                           f'{", ".join(EXPORTERS)}.')},
+                status=status.HTTP_400_BAD_REQUEST
+            )
         if not user.cart.exists():
             return Response({
                 'errors': 'Ваш список покупок пуст.'},
                 status=status.HTTP_400_BAD_REQUEST
             )
-        ingredients = RecipeIngredient.objects.filter(
-            recipe__cart__user=user).values(
-                'ingredient__name',
-                'ingredient__measurement_unit'
-        ).annotate(amount=Sum('amount'))
-        filename = f'{user.username}_shopping_list.txt'
-        shopping_list = (
-            f'Список покупок({user.first_name})\n'
-            f'{timezone.localtime().strftime("%d/%m/%Y %H:%M")}\n\n'
-        )
-        for ing in ingredients:
-            shopping_list += (f'{ing["ingredient__name"]}: {ing["amount"]} '
-                              f'{ing["ingredient__measurement_unit"]}\n')
-        shopping_list += '\nFoodgram'
-        response = HttpResponse(
-            shopping_list, content_type='text.txt; charset=utf-8'
+        ingredients = user.cart_totals.values(
+            'ingredient__name', 'ingredient__measurement_unit', 'amount'
+        ).order_by('ingredient__name')
+        exporter = exporter_class(
+            user, ingredients.iterator(chunk_size=CURSOR_CHUNK_SIZE))
+        response = StreamingHttpResponse(
+            exporter, content_type=f'{exporter.content_type}; charset=utf-8'
         )
-        response['Content-Disposition'] = f'attachment; filename={filename}'
+        response['Content-Disposition'] = (
+            f'attachment; filename={exporter.filename}')
         return response
 
+    def change_recipes(self, model, request):
+        """Добавляет или удаляет несколько рецептов за один запрос."""
+        serializer = RecipeIdsSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        recipe_ids = list(dict.fromkeys(serializer.validated_data['recipes']))
+        change = (recipe_lists.add if request.method == 'POST'
+                  else recipe_lists.remove)
+        results = change(model, request.user, recipe_ids)
+        return Response({'results': [
+            {'id': pk, 'status': result} for pk, result in results.items()
+        ]})
+
     def add_recipe(self, model, user, pk):
-        if model.objects.filter(user=user, recipe__id=pk).exists():
-            return Response({
-                'errors': 'Рецепт уже добавлен в список.'
-            }, status=status.HTTP_400_BAD_REQUEST)
         recipe = get_object_or_404(Recipe, id=pk)
-        model.objects.create(user=user, recipe=recipe)
+        with transaction.atomic():
+            # Порядок блокировок тот же, что у пакетного изменения списка.
+            recipe_lists.lock_user(user)
+            if not insert_ignore(model, user_id=user.pk, recipe_id=recipe.pk):
+                return Response({
+                    'errors': 'Рецепт уже добавлен в список.'
+                }, status=status.HTTP_400_BAD_REQUEST)
+            counters.recipes_added(model, (recipe.pk,))
+            if model is ShoppingCart:
+                shopping_cart.add_recipe(user, recipe.id)
         serializer = ShortRecipeSerializer(recipe)
         return Response(serializer.data, status=status.HTTP_201_CREATED)
 
     def delete_recipe(self, model, user, pk):
-        obj = model.objects.filter(user=user, recipe__id=pk)
-        if obj.exists():
-            obj.delete()
+        with transaction.atomic():
+            recipe_lists.lock_user(user)
+            deleted, _ = model.objects.filter(user=user, recipe_id=pk).delete()
+            if deleted:
+                counters.recipes_removed(model, (pk,))
+                if model is ShoppingCart:
+                    shopping_cart.remove_recipe(user, pk)
+        if deleted:
             return Response(status=status.HTTP_204_NO_CONTENT)
         return Response({
             'errors': 'Рецепт уже удален.'
         }, status=status.HTTP_400_BAD_REQUEST)
+
+
+def metrics_view(request):
+    """Метрики всех воркеров в формате Prometheus.
+
+    Маршрут не проксируется nginx и доступен только из внутренней сети.
+    """
+    return HttpResponse(metrics.render(), content_type=metrics.CONTENT_TYPE)
@@ -1,4 +1,6 @@
 import os
+import tempfile
+
 import dotenv
 from pathlib import Path
 
@@ -29,6 +31,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'api.middleware.PerformanceMiddleware',
+    'api.middleware.ReplicaMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -66,10 +70,104 @@ DATABASES = {
         'USER': os.getenv('POSTGRES_USER', default='foodgram_user'),
         'PASSWORD': os.getenv('POSTGRES_PASSWORD', default='foodgram_password'),
         'HOST': os.getenv('DB_HOST', default='db'),
-        'PORT': os.getenv('DB_PORT', default=5432)
+        'PORT': os.getenv('DB_PORT', default=5432),
+        'CONN_MAX_AGE': int(os.getenv('DB_CONN_MAX_AGE', default=0)),
+        'POOL': {
+            'MAX_SIZE': int(os.getenv('DB_POOL_MAX_SIZE', default=10)),
+            'TIMEOUT': float(os.getenv('DB_POOL_TIMEOUT', default=5)),
+            'MAX_LIFETIME': float(
+                os.getenv('DB_POOL_MAX_LIFETIME', default=1800)),
+            'CHECK_IDLE': float(
+                os.getenv('DB_POOL_CHECK_IDLE', default=30)),
+        },
+    }
+}
+
+# Реплики для чтения: адреса host[:port] через запятую, для SQLite -
+# пути к файлам копий БД.
+DATABASE_REPLICAS = []
+for number, address in enumerate(
+        filter(None, os.getenv('DB_REPLICAS', default='').split(',')), 1):
+    replica = {**DATABASES['default'], 'TEST': {'MIRROR': 'default'}}
+    if replica['ENGINE'] == 'django.db.backends.sqlite3':
+        replica['NAME'] = address.strip()
+    else:
+        host, _, port = address.strip().partition(':')
+        replica.update(HOST=host, PORT=port or replica['PORT'], OPTIONS={
+            'connect_timeout': int(
+                os.getenv('DB_REPLICA_CONNECT_TIMEOUT', default=2)),
+        })
+    DATABASES[f'replica_{number}'] = replica
+    DATABASE_REPLICAS.append(f'replica_{number}')
+
+DATABASE_ROUTERS = ['api.replicas.ReplicaRouter']
+REPLICA_PIN_SECONDS = int(os.getenv('REPLICA_PIN_SECONDS', default=5))
+REPLICA_MAX_LAG = float(os.getenv('REPLICA_MAX_LAG', default=5))
+REPLICA_CHECK_INTERVAL = float(
+    os.getenv('REPLICA_CHECK_INTERVAL', default=5))
+
+CACHES = {
+    'default': {
+        'BACKEND': os.getenv(
+            'CACHE_BACKEND',
+            default='django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.getenv('CACHE_LOCATION', default=''),
     }
 }
 
+RECIPE_FEED_CACHE_TIMEOUT = int(
+    os.getenv('RECIPE_FEED_CACHE_TIMEOUT', default=300))
+
+INGREDIENT_INDEX_MAX_SIZE = int(
+    os.getenv('INGREDIENT_INDEX_MAX_SIZE', default=50000))
+
+IMAGE_WORKERS = int(os.getenv('IMAGE_WORKERS', default=2))
+
+TRENDING_HALF_LIFE_HOURS = float(
+    os.getenv('TRENDING_HALF_LIFE_HOURS', default=48))
+TRENDING_WINDOW_DAYS = int(os.getenv('TRENDING_WINDOW_DAYS', default=14))
+
+SEARCH_CONFIG = os.getenv('SEARCH_CONFIG', default='russian')
+
+PERFORMANCE_SLOW_REQUEST = float(
+    os.getenv('PERFORMANCE_SLOW_REQUEST_MS', default=500)) / 1000
+PERFORMANCE_SLOW_QUERY = float(
+    os.getenv('PERFORMANCE_SLOW_QUERY_MS', default=100)) / 1000
+PERFORMANCE_SERVER_TIMING = os.getenv(
+    'PERFORMANCE_SERVER_TIMING', default='true').lower() == 'true'
+
+TOKEN_CACHE_SIZE = int(os.getenv('TOKEN_CACHE_SIZE', default=10000))
+TOKEN_CACHE_TTL = float(os.getenv('TOKEN_CACHE_TTL', default=60))
+TOKEN_CACHE_ALIAS = os.getenv('TOKEN_CACHE_ALIAS') or None
+TOKEN_CACHE_SHARED_TTL = int(
+    os.getenv('TOKEN_CACHE_SHARED_TTL', default=600))
+
+METRICS_DIR = os.getenv('METRICS_DIR', default=os.path.join(
+    tempfile.gettempdir(), 'foodgram-metrics'))
+METRICS_FLUSH_INTERVAL = float(os.getenv('METRICS_FLUSH_INTERVAL', default=1))
+
+RECIPE_IMAGE_MAX_SIZE = int(
+    os.getenv('RECIPE_IMAGE_MAX_SIZE', default=10 * 1024 * 1024))
+RECIPE_JSON_MAX_SIZE = int(
+    os.getenv('RECIPE_JSON_MAX_SIZE', default=1024 * 1024))
+
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'formatters': {
+        'plain': {'format': '%(asctime)s %(levelname)s %(name)s %(message)s'},
+    },
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler', 'formatter': 'plain'},
+    },
+    'loggers': {
+        'api': {
+            'handlers': ['console'],
+            'level': os.getenv('API_LOG_LEVEL', default='INFO'),
+        },
+    },
+}
 
 AUTH_PASSWORD_VALIDATORS = [
     {
@@ -89,7 +187,7 @@ AUTH_PASSWORD_VALIDATORS = [
 
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework.authentication.TokenAuthentication',
+        'api.authentication.CachedTokenAuthentication',
     ),
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticatedOrReadOnly',
@@ -0,0 +1,14 @@
+"""Настройки pytest: без переменных окружения тесты идут на SQLite."""
+import os
+
+import dotenv
+from pathlib import Path
+
+dotenv.load_dotenv(Path(__file__).resolve().parent.parent / '.env')
+os.environ.setdefault('SECRET_KEY', 'test-secret-key')
+os.environ.setdefault('DB_ENGINE', 'django.db.backends.sqlite3')
+os.environ.setdefault('DB_NAME', 'db.sqlite3')
+
+from .settings import *  # noqa: E402,F401,F403
+
+PASSWORD_HASHERS = ['django.contrib.auth.hashers.MD5PasswordHasher']
@@ -0,0 +1,87 @@
+import base64
+import io
+
+import pytest
+from django.core.cache import caches
+from PIL import Image
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from api.authentication import token_cache
+from api.models import Ingredient, Tag
+
+
+def image_data():
+    buffer = io.BytesIO()
+    Image.new('RGB', (64, 64), 'red').save(buffer, 'PNG')
+    return ('data:image/png;base64,'
+            + base64.b64encode(buffer.getvalue()).decode())
+
+
+def client_for(user):
+    client = APIClient()
+    token, _ = Token.objects.get_or_create(user=user)
+    client.credentials(HTTP_AUTHORIZATION=f'Token {token.key}')
+    return client
+
+
+@pytest.fixture(autouse=True)
+def isolated_storage(settings, tmp_path):
+    settings.MEDIA_ROOT = str(tmp_path / 'media')
+    settings.METRICS_DIR = str(tmp_path / 'metrics')
+    for cache in caches.all():
+        cache.clear()
+    token_cache.clear()
+
+
+@pytest.fixture
+def make_user(django_user_model):
+    def make(username):
+        return django_user_model.objects.create_user(
+            username=username, email=f'{username}@example.com',
+            password='password', first_name='Имя', last_name='Фамилия')
+    return make
+
+
+@pytest.fixture
+def user(make_user):
+    return make_user('user')
+
+
+@pytest.fixture
+def author(make_user):
+    return make_user('author')
+
+
+@pytest.fixture
+def tags(db):
+    return [Tag.objects.create(name=f'Тег {number}', slug=f'tag{number}',
+                               color=f'#00000{number}')
+            for number in range(3)]
+
+
+@pytest.fixture
+def ingredients(db):
+    return [Ingredient.objects.create(name=f'Ингредиент {number}',
+                                      measurement_unit='г')
+            for number in range(30)]
+
+
+@pytest.fixture
+def make_recipe(tags, ingredients):
+    def make(author, ingredient_count=3, name='Рецепт'):
+        response = client_for(author).post('/api/recipes/', {
+            'tags': [tag.id for tag in tags[:2]],
+            'ingredients': [
+                {'id': ingredient.id, 'amount': 10 + number}
+                for number, ingredient in enumerate(
+                    ingredients[:ingredient_count])
+            ],
+            'name': name,
+            'image': image_data(),
+            'text': 'Описание',
+            'cooking_time': 5,
+        }, format='json')
+        assert response.status_code == 201, response.content
+        return response.json()
+    return make
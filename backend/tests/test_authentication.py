@@ -0,0 +1,41 @@
+import pickle
+
+from django.core.cache import caches
+from rest_framework.authtoken.models import Token
+
+from api.authentication import TokenCache, token_cache
+
+from .conftest import client_for
+
+
+def test_shared_token_cache_has_no_password_hash(settings, user):
+    settings.TOKEN_CACHE_ALIAS = 'default'
+    client = client_for(user)
+    assert client.get('/api/users/me/').status_code == 200
+    key = Token.objects.get(user=user).key
+    data = caches['default'].get(token_cache.shared_key(key))
+    assert user.password.encode() not in pickle.dumps(data)
+
+    token_cache.clear()
+    cached_user = token_cache.get(key).user
+    assert cached_user.pk == user.pk and cached_user.is_active
+    assert cached_user.get_deferred_fields() == {'password'}
+    cached_user.first_name = 'Новое имя'
+    cached_user.save()
+    user.refresh_from_db()
+    assert user.first_name == 'Новое имя'
+    assert user.check_password('password')
+
+
+def test_deactivation_is_seen_by_other_workers(settings, user):
+    settings.TOKEN_CACHE_ALIAS = 'default'
+    client = client_for(user)
+    assert client.get('/api/users/me/').status_code == 200
+    key = Token.objects.get(user=user).key
+    # Кеш другого воркера gunicorn с тем же общим кешем.
+    other_worker = TokenCache()
+    assert other_worker.get(key).user.pk == user.pk
+    user.is_active = False
+    user.save()
+    assert other_worker.get(key) is None
+    assert client.get('/api/users/me/').status_code == 401
@@ -0,0 +1,70 @@
+import io
+import statistics
+import time
+
+import pytest
+from django.core.management import call_command
+
+from api.autocomplete import IngredientIndex
+from api.conditional import write_versions
+from api.models import Ingredient
+
+NAMES = ('соль', 'морская соль', 'солод', 'фасоль', 'сахар')
+
+
+@pytest.fixture
+def catalog(db):
+    return Ingredient.objects.bulk_create(
+        Ingredient(name=name, measurement_unit='г') for name in NAMES)
+
+
+def names(results):
+    return [item['name'] for item in results]
+
+
+def test_prefix_matches_come_before_substring(catalog):
+    index = IngredientIndex()
+    assert names(index.search(' Сол ')) == [
+        'солод', 'соль', 'морская соль', 'фасоль']
+    assert names(index.search('сол', limit=3)) == [
+        'солод', 'соль', 'морская соль']
+    assert index.search('  ') == []
+
+
+def test_index_reloads_when_version_changes(
+        catalog, django_assert_num_queries):
+    index = IngredientIndex()
+    assert names(index.search('перец')) == []
+    with django_assert_num_queries(1):
+        index.search('сол')
+    # Ингредиент добавлен другим процессом: индекс узнаёт об этом только
+    # по версии.
+    Ingredient.objects.bulk_create(
+        [Ingredient(name='перец', measurement_unit='г')])
+    assert names(index.search('перец')) == []
+    write_versions({Ingredient})
+    assert names(index.search('перец')) == ['перец']
+
+
+def test_large_catalog_is_searched_in_database(catalog, settings):
+    settings.INGREDIENT_INDEX_MAX_SIZE = len(NAMES) - 1
+    index = IngredientIndex()
+    assert names(index.search('СОЛ')) == [
+        'солод', 'соль', 'морская соль', 'фасоль']
+    assert names(index.search('сол', limit=1)) == ['солод']
+
+
+def test_lookups_over_ingredients_csv(db):
+    call_command('load_ing', stdout=io.StringIO())
+    index = IngredientIndex()
+    queries = sorted({name[:length].lower() for name in Ingredient.objects
+                      .values_list('name', flat=True)[:200]
+                      for length in (1, 3, 5)})
+    index.search(queries[0])
+    timings = []
+    for query in queries:
+        started = time.perf_counter()
+        results = index.search(query)
+        timings.append(time.perf_counter() - started)
+        assert results
+    assert statistics.median(timings) < 0.002
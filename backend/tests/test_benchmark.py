@@ -0,0 +1,28 @@
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+
+from api.management.commands.benchmark import LARGE_CART_USERNAME
+from api.models import Ingredient, Recipe
+
+
+def test_large_cart_scenario_leaves_no_data(user, ingredients):
+    out = StringIO()
+    call_command('benchmark', iterations=1, warmup=0, large_cart=50,
+                 scenarios=['large cart'], stdout=out)
+    assert 'download large cart csv (50)' in out.getvalue()
+    assert Ingredient.objects.count() == len(ingredients)
+    assert not Recipe.objects.exists()
+    assert not get_user_model().objects.filter(
+        username=LARGE_CART_USERNAME).exists()
+
+
+def test_large_cart_scenario_is_opt_in(user):
+    out = StringIO()
+    call_command('benchmark', iterations=1, warmup=0,
+                 scenarios=['tags', 'large cart'], stdout=out)
+    assert 'tags' in out.getvalue()
+    assert 'large cart' not in out.getvalue()
+    assert not get_user_model().objects.filter(
+        username=LARGE_CART_USERNAME).exists()
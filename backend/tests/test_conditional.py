@@ -0,0 +1,63 @@
+import pytest
+from django.contrib.auth.models import update_last_login
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+
+from api.conditional import get_versions
+from api.models import Ingredient, Recipe, RecipeIngredient, Tag
+
+from .conftest import client_for
+
+
+def test_etag_is_bound_to_url(ingredients):
+    client = APIClient()
+    etag = client.get('/api/ingredients/', {'name': 'Ингредиент 1'})['ETag']
+    response = client.get('/api/ingredients/', {'name': 'Ингредиент 2'},
+                          HTTP_IF_NONE_MATCH=etag)
+    assert response.status_code == 200
+
+
+def test_list_etag_does_not_match_missing_detail(tags):
+    client = APIClient()
+    etag = client.get('/api/tags/')['ETag']
+    response = client.get('/api/tags/999/', HTTP_IF_NONE_MATCH=etag)
+    assert response.status_code == 404
+
+
+# Версии моделей увеличиваются после фиксации транзакции.
+@pytest.mark.django_db(transaction=True)
+def test_recipe_etag_ignores_unserialized_user_fields(author, make_recipe):
+    recipe = make_recipe(author)
+    client = APIClient()
+    url = f'/api/recipes/{recipe["id"]}/'
+    etag = client.get(url)['ETag']
+    update_last_login(None, author)
+    author.set_password('new-password')
+    author.save()
+    assert client.get(url, HTTP_IF_NONE_MATCH=etag).status_code == 304
+    author.first_name = 'Новое имя'
+    author.save()
+    assert client.get(url, HTTP_IF_NONE_MATCH=etag).status_code == 200
+
+
+@pytest.mark.django_db(transaction=True)
+def test_versions_are_bumped_once_per_transaction(author, make_recipe,
+                                                  ingredients, tags):
+    recipe = make_recipe(author, ingredient_count=3)
+    models = (Ingredient, Recipe, RecipeIngredient, Tag)
+    before, _ = get_versions(models)
+    with CaptureQueriesContext(connection) as context:
+        response = client_for(author).patch(
+            f'/api/recipes/{recipe["id"]}/', {
+                'name': 'Новое название',
+                'tags': [tags[2].id],
+                'ingredients': [{'id': ingredient.id, 'amount': 7}
+                                for ingredient in ingredients[2:5]],
+            }, format='json')
+    assert response.status_code == 200, response.content
+    assert get_versions(models)[0] == [
+        before[0], before[1] + 1, before[2] + 1, before[3]]
+    updates = [query['sql'] for query in context.captured_queries
+               if query['sql'].startswith('UPDATE "api_modelversion"')]
+    assert len(updates) == 2
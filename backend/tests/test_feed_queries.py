@@ -0,0 +1,59 @@
+import pytest
+from rest_framework.test import APIClient
+
+from .conftest import client_for
+
+# Число запросов не должно зависеть от числа рецептов и ингредиентов.
+LIST_MAX_QUERIES = 6
+DETAIL_MAX_QUERIES = 7
+# Не должно зависеть от числа авторов и их рецептов.
+SUBSCRIPTIONS_MAX_QUERIES = 3
+
+
+@pytest.fixture(params=[False, True], ids=['anonymous', 'authorized'])
+def client(request, user):
+    return client_for(user) if request.param else APIClient()
+
+
+@pytest.mark.parametrize('recipe_count', [1, 10])
+def test_feed_list_queries(client, author, make_recipe, recipe_count,
+                           django_assert_max_num_queries):
+    for number in range(recipe_count):
+        make_recipe(author, ingredient_count=number + 1)
+    with django_assert_max_num_queries(LIST_MAX_QUERIES):
+        response = client.get('/api/recipes/')
+    assert response.status_code == 200
+    assert response.json()['count'] == recipe_count
+
+
+@pytest.mark.parametrize('ingredient_count', [1, 20])
+def test_feed_detail_queries(client, author, make_recipe, ingredient_count,
+                             django_assert_max_num_queries):
+    recipe = make_recipe(author, ingredient_count=ingredient_count)
+    with django_assert_max_num_queries(DETAIL_MAX_QUERIES):
+        response = client.get(f'/api/recipes/{recipe["id"]}/')
+    assert response.status_code == 200
+    assert len(response.json()['ingredients']) == ingredient_count
+
+
+@pytest.mark.parametrize('author_count', [1, 5])
+def test_subscriptions_queries(user, make_user, make_recipe, author_count,
+                               django_assert_max_num_queries):
+    client = client_for(user)
+    for number in range(author_count):
+        author = make_user(f'author{number}')
+        for _ in range(number + 2):
+            make_recipe(author)
+        response = client.post(f'/api/users/{author.id}/subscribe/')
+        assert response.status_code == 201, response.content
+    client.get('/api/users/me/')
+    with django_assert_max_num_queries(SUBSCRIPTIONS_MAX_QUERIES):
+        response = client.get('/api/users/subscriptions/?recipes_limit=2')
+    assert response.status_code == 200
+    results = response.json()['results']
+    assert len(results) == author_count
+    for item in results:
+        number = int(item['username'][len('author'):])
+        assert item['is_subscribed'] is True
+        assert item['recipes_count'] == number + 2
+        assert len(item['recipes']) == 2
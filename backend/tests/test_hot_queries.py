@@ -0,0 +1,29 @@
+import pytest
+from django.core.management import CommandError, call_command
+
+from api.management.commands.explain_hot_queries import Command
+from api.models import Recipe
+
+
+@pytest.fixture
+def filled_db(author, user, make_recipe):
+    recipe = make_recipe(author)
+    Recipe.objects.get(pk=recipe['id']).favorites.create(user=user)
+    return recipe
+
+
+def test_hot_queries_use_indexes(filled_db):
+    call_command('explain_hot_queries')
+
+
+def test_full_scan_fails_command(filled_db, monkeypatch):
+    hot_queries = Command.hot_queries
+
+    def with_full_scan(self):
+        return hot_queries(self) + (
+            ('recipe text', 'api_recipe',
+             Recipe.objects.filter(text='Описание')),)
+
+    monkeypatch.setattr(Command, 'hot_queries', with_full_scan)
+    with pytest.raises(CommandError, match='recipe text'):
+        call_command('explain_hot_queries')
@@ -0,0 +1,92 @@
+import io
+import json
+
+import pytest
+from django.core.management import CommandError, call_command
+
+from api.management.commands import load_ing
+from api.models import Ingredient
+
+ROWS = [
+    ('соль', 'г'),
+    ('сахар', 'г'),
+    ('молоко', 'мл'),
+    ('соль', 'г'),
+    ('молоко', 'л'),
+]
+
+
+def load(path, **options):
+    stdout = io.StringIO()
+    call_command('load_ing', str(path), stdout=stdout, **options)
+    return stdout.getvalue()
+
+
+def catalog():
+    return set(Ingredient.objects.values_list('name', 'measurement_unit'))
+
+
+@pytest.fixture
+def csv_file(tmp_path):
+    path = tmp_path / 'ingredients.csv'
+    path.write_text(''.join(f'{name},{unit}\n' for name, unit in ROWS)
+                    + 'без единицы\n,шт\n' + 'x' * 300 + ',г\n')
+    return path
+
+
+@pytest.fixture
+def json_file(tmp_path):
+    path = tmp_path / 'ingredients.json'
+    path.write_text(json.dumps(
+        [{'name': name, 'measurement_unit': unit} for name, unit in ROWS],
+        ensure_ascii=False, indent=2))
+    return path
+
+
+@pytest.mark.parametrize('batch_size', [1, 2, 4, 5, 10000])
+def test_csv_is_loaded_in_batches(db, csv_file, batch_size):
+    output = load(csv_file, batch_size=batch_size)
+    assert catalog() == set(ROWS)
+    assert ('прочитано 8, добавлено 4, уже были или повторялись 1, '
+            'пропущено некорректных 3') in output
+
+
+def test_existing_ingredients_are_kept(db, csv_file):
+    salt = Ingredient.objects.create(name='соль', measurement_unit='г')
+    output = load(csv_file, batch_size=2)
+    assert 'добавлено 3, уже были или повторялись 2' in output
+    assert Ingredient.objects.get(name='соль', measurement_unit='г') == salt
+    output = load(csv_file)
+    assert 'добавлено 0, уже были или повторялись 5' in output
+    assert Ingredient.objects.count() == 4
+
+
+@pytest.mark.parametrize('read_size', [1, 7, 64 * 1024])
+def test_json_is_read_in_chunks(db, json_file, monkeypatch, read_size):
+    monkeypatch.setattr(load_ing, 'READ_SIZE', read_size)
+    output = load(json_file, batch_size=2)
+    assert catalog() == set(ROWS)
+    assert 'прочитано 5, добавлено 4' in output
+
+
+def test_format_option_overrides_extension(db, csv_file, tmp_path):
+    path = tmp_path / 'catalog.txt'
+    path.write_bytes(csv_file.read_bytes())
+    with pytest.raises(CommandError, match='Неизвестный формат'):
+        load(path)
+    load(path, format='csv')
+    assert catalog() == set(ROWS)
+
+
+@pytest.mark.parametrize('content, message', [
+    ('{"name": "соль"}', 'Ожидается массив JSON'),
+    ('[["соль", "г"]]', 'должны быть объектами'),
+    ('[{"name": "соль", "measurement_unit": "г"}', 'не закрыт'),
+    ('[{"name": "соль", }]', 'Некорректный JSON'),
+])
+def test_invalid_json_is_rejected(db, tmp_path, content, message):
+    path = tmp_path / 'ingredients.json'
+    path.write_text(content)
+    with pytest.raises(CommandError, match=message):
+        load(path)
+    assert not Ingredient.objects.exists()
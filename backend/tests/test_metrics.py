@@ -0,0 +1,63 @@
+import glob
+import json
+import os
+import subprocess
+import sys
+
+from django.conf import settings
+
+from api import metrics
+
+
+def write_values(pid, values):
+    os.makedirs(settings.METRICS_DIR, exist_ok=True)
+    with open(os.path.join(settings.METRICS_DIR, f'{pid}.json'), 'w') as file:
+        json.dump(values, file)
+
+
+def finished_pid():
+    process = subprocess.Popen([sys.executable, '-c', 'pass'])
+    process.wait()
+    return process.pid
+
+
+def test_dead_process_gauges_are_ignored():
+    values = {
+        'requests': [[['recipes-list', 'GET', '200'], 3]],
+        'pool_connections': [[['default', 'idle'], 4]],
+        'pool_max': [[['default'], 10]],
+    }
+    write_values(finished_pid(), values)
+    write_values(os.getppid(), values)
+    total = metrics.Registry().collect()
+    assert total['requests'] == {('recipes-list', 'GET', '200'): 6}
+    assert total['pool_connections'] == {('default', 'idle'): 4}
+    assert total['pool_max'] == {('default',): 10}
+
+
+def test_finished_processes_are_folded():
+    histogram = [[['recipes-list'], [1, 2, 2, 0.5]]]
+    values = {
+        'requests': [[['recipes-list', 'GET', '200'], 3]],
+        'queries': histogram,
+        'pool_max': [[['default'], 10]],
+    }
+    finished = [finished_pid() for _ in range(2)]
+    for pid in finished:
+        write_values(pid, values)
+    write_values(os.getppid(), values)
+    registry = metrics.Registry()
+    expected = {
+        'requests': {('recipes-list', 'GET', '200'): 9},
+        'queries': {('recipes-list',): [3, 6, 6, 1.5]},
+        'pool_max': {('default',): 10},
+    }
+    assert registry.collect() == expected
+    files = set(os.listdir(settings.METRICS_DIR))
+    assert f'{os.getppid()}.json' in files
+    assert not files & {f'{pid}.json' for pid in finished}
+    assert registry.collect() == expected
+    write_values(finished_pid(), {'requests': values['requests']})
+    expected['requests'][('recipes-list', 'GET', '200')] += 3
+    assert registry.collect() == expected
+    assert len(glob.glob(os.path.join(settings.METRICS_DIR, '*.json'))) == 2
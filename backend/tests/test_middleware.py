@@ -0,0 +1,131 @@
+import logging
+import re
+
+import pytest
+from django.contrib.auth import get_user_model
+from django.db import connections
+from rest_framework.test import APIClient
+
+from api.middleware import QueryStats, fingerprint
+
+from .conftest import client_for
+
+User = get_user_model()
+
+SERVER_TIMING = re.compile(
+    r'app;dur=[\d.]+, db;dur=[\d.]+;desc="(\d+) queries", '
+    r'dup;desc="(\d+) duplicated"')
+SLOW_REQUEST = re.compile(
+    r'slow_request method=GET path=(\S+) status=200 duration_ms=[\d.]+ '
+    r'db_ms=[\d.]+ queries=(\d+) duplicates=(\S+)')
+SLOW_QUERY = re.compile(
+    r'slow_query duration_ms=[\d.]+ alias=default fingerprint=[0-9a-f]{12} '
+    r'sql="(.+)"', re.DOTALL)
+
+
+@pytest.fixture
+def slow(settings, caplog):
+    """Любой запрос и любой SQL считаются медленными."""
+    settings.PERFORMANCE_SLOW_REQUEST = 0
+    settings.PERFORMANCE_SLOW_QUERY = 0
+    caplog.set_level(logging.WARNING, logger='api.middleware')
+    return caplog
+
+
+def logged(caplog, pattern):
+    """Группы pattern из строк лога с тем же первым словом."""
+    prefix = pattern.pattern.split()[0]
+    return [pattern.fullmatch(record.getMessage()).groups()
+            for record in caplog.records
+            if record.getMessage().startswith(prefix)]
+
+
+def server_timing(response):
+    queries, duplicated = SERVER_TIMING.fullmatch(
+        response['Server-Timing']).groups()
+    return int(queries), int(duplicated)
+
+
+def wrappers():
+    return {alias: list(connections[alias].execute_wrappers)
+            for alias in connections}
+
+
+def test_server_timing_header(user, author, make_recipe,
+                              django_assert_max_num_queries):
+    make_recipe(author)
+    client = client_for(user)
+    with django_assert_max_num_queries(20) as context:
+        response = client.get('/api/recipes/')
+    assert response.status_code == 200
+    assert server_timing(response) == (len(context.captured_queries), 0)
+
+
+def test_server_timing_can_be_disabled(db, settings):
+    settings.PERFORMANCE_SERVER_TIMING = False
+    response = APIClient().get('/api/tags/')
+    assert response.status_code == 200
+    assert not response.has_header('Server-Timing')
+
+
+def test_slow_request_and_queries_are_logged(user, author, make_recipe,
+                                             slow):
+    make_recipe(author)
+    client = client_for(user)
+    slow.clear()
+    response = client.get('/api/recipes/')
+    queries, _ = server_timing(response)
+    assert logged(slow, SLOW_REQUEST) == [
+        ('/api/recipes/', str(queries), '-')]
+    statements = logged(slow, SLOW_QUERY)
+    assert len(statements) == queries
+    assert any('"api_recipe"' in sql for sql, in statements)
+
+
+def test_fast_request_is_not_logged(db, caplog):
+    response = APIClient().get('/api/tags/')
+    assert response.status_code == 200
+    assert not caplog.records
+
+
+def test_duplicated_queries_are_counted(user, slow):
+    stats = QueryStats(slow_query=60)
+    with connections['default'].execute_wrapper(stats):
+        for _ in range(3):
+            User.objects.filter(pk=user.pk).exists()
+        User.objects.count()
+    [(sql, _)] = [(sql, count) for sql, count in stats.statements.items()
+                  if count == 3]
+    assert stats.count == 4
+    assert stats.duplicates() == [(fingerprint(sql), 3)]
+    assert logged(slow, SLOW_QUERY) == []
+
+
+def test_streaming_response_is_measured_to_the_end(user, author,
+                                                   make_recipe, slow):
+    recipe_id = make_recipe(author)['id']
+    client = client_for(user)
+    client.post(f'/api/recipes/{recipe_id}/shopping_cart/')
+    before = wrappers()
+    slow.clear()
+    response = client.get('/api/recipes/download_shopping_cart/')
+    assert response.streaming
+    queries_before_body, _ = server_timing(response)
+    assert logged(slow, SLOW_REQUEST) == []
+    body = b''.join(response.streaming_content).decode()
+    assert 'Ингредиент 0' in body
+    [(path, queries, _)] = logged(slow, SLOW_REQUEST)
+    assert path == '/api/recipes/download_shopping_cart/'
+    assert int(queries) > queries_before_body
+    assert len(logged(slow, SLOW_QUERY)) == int(queries)
+    assert wrappers() == before
+
+
+def test_wrappers_are_removed_after_request(user, author, make_recipe):
+    make_recipe(author)
+    before = wrappers()
+    client_for(user).get('/api/recipes/')
+    assert wrappers() == before
+    response = client_for(user).get('/api/recipes/download_shopping_cart/')
+    assert response.status_code == 400
+    assert wrappers() == before
@@ -0,0 +1,27 @@
+from rest_framework.test import APIClient
+
+
+def test_cursor_pages_cover_feed_once(author, make_recipe):
+    ids = {make_recipe(author)['id'] for _ in range(5)}
+    client = APIClient()
+    response = client.get('/api/recipes/',
+                          {'pagination': 'cursor', 'limit': 2})
+    seen = []
+    while True:
+        data = response.json()
+        assert 'count' not in data
+        seen += [recipe['id'] for recipe in data['results']]
+        if data['next'] is None:
+            break
+        response = client.get(data['next'])
+    assert seen == sorted(ids, reverse=True)
+
+
+def test_cursor_mode_falls_back_to_pages_for_mutable_orderings(
+        author, make_recipe):
+    make_recipe(author)
+    for ordering in ('popular', 'trending'):
+        response = APIClient().get('/api/recipes/', {
+            'pagination': 'cursor', 'ordering': ordering})
+        assert response.status_code == 200
+        assert response.json()['count'] == 1
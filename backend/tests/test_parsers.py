@@ -0,0 +1,137 @@
+import base64
+import io
+import json
+
+import pytest
+from django.core.files.storage import default_storage
+from rest_framework.exceptions import ParseError
+
+from api.models import Recipe
+from api.parsers import RequestEntityTooLarge, StreamingImageJSONParser
+
+from .conftest import client_for, image_data
+
+
+def image_bytes():
+    return base64.b64decode(image_data().partition(',')[2])
+
+
+def data_uri(content, escape_slashes=False):
+    uri = 'data:image/png;base64,' + base64.b64encode(content).decode()
+    return uri.replace('/', '\\/') if escape_slashes else uri
+
+
+def parse(body, chunk_size=64 * 1024):
+    parser = StreamingImageJSONParser()
+    parser.chunk_size = chunk_size
+    return parser.parse(io.BytesIO(body))
+
+
+@pytest.mark.parametrize('chunk_size', [1, 3, 7, 1000])
+def test_image_is_decoded_across_chunks(chunk_size):
+    content = image_bytes()
+    body = (
+        '{"name": "Суп \\"Дня\\" \\\\ 1\\/2", "tags": [1, 2], '
+        f'"image": "{data_uri(content, escape_slashes=True)}", '
+        '"text": "image"}'
+    ).encode()
+    data = parse(body, chunk_size)
+    assert data['name'] == 'Суп "Дня" \\ 1/2'
+    assert data['tags'] == [1, 2]
+    assert data['text'] == 'image'
+    assert data['image'].read() == content
+    assert data['image'].name.endswith('.png')
+
+
+def test_only_top_level_image_is_decoded():
+    content = image_bytes()
+    body = json.dumps({
+        'name': 'image',
+        'meta': {'image': 'вложенная строка', 'list': [{'image': 'x'}]},
+        'image': data_uri(content),
+    }).encode()
+    data = parse(body, chunk_size=5)
+    assert data['meta'] == {
+        'image': 'вложенная строка', 'list': [{'image': 'x'}]}
+    assert data['name'] == 'image'
+    assert data['image'].read() == content
+
+
+def test_image_key_outside_top_level_object_is_kept():
+    body = json.dumps([{'image': data_uri(image_bytes())}]).encode()
+    assert parse(body) == json.loads(body)
+
+
+def test_empty_image_string_is_null():
+    assert parse(b'{"image": ""}') == {'image': None}
+
+
+@pytest.mark.parametrize('content, error', [
+    (b'<svg xmlns="http://www.w3.org/2000/svg"></svg>', 'изображением'),
+    (b'GIF8', 'изображением'),
+])
+def test_bad_magic_bytes_are_rejected(content, error):
+    body = json.dumps({'image': data_uri(content)}).encode()
+    with pytest.raises(ParseError, match=error):
+        parse(body, chunk_size=3)
+
+
+@pytest.mark.parametrize('value', [
+    'data:text/html;base64,PGI+',
+    'data:image/png;base64,iVBO*w0K',
+])
+def test_bad_data_uri_is_rejected(value):
+    with pytest.raises(ParseError):
+        parse(json.dumps({'image': value}).encode())
+
+
+def test_oversized_image_is_rejected(settings):
+    settings.RECIPE_IMAGE_MAX_SIZE = 100
+    body = json.dumps({'image': data_uri(b'\x89PNG\r\n\x1a\n' + bytes(200))})
+    with pytest.raises(RequestEntityTooLarge):
+        parse(body.encode(), chunk_size=16)
+
+
+def test_oversized_document_is_rejected(settings):
+    settings.RECIPE_JSON_MAX_SIZE = 100
+    with pytest.raises(RequestEntityTooLarge):
+        parse(json.dumps({'text': 'x' * 200}).encode())
+
+
+def recipe_body(tags, ingredients, image):
+    return {
+        'tags': [tags[0].id],
+        'ingredients': [{'id': ingredients[0].id, 'amount': 5}],
+        'name': 'Рецепт',
+        'image': image,
+        'text': 'Описание',
+        'cooking_time': 5,
+    }
+
+
+def test_recipe_create_round_trip(author, tags, ingredients, monkeypatch):
+    monkeypatch.setattr(StreamingImageJSONParser, 'chunk_size', 7)
+    content = image_bytes()
+    response = client_for(author).post(
+        '/api/recipes/', recipe_body(tags, ingredients, data_uri(content)),
+        format='json')
+    assert response.status_code == 201, response.content
+    recipe = Recipe.objects.get(pk=response.json()['id'])
+    with default_storage.open(recipe.image.name) as file:
+        assert file.read() == content
+
+
+@pytest.mark.parametrize('setting, image, status', [
+    ('RECIPE_IMAGE_MAX_SIZE', data_uri(image_bytes()), 413),
+    ('RECIPE_JSON_MAX_SIZE', data_uri(image_bytes()), 413),
+    (None, data_uri(b'MZ\x90\x00' + bytes(20)), 400),
+])
+def test_recipe_create_rejects_bad_images(author, tags, ingredients,
+                                          settings, setting, image, status):
+    if setting is not None:
+        setattr(settings, setting, 10)
+    response = client_for(author).post(
+        '/api/recipes/', recipe_body(tags, ingredients, image),
+        format='json')
+    assert response.status_code == status, response.content
+    assert not Recipe.objects.exists()
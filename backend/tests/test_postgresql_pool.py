@@ -0,0 +1,140 @@
+from types import SimpleNamespace
+
+import psycopg2
+import pytest
+from django.db import connection
+
+from api.postgresql.base import DatabaseWrapper
+from api.postgresql.pool import IDLE, ConnectionPool, close_pools
+
+# Нужна PostgreSQL с движком api.postgresql: DB_ENGINE и параметры
+# подключения, как в .env.
+needs_pool = pytest.mark.skipif(
+    not isinstance(connection, DatabaseWrapper),
+    reason='нужен движок api.postgresql')
+
+
+class FakeConnection:
+    """Соединение psycopg2, которое запоминает выполненные запросы."""
+
+    def __init__(self, healthy=True):
+        self.healthy = healthy
+        self.closed = 0
+        self.queries = []
+        self.info = SimpleNamespace(transaction_status=IDLE)
+
+    def cursor(self):
+        return FakeCursor(self)
+
+    def rollback(self):
+        pass
+
+    def close(self):
+        self.closed = 1
+
+
+class FakeCursor:
+    def __init__(self, connection):
+        self.connection = connection
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        pass
+
+    def execute(self, sql):
+        if not self.connection.healthy:
+            raise psycopg2.OperationalError('server closed the connection')
+        self.connection.queries.append(sql)
+
+
+def make_pool(check_idle):
+    return ConnectionPool('default', max_size=3, timeout=1,
+                          max_lifetime=None, check_idle=check_idle)
+
+
+def test_recently_returned_connection_is_not_checked():
+    pool = make_pool(check_idle=30)
+    first = pool.checkout(FakeConnection)
+    pool.checkin(first)
+    assert pool.checkout(FakeConnection) is first
+    assert first.queries == []
+
+
+def test_idle_connection_is_checked():
+    pool = make_pool(check_idle=0)
+    first = pool.checkout(FakeConnection)
+    pool.checkin(first)
+    assert pool.checkout(FakeConnection) is first
+    assert first.queries == ['SELECT 1']
+    first.healthy = False
+    pool.checkin(first)
+    second = pool.checkout(FakeConnection)
+    assert second is not first and first.closed
+    assert pool.size == 1
+
+
+def test_broken_connection_closes_idle_ones():
+    pool = make_pool(check_idle=30)
+    first, second = (pool.checkout(FakeConnection) for _ in range(2))
+    pool.checkin(first)
+    second.closed = 2
+    pool.checkin(second)
+    assert first.closed and not pool.idle and pool.size == 0
+
+
+def backend_pid():
+    with connection.cursor() as cursor:
+        cursor.execute('SELECT pg_backend_pid()')
+        return cursor.fetchone()[0]
+
+
+def terminate_backends():
+    """Обрывает соединения с тестовой БД, как перезапуск PostgreSQL."""
+    admin = psycopg2.connect(**connection.get_connection_params())
+    try:
+        with admin.cursor() as cursor:
+            cursor.execute(
+                'SELECT pg_terminate_backend(pid) FROM pg_stat_activity '
+                'WHERE datname = current_database() '
+                'AND pid <> pg_backend_pid()')
+    finally:
+        admin.close()
+
+
+@needs_pool
+@pytest.mark.django_db(transaction=True)
+def test_pool_recovers_after_restart():
+    old_pid = backend_pid()
+    connection.close()
+    connection.pooled_from.check_idle = 0
+    assert connection.pooled_from.idle
+    terminate_backends()
+    assert backend_pid() != old_pid
+    connection.close()
+    assert len(connection.pooled_from.idle) == 1
+
+
+@needs_pool
+@pytest.mark.django_db(transaction=True)
+def test_recently_used_connection_fails_once_after_restart():
+    old_pid = backend_pid()
+    connection.close()
+    connection.pooled_from.check_idle = 30
+    terminate_backends()
+    with pytest.raises(psycopg2.OperationalError):
+        backend_pid()
+    connection.close()
+    assert not connection.pooled_from.idle
+    assert backend_pid() != old_pid
+
+
+@needs_pool
+@pytest.mark.django_db(transaction=True)
+def test_close_pools_drains_idle_connections():
+    backend_pid()
+    connection.close()
+    pool = connection.pooled_from
+    close_pools(connection.alias)
+    assert not pool.idle and pool.size == 0
@@ -0,0 +1,70 @@
+from django.contrib.admin.sites import site
+from django.test import RequestFactory
+from rest_framework.test import APIClient
+
+from api import counters
+from api.models import Recipe
+from api.serializers import RecipeCreateAndUpdateSerializer
+
+from .conftest import client_for
+
+
+def favorite_meanwhile(user, recipe_id):
+    """Добавляет рецепт в избранное, пока рецепт редактируют."""
+    response = client_for(user).post(f'/api/recipes/{recipe_id}/favorite/')
+    assert response.status_code == 201
+
+
+def test_update_keeps_counters_changed_meanwhile(user, author, make_recipe):
+    recipe_id = make_recipe(author)['id']
+    stale = Recipe.objects.get(pk=recipe_id)
+    favorite_meanwhile(user, recipe_id)
+    serializer = RecipeCreateAndUpdateSerializer(
+        stale, data={'name': 'Новое название'}, partial=True)
+    assert serializer.is_valid(), serializer.errors
+    serializer.save()
+    recipe = Recipe.objects.get(pk=recipe_id)
+    assert recipe.name == 'Новое название'
+    assert recipe.favorites_count == 1
+    assert counters.recipe_mismatches() == {}
+
+
+def test_admin_save_keeps_counters_changed_meanwhile(user, author,
+                                                     make_recipe):
+    recipe_id = make_recipe(author)['id']
+    stale = Recipe.objects.get(pk=recipe_id)
+    favorite_meanwhile(user, recipe_id)
+    stale.cooking_time = 10
+    request = RequestFactory().post('/admin/')
+    request.user = author
+    site._registry[Recipe].save_model(request, stale, None, change=True)
+    recipe = Recipe.objects.get(pk=recipe_id)
+    assert recipe.cooking_time == 10
+    assert recipe.favorites_count == 1
+    assert counters.recipe_mismatches() == {}
+
+
+def test_favorites_invalidate_popular_feed(
+        user, author, make_recipe, django_capture_on_commit_callbacks):
+    first = make_recipe(author)['id']
+    second = make_recipe(author)['id']
+    anonymous = APIClient()
+
+    def feed(ordering):
+        response = anonymous.get('/api/recipes/', {'ordering': ordering})
+        assert response.status_code == 200
+        ids = [recipe['id'] for recipe in response.json()['results']]
+        return response['X-Cache'], ids
+
+    assert feed('popular') == ('MISS', [second, first])
+    assert feed('popular') == ('HIT', [second, first])
+    assert feed('trending')[0] == 'MISS'
+    with django_capture_on_commit_callbacks(execute=True):
+        favorite_meanwhile(user, first)
+    assert feed('popular') == ('MISS', [first, second])
+    assert feed('trending')[0] == 'HIT'
+    with django_capture_on_commit_callbacks(execute=True):
+        response = client_for(user).delete(
+            f'/api/recipes/{first}/favorite/')
+    assert response.status_code == 204
+    assert feed('popular') == ('MISS', [second, first])
@@ -0,0 +1,81 @@
+import pytest
+
+from api import db, recipe_lists
+from api.models import Recipe, ShoppingCart
+
+from .conftest import client_for
+
+BATCH = 6
+# Точки сохранения, блокировка, выборки, вставка или удаление, счётчики
+# и суммы; без RETURNING - ещё одна выборка.
+BATCH_MAX_QUERIES = 14
+
+
+def cart_totals(user):
+    return dict(user.cart_totals.values_list('ingredient_id', 'amount'))
+
+
+def test_batch_add_reports_each_recipe(user, author, make_recipe):
+    recipe = make_recipe(author)
+    client = client_for(user)
+    client.post(f'/api/recipes/{recipe["id"]}/shopping_cart/')
+    other = make_recipe(author, name='Другой')
+    response = client.post('/api/recipes/shopping_cart/batch/', {
+        'recipes': [recipe['id'], other['id'], 999]}, format='json')
+    assert response.status_code == 200, response.content
+    assert response.json()['results'] == [
+        {'id': recipe['id'], 'status': recipe_lists.ALREADY_ADDED},
+        {'id': other['id'], 'status': recipe_lists.ADDED},
+        {'id': 999, 'status': recipe_lists.NOT_FOUND},
+    ]
+    assert Recipe.objects.get(pk=recipe['id']).cart_count == 1
+    assert Recipe.objects.get(pk=other['id']).cart_count == 1
+
+
+def test_add_counts_only_inserted_rows(user, author, make_recipe,
+                                       monkeypatch):
+    recipe = make_recipe(author)
+    recipe_lists.add(ShoppingCart, user, [recipe['id']])
+    totals = cart_totals(user)
+    # Строка появилась после выборки, например из другого процесса.
+    split_ids = recipe_lists.split_ids
+    monkeypatch.setattr(
+        recipe_lists, 'split_ids',
+        lambda *args: (split_ids(*args)[0], set()))
+    results = recipe_lists.add(ShoppingCart, user, [recipe['id']])
+    assert results == {recipe['id']: recipe_lists.ALREADY_ADDED}
+    assert Recipe.objects.get(pk=recipe['id']).cart_count == 1
+    assert cart_totals(user) == totals
+
+
+def test_remove_counts_only_deleted_rows(user, author, make_recipe,
+                                         monkeypatch):
+    recipe = make_recipe(author)
+    recipe_lists.add(ShoppingCart, user, [recipe['id']])
+    recipe_lists.remove(ShoppingCart, user, [recipe['id']])
+    # Выборка ещё видит строку, которую уже удалили.
+    monkeypatch.setattr(
+        recipe_lists, 'split_ids',
+        lambda model, user, ids: (set(ids), set(ids)))
+    results = recipe_lists.remove(ShoppingCart, user, [recipe['id']])
+    assert results == {recipe['id']: recipe_lists.NOT_IN_LIST}
+    assert Recipe.objects.get(pk=recipe['id']).cart_count == 0
+    assert cart_totals(user) == {}
+
+
+@pytest.mark.parametrize('returning', [True, False])
+def test_batch_queries_do_not_depend_on_size(
+        user, author, make_recipe, monkeypatch, returning,
+        django_assert_max_num_queries):
+    monkeypatch.setattr(db, 'can_return_rows', lambda connection: returning)
+    recipe_ids = [make_recipe(author, name=f'Рецепт {number}')['id']
+                  for number in range(BATCH)]
+    for ids in (recipe_ids[:1], recipe_ids[1:]):
+        with django_assert_max_num_queries(BATCH_MAX_QUERIES):
+            results = recipe_lists.add(ShoppingCart, user, ids)
+        assert set(results.values()) == {recipe_lists.ADDED}
+        with django_assert_max_num_queries(BATCH_MAX_QUERIES):
+            results = recipe_lists.remove(ShoppingCart, user, ids)
+        assert set(results.values()) == {recipe_lists.REMOVED}
+    assert cart_totals(user) == {}
+    assert not Recipe.objects.filter(cart_count__gt=0).exists()
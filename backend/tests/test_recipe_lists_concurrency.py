@@ -0,0 +1,62 @@
+import threading
+
+import pytest
+from django.db import connection, connections
+
+from api import counters, shopping_cart
+
+from .conftest import client_for
+
+THREADS = 6
+ROUNDS = 5
+
+# На SQLite нет SELECT ... FOR UPDATE, запись в БД и так идёт по одной.
+pytestmark = pytest.mark.skipif(
+    not connection.features.has_select_for_update,
+    reason='БД не поддерживает блокировку строк')
+
+
+def change_cart(client, recipe_ids, batch):
+    """Добавляет и удаляет рецепты по одному или пакетом."""
+    if batch:
+        url = '/api/recipes/shopping_cart/batch/'
+        yield client.post(url, {'recipes': recipe_ids}, format='json')
+        yield client.delete(url, {'recipes': recipe_ids}, format='json')
+        return
+    for pk in recipe_ids:
+        yield client.post(f'/api/recipes/{pk}/shopping_cart/')
+    for pk in recipe_ids:
+        yield client.delete(f'/api/recipes/{pk}/shopping_cart/')
+
+
+@pytest.mark.django_db(transaction=True)
+def test_single_and_batch_cart_changes(user, author, make_recipe):
+    recipe_ids = [make_recipe(author, name=f'Рецепт {number}')['id']
+                  for number in range(3)]
+    client_for(user)
+    barrier = threading.Barrier(THREADS)
+    errors = []
+
+    def work(number):
+        try:
+            client = client_for(user)
+            barrier.wait()
+            for step in range(ROUNDS):
+                ids = recipe_ids if (number + step) % 2 else recipe_ids[::-1]
+                for response in change_cart(client, ids, number % 2):
+                    if response.status_code >= 500:
+                        errors.append(response.content)
+        except Exception as error:
+            errors.append(error)
+        finally:
+            connections.close_all()
+
+    threads = [threading.Thread(target=work, args=(number,))
+               for number in range(THREADS)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert errors == []
+    assert shopping_cart.verify() == {}
+    assert counters.recipe_mismatches() == {}
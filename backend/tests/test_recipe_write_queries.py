@@ -0,0 +1,95 @@
+import pytest
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from api import shopping_cart
+from api.models import RecipeIngredient, ShoppingCartIngredient
+
+from .conftest import client_for, image_data
+
+# Число запросов не должно зависеть от числа ингредиентов рецепта.
+CREATE_MAX_QUERIES = 25
+UPDATE_MAX_QUERIES = 28
+
+
+def recipe_payload(tags, ingredients, amount):
+    return {
+        'tags': [tags[0].id],
+        'ingredients': [{'id': ingredient.id, 'amount': amount}
+                        for ingredient in ingredients],
+        'name': 'Рецепт',
+        'image': image_data(),
+        'text': 'Описание',
+        'cooking_time': 5,
+    }
+
+
+@pytest.fixture
+def author_client(author):
+    client = client_for(author)
+    # Токен попадает в кеш, и замеры не включают его проверку в БД.
+    client.get('/api/users/me/')
+    return client
+
+
+@pytest.mark.parametrize('ingredient_count', [1, 2, 15])
+def test_create_and_update_queries(author_client, tags, ingredients,
+                                   ingredient_count,
+                                   django_assert_max_num_queries):
+    with django_assert_max_num_queries(CREATE_MAX_QUERIES):
+        response = author_client.post('/api/recipes/', recipe_payload(
+            tags, ingredients[:ingredient_count], 5), format='json')
+    assert response.status_code == 201, response.content
+    # Половина ингредиентов меняет количество, остальные заменяются.
+    changed = (ingredients[:ingredient_count // 2]
+               + ingredients[ingredient_count:2 * ingredient_count
+                             - ingredient_count // 2])
+    with django_assert_max_num_queries(UPDATE_MAX_QUERIES):
+        response = author_client.patch(
+            f'/api/recipes/{response.json()["id"]}/',
+            recipe_payload(tags, changed, 7), format='json')
+    assert response.status_code == 200, response.content
+    assert sorted(item['id'] for item in response.json()['ingredients']) \
+        == sorted(ingredient.id for ingredient in changed)
+
+
+def recipe_rows(recipe_id):
+    return {row.ingredient_id: (row.pk, row.amount)
+            for row in RecipeIngredient.objects.filter(recipe_id=recipe_id)}
+
+
+def test_update_changes_only_differing_ingredient_rows(
+        author, author_client, user, make_recipe, ingredients):
+    # Ингредиенты 0-3 с количествами 10-13.
+    recipe_id = make_recipe(author, ingredient_count=4)['id']
+    other_id = make_recipe(author, ingredient_count=1)['id']
+    for client in (author_client, client_for(user)):
+        client.post(f'/api/recipes/{recipe_id}/shopping_cart/')
+    author_client.post(f'/api/recipes/{other_id}/shopping_cart/')
+    before = recipe_rows(recipe_id)
+    unchanged, changed, removed, _ = ingredients[:4]
+    added = ingredients[4]
+    with CaptureQueriesContext(connection) as context:
+        response = author_client.patch(f'/api/recipes/{recipe_id}/', {
+            'ingredients': [
+                {'id': unchanged.id, 'amount': 10},
+                {'id': changed.id, 'amount': 20},
+                {'id': added.id, 'amount': 5},
+            ]}, format='json')
+    assert response.status_code == 200, response.content
+    rows = recipe_rows(recipe_id)
+    assert rows.keys() == {unchanged.id, changed.id, added.id}
+    assert rows[unchanged.id] == before[unchanged.id]
+    assert rows[changed.id] == (before[changed.id][0], 20)
+    assert rows[added.id][1] == 5
+    assert removed.id not in rows
+    assert shopping_cart.verify() == {}
+    totals = dict(ShoppingCartIngredient.objects.filter(
+        user=author).values_list('ingredient_id', 'amount'))
+    # Ингредиент 0 есть и во втором рецепте списка автора.
+    assert totals == {unchanged.id: 20, changed.id: 20, added.id: 5}
+    writes = [query['sql'].split()[0] for query in context.captured_queries
+              if '"api_recipeingredient"' in query['sql'].split('(')[0]
+              and not query['sql'].startswith('SELECT')]
+    assert sorted(writes) == ['DELETE', 'INSERT', 'UPDATE']
+    assert len(context.captured_queries) <= UPDATE_MAX_QUERIES
@@ -0,0 +1,40 @@
+from django.core.files.storage import default_storage
+
+from api import renditions
+from api.models import Recipe
+
+from .conftest import client_for, image_data
+
+
+def rendition_files(recipe_id):
+    files = Recipe.objects.get(pk=recipe_id).image_renditions
+    return [name for key, name in files.items() if key != 'source']
+
+
+def test_old_renditions_are_deleted_after_new_image(author, make_recipe):
+    recipe = make_recipe(author)
+    assert renditions.render(recipe['id'])
+    old_files = rendition_files(recipe['id'])
+    assert all(default_storage.exists(name) for name in old_files)
+    response = client_for(author).patch(
+        f'/api/recipes/{recipe["id"]}/', {'image': image_data()},
+        format='json')
+    assert response.status_code == 200, response.content
+    # Старые копии удаляются, только когда готовы новые.
+    assert all(default_storage.exists(name) for name in old_files)
+    assert renditions.render(recipe['id'])
+    new_files = rendition_files(recipe['id'])
+    assert all(default_storage.exists(name) for name in new_files)
+    assert not any(default_storage.exists(name) for name in old_files)
+
+
+def test_renditions_are_deleted_with_recipe(
+        author, make_recipe, django_capture_on_commit_callbacks):
+    recipe = make_recipe(author)
+    assert renditions.render(recipe['id'])
+    files = rendition_files(recipe['id'])
+    with django_capture_on_commit_callbacks(execute=True):
+        response = client_for(author).delete(f'/api/recipes/{recipe["id"]}/')
+    assert response.status_code == 204
+    assert files
+    assert not any(default_storage.exists(name) for name in files)
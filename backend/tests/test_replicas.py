@@ -0,0 +1,29 @@
+import pytest
+from django.db import (DEFAULT_DB_ALIAS, InterfaceError, OperationalError,
+                       ProgrammingError, connection)
+
+from api import replicas
+
+
+@pytest.fixture
+def health(monkeypatch):
+    monkeypatch.setattr(replicas.health, 'status', {})
+    return replicas.health
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize('error, failed', [
+    (ProgrammingError, False),
+    (OperationalError, True),
+    (InterfaceError, True),
+])
+def test_only_connection_errors_mark_replica_failed(health, error, failed):
+    def fail(execute, sql, params, many, context):
+        raise error('ошибка')
+
+    with pytest.raises(error):
+        with replicas.watch_connection(DEFAULT_DB_ALIAS):
+            with connection.execute_wrapper(fail):
+                with connection.cursor() as cursor:
+                    cursor.execute('SELECT 1')
+    assert (DEFAULT_DB_ALIAS in health.status) is failed
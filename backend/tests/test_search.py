@@ -0,0 +1,92 @@
+import pytest
+
+from api.models import Ingredient
+
+from .conftest import client_for
+
+# Слова в одной форме: на PostgreSQL они проходят через стемминг, на
+# SQLite FTS5 ищет последнее слово запроса как префикс.
+WORD = 'щавель'
+
+
+@pytest.fixture
+def edit(author):
+    client = client_for(author)
+
+    def patch(recipe_id, **data):
+        response = client.patch(
+            f'/api/recipes/{recipe_id}/', data, format='json')
+        assert response.status_code == 200, response.content
+    return patch
+
+
+@pytest.fixture
+def found(user):
+    client = client_for(user)
+
+    def get(query, **params):
+        response = client.get('/api/recipes/', {'search': query, **params})
+        assert response.status_code == 200, response.content
+        return [recipe['id'] for recipe in response.json()['results']]
+    return get
+
+
+def test_results_are_ranked_by_field(author, make_recipe, edit, found):
+    in_text = make_recipe(author, name='Суп')['id']
+    edit(in_text, text=f'Добавить {WORD} по вкусу')
+    in_ingredients = make_recipe(author, name='Зелёный суп')['id']
+    sorrel = Ingredient.objects.create(name=WORD, measurement_unit='г')
+    edit(in_ingredients, ingredients=[{'id': sorrel.id, 'amount': 100}])
+    in_name = make_recipe(author, name=f'{WORD} с яйцом')['id']
+    make_recipe(author, name='Борщ')
+    assert found(WORD.upper()) == [in_name, in_ingredients, in_text]
+    assert found('яйцом') == [in_name]
+    assert found('') != []
+
+
+def test_renamed_ingredient_is_reindexed(author, make_recipe, ingredients,
+                                         found):
+    recipe_id = make_recipe(author, ingredient_count=1)['id']
+    ingredient = ingredients[0]
+    ingredient.name = WORD
+    ingredient.save()
+    assert found(WORD) == [recipe_id]
+    ingredient.name = 'крапива'
+    ingredient.save()
+    assert found(WORD) == []
+    assert found('крапива') == [recipe_id]
+
+
+@pytest.mark.parametrize('field', ('name', 'text', 'ingredients'))
+def test_patch_reindexes_recipe(author, make_recipe, edit, found, field):
+    recipe_id = make_recipe(author, name='Суп')['id']
+    other = make_recipe(author, name='Суп')['id']
+    if field == 'ingredients':
+        sorrel = Ingredient.objects.create(name=WORD, measurement_unit='г')
+        value = [{'id': sorrel.id, 'amount': 100}]
+    else:
+        value = f'Суп {WORD}'
+    edit(recipe_id, **{field: value})
+    assert found(WORD) == [recipe_id]
+    assert sorted(found('суп')) == [recipe_id, other]
+    edit(recipe_id, name='Борщ', text='Описание',
+         ingredients=[{'id': Ingredient.objects.exclude(
+             name=WORD).first().id, 'amount': 1}])
+    assert found(WORD) == []
+    assert found('суп') == [other]
+
+
+def test_search_is_combined_with_tags_and_ordering(
+        user, author, make_recipe, tags, edit, found):
+    first, second, third = (
+        make_recipe(author, name=f'Суп {WORD}')['id'] for _ in range(3))
+    make_recipe(author, name='Борщ')
+    edit(third, tags=[tags[2].id])
+    response = client_for(user).post(f'/api/recipes/{first}/favorite/')
+    assert response.status_code == 201
+    assert found(WORD, ordering='popular') == [first, third, second]
+    assert found(WORD, tags=tags[0].slug) == [second, first]
+    assert found(WORD, tags=tags[0].slug, ordering='popular') == [
+        first, second]
+    assert found(WORD, tags=[tags[0].slug, tags[2].slug]) == [
+        third, second, first]
@@ -0,0 +1,34 @@
+# Generated by Django 3.2.3 on 2026-10-18 18:20
+
+from django.db import migrations, models
+
+
+def remove_duplicate_subscriptions(apps, schema_editor):
+    Subscription = apps.get_model('users', 'Subscription')
+    duplicates = Subscription.objects.values('user', 'author').annotate(
+        first_id=models.Min('id'), total=models.Count('id')
+    ).filter(total__gt=1).order_by()
+    for row in duplicates:
+        Subscription.objects.filter(
+            user=row['user'], author=row['author']
+        ).exclude(id=row['first_id']).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            remove_duplicate_subscriptions, migrations.RunPython.noop),
+        migrations.AlterModelOptions(
+            name='subscription',
+            options={'ordering': ['user'], 'verbose_name': 'Подписки', 'verbose_name_plural': 'Подписки'},
+        ),
+        migrations.AddConstraint(
+            model_name='subscription',
+            constraint=models.UniqueConstraint(fields=('user', 'author'), name='unique_user_author_subscription'),
+        ),
+    ]
@@ -0,0 +1,39 @@
+# Generated by Django 3.2.3 on 2026-10-18 18:36
+
+from django.db import migrations, models
+from django.db.models import Count
+import django.db.models.deletion
+
+
+def fill_author_stats(apps, schema_editor):
+    AuthorStats = apps.get_model('users', 'AuthorStats')
+    Recipe = apps.get_model('api', 'Recipe')
+    AuthorStats.objects.bulk_create(
+        AuthorStats(author_id=row['author'], recipes_count=row['total'])
+        for row in Recipe.objects.values('author').annotate(
+            total=Count('pk')).order_by()
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0012_alter_user_first_name_max_length'),
+        ('users', '0002_subscription_unique_user_author'),
+        ('api', '0010_recipe_counters'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AuthorStats',
+            fields=[
+                ('author', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='author_stats', serialize=False, to='auth.user', verbose_name='Автор')),
+                ('recipes_count', models.PositiveIntegerField(default=0, verbose_name='Рецептов')),
+            ],
+            options={
+                'verbose_name': 'Статистика автора',
+                'verbose_name_plural': 'Статистика авторов',
+            },
+        ),
+        migrations.RunPython(fill_author_stats, migrations.RunPython.noop),
+    ]
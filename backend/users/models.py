@@ -1,9 +1,42 @@
+from django.apps import apps
 from django.contrib.auth import get_user_model
 from django.db import models
+from django.db.models import (BooleanField, Exists, OuterRef, Prefetch,
+                              Subquery, Value)
+from django.db.models.functions import Coalesce
 
 User = get_user_model()
 
 
+class SubscriptionQuerySet(models.QuerySet):
+    """Выборки подписок с данными для SubscribeSerializer."""
+
+    def with_author_data(self, user, recipes_limit=None):
+        """Подписки с числом рецептов автора и превью его рецептов.
+
+        Превью для всей страницы загружается одним запросом: recipes_limit
+        последних рецептов каждого автора отбираются коррелированным
+        подзапросом с LIMIT.
+        """
+        Recipe = apps.get_model('api', 'Recipe')
+        recipes = Recipe.objects.only(
+            'id', 'name', 'image', 'image_renditions', 'cooking_time',
+            'author')
+        if recipes_limit is not None:
+            recipes = recipes.filter(id__in=Subquery(
+                Recipe.objects.filter(
+                    author=OuterRef('author')
+                ).values('id')[:recipes_limit]
+            ))
+        return self.select_related('author').annotate(
+            recipes_count=Coalesce('author__author_stats__recipes_count', 0),
+            is_subscribed=Exists(Subscription.objects.filter(
+                user=user, author=OuterRef('author'))),
+        ).prefetch_related(Prefetch(
+            'author__recipes', queryset=recipes, to_attr='preview_recipes'
+        )).order_by('id')
+
+
 class Subscription(models.Model):
     user = models.ForeignKey(
         User,
@@ -18,10 +51,48 @@ class Subscription(models.Model):
         verbose_name='Автор',
     )
 
+    objects = SubscriptionQuerySet.as_manager()
+
     class Meta:
         verbose_name = 'Подписки'
         verbose_name_plural = 'Подписки'
         ordering = ['user']
+        constraints = (
+            models.UniqueConstraint(fields=('user', 'author'),
+                                    name='unique_user_author_subscription'),
+        )
 
     def __str__(self):
         return f'{self.user} / {self.author}'
+
+
+class AuthorStats(models.Model):
+    """Счётчики автора, которые иначе пришлось бы считать агрегатами."""
+    author = models.OneToOneField(
+        User,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='author_stats',
+        verbose_name='Автор',
+    )
+    recipes_count = models.PositiveIntegerField(
+        verbose_name='Рецептов',
+        default=0,
+    )
+
+    class Meta:
+        verbose_name = 'Статистика автора'
+        verbose_name_plural = 'Статистика авторов'
+
+    def __str__(self):
+        return f'{self.author}: {self.recipes_count}'
+
+
+def annotate_is_subscribed(queryset, user):
+    """Добавляет к выборке пользователей флаг подписки на них user."""
+    if user.is_anonymous:
+        return queryset.annotate(
+            is_subscribed=Value(False, output_field=BooleanField()))
+    return queryset.annotate(is_subscribed=Exists(
+        Subscription.objects.filter(user=user, author=OuterRef('pk'))
+    ))
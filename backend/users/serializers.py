@@ -17,6 +17,8 @@ class UserSerializer(UserSerializer):
                   'is_subscribed')
 
     def get_is_subscribed(self, obj):
+        if hasattr(obj, 'is_subscribed'):
+            return obj.is_subscribed
         user = self.context['request'].user
         return (not user.is_anonymous
                 and Subscription.objects.filter(
@@ -1,4 +1,3 @@
-from rest_framework import pagination
 from django.contrib.auth import get_user_model
 from djoser.views import UserViewSet
 from rest_framework import status
@@ -8,30 +7,29 @@ from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
 
 from .models import Subscription
-from api.serializers import SubscribeSerializer
+from api.db import insert_ignore
+from api.pagination import LimitPagination
+from api.serializers import SubscribeSerializer, get_recipes_limit
 
 User = get_user_model()
 
 
-class LimitPageNumberPagination(pagination.PageNumberPagination):
-    page_size = 10
-    page_size_query_param = 'limit'
-
-
 class UserViewSet(UserViewSet):
-    pagination_class = LimitPageNumberPagination
+    pagination_class = LimitPagination
+    cursor_ordering = 'id'
 
     @action(detail=True, methods=('post',),
             permission_classes=(IsAuthenticated,))
     def subscribe(self, request, id=None):
         user = request.user
         author = get_object_or_404(User, id=id)
-
-        if user.subscribers.filter(author=author).exists():
+        if not insert_ignore(Subscription, user_id=user.pk,
+                             author_id=author.pk):
             return Response({
                 'errors': 'Вы уже подписаны на данного пользователя.'
             }, status=status.HTTP_400_BAD_REQUEST)
-        follow = Subscription.objects.create(user=user, author=author)
+        follow = Subscription(user=user, author=author)
+        follow.is_subscribed = True
         serializer = SubscribeSerializer(
             follow, context={'request': request}
         )
@@ -39,20 +37,19 @@ class UserViewSet(UserViewSet):
 
     @subscribe.mapping.delete
     def delete_subscribe(self, request, id=None):
-        user = request.user
-        author = get_object_or_404(User, id=id)
-        if user.subscribers.filter(author=author).exists():
-            user.subscribers.filter(author=author).delete()
+        deleted, _ = request.user.subscribers.filter(author_id=id).delete()
+        if deleted:
             return Response(status=status.HTTP_204_NO_CONTENT)
-        else:
-            return Response({
-                'errors': 'Вы не подписаны на этого автора.'
-            }, status=status.HTTP_400_BAD_REQUEST)
+        get_object_or_404(User, id=id)
+        return Response({
+            'errors': 'Вы не подписаны на этого автора.'
+        }, status=status.HTTP_400_BAD_REQUEST)
 
     @action(detail=False, permission_classes=(IsAuthenticated,))
     def subscriptions(self, request):
         user = request.user
-        queryset = user.subscribers.all()
+        queryset = user.subscribers.with_author_data(
+            user, get_recipes_limit(request))
         pages = self.paginate_queryset(queryset)
         serializer = SubscribeSerializer(
             pages,